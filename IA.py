@@ -1,66 +1,37 @@
 #!/usr/bin/python
-import csv
 import math
-import operator
-import fileinput, os, sys, re, copy
+import os, sys
 import matplotlib.pyplot as plt
-from IA_pools import words, lets, lang, schemas, cues, Unit
-from IA_pools import lets_word_template, word_lets_template, word_si_template, word_lang_template
 from itertools import cycle
-import cohort_math_activations as cm
-import numpy as np
+import IA_model as im
+import IA_script as sc
 
 #   biaIC.py: Implementation of the Bilingual Interactive Activation (BIA) model of word recognition incorporating
 #   Inhibitory Control
 #  (Green, 1998)
 #  (Dijkstra & van Heuven, 2002)
+#
+#   The console UI of the model. The simulation itself (pools, params, traces, log, cycling) is the BIAModel of
+#   IA_model; this module drives one instance of it, model. Importing IA does not start the UI.
 
 __author__ = 'Andy Valenti'
 __copyright__ = "Copyright 2016. Tufts University"
 
 
 #   Global variables
-#   variables for scripting
-
-e = 0.0002      # epsilon value. During script processing we stop cycling when activations change by this amount.
-ncycles = 0    # number of cycles. It is used to hold value from script.
-item_script = ''       # used by runCycle to cycle until item settles within e
-list_script = []       # used to process a list of items to display; build from the script
-script_mode = False
-blankCycle = False      # used to recognize when word is a blank
-
-# model variables
-verbose = False
-input_word = ''
+
+e = im.e        # epsilon value. During script processing we stop cycling when activations change by this amount.
+
+# UI variables
 console_message = ''
 mode = 'Ready'
-cycleno = 0         # current cycle; it is reset by reset()
 display_cols = 3.0  # The number of columns in a subplot of the word activations. Needs to be adjusted as words are added
-trial = 1           # counts the number of times the model has been reset/initialized. It is never reset by the model.
-act_dataset = []    # accumulates word activations
-act_langset = []    # accumulates language node activations
-act_schemaset = []  # accumulates schema node activations
 exit_flag = False
-log = []
 logging = False
-pool_list = [lets,words,lang,schemas,cues]
+network_cache_dir = 'network_cache'     # where doAutoLoad caches compiled networks (engine only); None disables
 a2z = 'abcdefghijklmnopqrstuvwxyz'
 max_subplots = 30   # The most subplots that can be reasonably displayed simultaneously
-
-#   Parameter definitions (from Explorations in Parallel Distributed Processing: A Handbook of Models,
-#   Programs, and Exercises. James McClelland. July 28th, 2015)
-
-max = 1.0       # maximum activation parameter
-min = -0.2      # minimum activation parameter
-rest = -0.1     # the resting activation level to which activations tend to settle in the absence of external input
-decay = 0.1    # the decay rate parameter, which determines the strength of the tendency to return to resting level
-estr = 0.4      # this parameter stands for the strength of external input (inputs from outside the network). It scales
-                # the influence of external signals relative to internally generated inputs to units
-alpha = 0.1     # this parameter scales the strength of the excitatory input to units from other units in the network
-gamma = 0.1     # this parameter scales the strength of the inhibitory input to units from other units in the network
-ncycles_default = 10   # default number of cycles
-params = {'max': max, 'min': min, 'rest': rest, 'decay': decay, 'estr': estr, 'alpha': alpha, 'gamma': gamma,
-          'ncycles': ncycles_default}
+model = im.BIAModel()   # the model driven by the UI: owns the pools, params, traces and trace log
 
 #  Function Definitions
 
@@ -82,180 +53,18 @@ def genx_axis(r, dataset_size):
 
 
 # Reset completely restarts the model.
-# Need to add code to reset each unit to default activation, rest, net-input, and ext_input values
 # NOTES: Does NOT reset the params
 def reset():
-    global trial, act_dataset, act_langset, act_schemaset, verbose, cycleno, console_message, mode,\
-        input_word, params, log, blankCycle, script_mode
-
-    def reset_pool(pool):
-        for key, unit_list in pool.iteritems():
-            for unit in unit_list:
-                unit.resetActivation()
-                unit.setExtInput(0.0)
-                unit.setNetInput(0.0)
-        return
-    # reset each unit to default activation, rest, net-input, and ext_input values
-    reset_pool(lets)
-    reset_pool(words)
-    reset_pool(lang)
-    reset_pool(cues)
-    reset_pool(schemas)
-    trial += 1
-    cycleno = 0
-    verbose = False
-    act_dataset = []
-    act_langset = []
-    act_schemaset = []
+    global console_message, mode
+    model.reset()
     console_message = ''
     mode = 'Ready'
-    input_word = ''
-    blankCycle = False
-    script_mode = False
-    log = []
     return
 
 
-#  Cycle(act_dataset) cycles through the pools, collecting the net input of each unit and then updating the unit
-#  activation
-#  Input: act_dataset is a list which contains a record of a pool's activation for each update across cycles.
-#  It is hard-coded to the words pool.
-#  Control variables: ncycles controls the number of iterations of the net input & update cycle
-#                     verbose controls printing of each update cycle to the standard output (console)
-#  Returns: act_dataset, act_langset appended with the last ncycles activation records for each unit in the pool
-def cycle_pool():
-    global verbose, cycleno, act_dataset, act_langset, act_schemaset
-    act_trial = []
-    act_trial_lang = []
-    for reps in range(int(params['ncycles'])):  # ensure ncycles is type int bc doSetParams converts it to float
-        cycleno += 1
-        # gather netInput from pools
-        netInput(cues)
-        netInput(lets)
-        netInput(words)
-        netInput(lang)
-        netInput(schemas)
-        # update the pools
-        update(cues)
-        update(lets)
-        update(words)
-        update(lang)
-        update(schemas)
-
-
-        # ARI_EDIT
-        # calculate information gain to stimulate non-word node
-
-        curr_activations = readActivations(words)
-        info_gain, offset = cm.get_info_gain(input_word, curr_activations, True, cm.avg, 100)
-        scale = 0.1
-        info_gain = info_gain * scale
-        words['non-word'][0].setActivation(info_gain)
-
-
-        act_dataset.append(readActivations(words))
-        act_langset.append(readActivations(lang))
-        act_schemaset.append(readActivations(schemas))
-        act_trial.append(readActivations(words))
-        act_trial_lang.append(readActivations(lang))
-        if verbose is True:
-            print 'Word Activations:'
-            print('Cycleno: ' + repr(reps + 1) + ' ' + repr(act_trial[reps]))
-            print 'Language Node Activations:'
-            print('Cycleno: ' + repr(reps + 1) + ' ' + repr(act_trial_lang[reps]))
-    return act_dataset, act_langset
-
-
+#   Activation of one unit (column) across the cycles recorded in dataset, a TraceStore
 def extract_col(col_num, dataset):
-    col = []
-    for cycle_row in dataset:
-        col.append(cycle_row[col_num][1])
-    return col
-
-
-#   NEW readActivation using generic pool structure
-#   Reads all units in pool and if the pool is legal (a dict obj), returns:
-#   act_list: [[unit_name0, activation],..,[unit_name,activation]]
-#   Input: a pool such as words, lets, lang and an activation data set.
-#           It is up to the caller to initialize an empty dataset.
-def readActivations(pool):
-    def getKey(item):
-        return item[0]
-    act_list = []
-    for key, unit_list in pool.iteritems():
-        posnum = 0
-        for unit in unit_list:
-            activation = unit.getActivation()
-            act_list.append([key + repr(posnum),activation])
-            posnum += 1
-    act_list = sorted(act_list, key=getKey)
-
-    return act_list
-
-
-#   function netInput(rcvr_pool) parses the projections in rcvr_pool and looks up activation of each sending unit
-#   The standard netInput routine computes the net input for
-#   each pool. The net input consists of three things: the external input, scaled by
-#   estr; the excitatory input from other units, scaled by alpha; and the inhibitory
-#   input from other units, scaled by gamma. For each pool, the netInput routine first
-#   accumulates the excitatory and inhibitory inputs from other units, then scales
-#   the inputs and adds them to the scaled external input to obtain the net input.
-def netInput(rcvr_pool):
-    global pool_list, params
-    # generic pool function
-    for key, unit_list in rcvr_pool.iteritems():
-        for unit in unit_list:
-            in_pool = False
-            excitation = 0
-            inhibition = 0
-            if not unit.isProjNone():
-                for sender in unit.getProjList():
-                    #print repr(unit.getProjList())
-                    from_keypos = sender[0]
-                    from_key = from_keypos[0]
-                    from_pos = from_keypos[1]
-                    weight = sender[1]
-                # check to see if key is in any sending pool, i.e. lets, words, lang
-                    for pool in pool_list:
-
-                        #print 'From Key:' + repr(from_key)
-                        if from_key in pool:
-                            activation = pool[from_key][from_pos].getActivation()
-                            in_pool = True
-                            break
-                        else:
-                            in_pool = False
-                    if in_pool is False:
-                        print("NetInput: Unrecoverable Error. No pool found.")
-                        sys.exit(1)
-
-                    if activation > 0:     # process only positive activations
-                        if weight > 0:
-                            excitation += weight * activation
-                        elif weight < 0:
-                            inhibition += weight * activation
-            excitation *= params['alpha']
-            inhibition *= params['gamma']
-            unit.setNetInput(excitation + inhibition + unit.getExtInput()*params['estr'])
-    return
-
-
-# Standard update. The update routine increments the activation of each unit,
-# based on the net input and the existing activation value.
-def update(pool):
-    global params
-    # generic pool update
-    for key, unit_list in pool.iteritems():
-        for unit in unit_list:
-            activation = unit.getActivation()
-            resting_level = unit.getRest()
-            if activation > 0:
-                unit.setActivation(activation + (params['max'] - activation) * unit.getNetInput()
-                                   - params['decay'] * (activation - resting_level))
-            else:
-                unit.setActivation(activation + (activation - params['min']) * unit.getNetInput()
-                                   - params['decay'] * (activation - resting_level))
-    return
+    return dataset.getColumn(col_num)
 
 
 #   ***********************************Model's User Interface *******************************************
@@ -275,7 +84,7 @@ def printLets():
     global a2z
     print 'Letter Pool'
     for key in a2z:
-        value = lets[key]
+        value = model.lets[key]
         for i in range(5):
             print(key + '[' + repr(i) + ']: ' + repr(value[i].getProjList()))
     return
@@ -284,7 +93,7 @@ def printLets():
 # print all the lang pools, nicely formatted
 def printLang():
     print 'Language Pool'
-    for key, value in lang.iteritems():
+    for key, value in model.lang.iteritems():
         proj_list = value[0].getProjList()
         num_cols = 5
         num_words = len(proj_list)
@@ -314,7 +123,7 @@ def printLang():
 #   print all the word pools, nicely formatted
 def printWords_Full():
     print 'Word Pool'
-    for key, value in words.iteritems():
+    for key, value in model.words.iteritems():
         proj_list = value[0].getProjList()
         word_len = len(key)
         num_words = len(proj_list)
@@ -353,7 +162,7 @@ def printWords():
     mode = 'Print Lexicon'
     buildConsoleMsg()
     print 'Lexicon:'
-    lexicon = build_keys(words)
+    lexicon = build_keys(model.words)
     all_rows = divmod(len(lexicon), cols)
     full_rows = all_rows[0]
     partial_rows = all_rows[1]
@@ -370,88 +179,47 @@ def printWords():
 
 #   Process a new input word from console
 def doNewWord():
-    global input_word, trial, console_message, mode, script_mode, item_script, blankCycle
-    # clear the ext_input from the last word
+    global console_message, mode
     mode = 'New word'
-    blankCycle = False
-    for pos in range(len(input_word)):
-        lets[input_word[pos]][pos].setExtInput(0)
-    if not script_mode:
-        input_word = raw_input('Enter a three to five character word: ')
-    else:
-        input_word = item_script
-    input_word = input_word.lower()
+    word = raw_input('Enter a three to five character word: ')
+    # clear the ext_input from the last word and set the extInput according to the new input_word
+    input_word = model.present(word)
 
-    '''
-    if input_word not in words:
-        mode = 'Error'
-        console_message = '{:s} not in vocabulary'.format(input_word.upper())
-        input_word = ''
-        return
-    '''
-    if len(input_word) > 5:
-        input_word = input_word[:5]
+    if len(word) > 5:
         console_message = 'Word truncated to ' + input_word
     else:
         console_message = 'You entered: {0:s}'.format(input_word.upper())
     buildConsoleMsg()
-#   set the extInput according to the input_word
-    for pos in range(len(input_word)):
-        lets[input_word[pos]][pos].setExtInput(1)
-
     return
 
 
-#   Get and return activation of input word, l1 schema, l2 schema
-def getActivations():
-    global input_word
-    if input_word not in words:
-        word_act = rest
-    else:
-        unit = words[input_word][0]
-        word_act = unit.getActivation()
-    l1_act = lang['english'][0]
-    l2_act = lang['spanish'][0]
-    l1schema_act = schemas['l1'][0]
-    l2schema_act = schemas['l2'][0]
-    return (word_act, l1_act.getActivation(), l2_act.getActivation(), l1schema_act.getActivation(),
-            l2schema_act.getActivation())
-
-
 def buildConsoleMsg():
     global console_message
-    word_act, l1_act, l2_act, l1schem_act, l2schem_act = getActivations()
+    word_act, l1_act, l2_act, l1schem_act, l2schem_act = model.getActivations()
     console_message = 'Input word: {0:s}     Activ: {1:4f}\n          English:  {2:4f} Spanish:   {3:4f}\n          '\
                       'L1 Schema: {4:4f} L2 Schema: {5:4f}'\
-        .format(input_word.upper(),word_act,l1_act,l2_act,l1schem_act,l2schem_act)
+        .format(model.input_word.upper(),word_act,l1_act,l2_act,l1schem_act,l2schem_act)
     return
 
 
 #   Perform an update cycle, so long as a word has been inputted
 def doContinue():
-    global mode, input_word, console_message, mode
-    if input_word == '':
+    global mode, console_message, mode
+    if model.input_word == '':
         mode = 'Error'
         console_message = 'Unable to cycle until word is entered.'
         return
     mode = 'Cycle'
-    cycle_pool()
+    model.cycle()
     buildConsoleMsg()
     return
 
 
 #   Clear the ExtInput to the letters and the cues and cycle the network
 def doBlankCycle():
-    global input_word, trial, console_message, mode, blankCycle
-    # clear the ext_input from the last word
+    global console_message, mode
     mode = 'Blank cycle'
-    blankCycle = True
-    for pos in range(len(input_word)):
-        lets[input_word[pos]][pos].setExtInput(0)
-    # input_word = 'BLANK'
-    cues['cue2'][0].setExtInput(0)
-    cues['cue1'][0].setExtInput(0)
-    cycle_pool()
+    model.blankCycle()
     buildConsoleMsg()
     return
 
@@ -461,8 +229,7 @@ def doSetCue1():
     global mode, console_message
     mode = 'Set L1 Cue'
     buildConsoleMsg()
-    cues['cue1'][0].setExtInput(1)
-    cues['cue2'][0].setExtInput(0)
+    model.set_cue('c1')
     return
 
 
@@ -471,34 +238,20 @@ def doSetCue2():
     global mode, console_message
     mode = 'Set L2 Cue'
     buildConsoleMsg()
-    cues['cue2'][0].setExtInput(1)
-    cues['cue1'][0].setExtInput(0)
+    model.set_cue('c2')
     return
 
 
 #   [D1] display a single plot with activations, 10 words at-a-time
 def doDisplay():
-    global cycleno, console_message, mode, input_word, act_dataset
-
-    def build_key_list(activation_set):
-        key_list = []
-        for word_tuple in activation_set:
-            key_list.append(word_tuple[0][:-1])
-        return key_list
-
-    def build_next_act_list(act_list, i_pos, j_pos):
-        next_act_list = []
-        sliceObj = slice(i_pos, j_pos)
-        for time_step in act_list:
-            next_act_list.append(time_step[sliceObj])
-        return next_act_list
+    global console_message, mode
 
     action_set = {'p', 'n', 'q'}
     lines = ['--', '-.', ':', '-']
     linecycler = cycle(lines)
     step = 10 # this is number of activations we will display
 
-    if cycleno == 0:
+    if model.cycleno == 0:
         mode = 'Error'
         console_message = 'No data available until a cycle is run.'
         return
@@ -509,19 +262,20 @@ def doDisplay():
     plt.ylabel('Activation')
     # fig, ax = plt.subplots()
     # Since we want to be able to handle large lexicon, let the user cycle through 10 at a time
-    iterations = divmod(len(act_dataset[0]), step)  # (quotient, remainder)
+    dataset = model.wordDataset()     # only the words ever in the top K, when just those are recorded
+    iterations = divmod(dataset.getNumUnits(), step)  # (quotient, remainder)
     pos = 0
     i_pos = 0
 
     while True:
-        next_act_dataset = build_next_act_list(act_dataset, i_pos, i_pos + step)
-        key_list = build_key_list(next_act_dataset[0])
+        next_act_dataset = dataset.getData()[:, i_pos:i_pos + step]
+        key_list = dataset.getKeys()[i_pos:i_pos + step]
         mode = '1-plot, {0:d}-words'.format(len(key_list))
         x_vals = genx_axis(1,len(next_act_dataset)+1)
-        for col in range(len(next_act_dataset[1])):
-            plt.plot(x_vals, extract_col(col, next_act_dataset), next(linecycler))
-        word_act, l1, l2, l1schema, l2schema = getActivations()
-        plt.title('Input word: {0:s} Activ: {1:4f}'.format(input_word.upper(), word_act))
+        for col in range(len(key_list)):
+            plt.plot(x_vals, next_act_dataset[:, col], next(linecycler))
+        word_act, l1, l2, l1schema, l2schema = model.getActivations()
+        plt.title('Input word: {0:s} Activ: {1:4f}'.format(model.input_word.upper(), word_act))
         plt.legend(key_list, loc='best', ncol=3)
         plt.show()
 
@@ -550,34 +304,34 @@ def doDisplay():
 
 #   display a single plot with activations of all language nodes
 def doDisplayLang():
-    global cycleno, console_message, mode, input_word, act_langset
-    if cycleno == 0:
+    global console_message, mode
+    if model.cycleno == 0:
         mode = 'Error'
         console_message = 'No data available until a cycle is run.'
         return
-    key_list = build_keys(lang)
+    key_list = build_keys(model.lang)
     mode = '1-plot, {0:d}-languages'.format(len(key_list))
-    console_message = 'You entered: {0:s}'.format(input_word)
+    console_message = 'You entered: {0:s}'.format(model.input_word)
     plt.xlabel('Cycles')
     plt.ylabel('Activation')
-    x_vals = genx_axis(1,len(act_langset)+1)
-    for col in range(len(act_langset[1])):
-        plt.plot(x_vals, extract_col(col,act_langset))
-    plt.title('Input word: %s' %input_word.upper())
+    x_vals = genx_axis(1,len(model.act_langset)+1)
+    for col in range(model.act_langset.getNumUnits()):
+        plt.plot(x_vals, extract_col(col,model.act_langset))
+    plt.title('Input word: %s' %model.input_word.upper())
 
     plt.legend(key_list, loc='best', ncol=3)
     plt.show()
     return
 
 
-#   Display activation of one or more words or langs entered at input prompt
+#   Display activation of one or more words or langs entered at input prompt (or given in select_item, by a script)
 #   Note: Must have run at least 1 cycle
-def doDisplayItems():
-    global cycleno, console_message, mode, act_dataset, act_langset, act_schemaset, input_word, script_mode, list_script
+def doDisplayItems(select_item=None):
+    global console_message, mode
     lines = ['--', '-.', ':', '-']
     linecycler = cycle(lines)
     # must have processed at least one update cycle
-    if cycleno == 0:
+    if model.cycleno == 0:
         mode = 'Error'
         console_message = 'No data available until a cycle is run.'
         return
@@ -585,38 +339,37 @@ def doDisplayItems():
     plt.close()
     mode = '1-plot, n-items'
     buildConsoleMsg()
-    word_key_list = build_keys(words)
-    lang_key_list = build_keys(lang)
-    schema_key_list = build_keys(schemas)
     key_list = []
-    if not script_mode:
+    if select_item is None:
         select_item = raw_input('Enter 1 or more items separated by a comma:').split(',')
-    else:
-        select_item = list_script
     plt.xlabel('Cycles')
     plt.ylabel('Activation')
-    x_vals = genx_axis(1,len(act_dataset)+1)
+    x_vals = genx_axis(1,len(model.act_dataset)+1)
 
     for item in select_item:
         item = item.lower()
-        if item in words:
-            item_index = word_key_list.index(item)
-            plt.plot(x_vals, extract_col(item_index,act_dataset),next(linecycler))
-            key_list.append(item)
-        elif item in lang:
-            item_index = lang_key_list.index(item)
-            plt.plot(x_vals, extract_col(item_index,act_langset),next(linecycler))
-            key_list.append(item)
-        elif item in schemas:
-            item_index = schema_key_list.index(item)
-            plt.plot(x_vals, extract_col(item_index,act_schemaset),next(linecycler))
-            key_list.append(item)
+        if item in model.words:
+            dataset = model.act_dataset
+        elif item in model.lang:
+            dataset = model.act_langset
+        elif item in model.schemas:
+            dataset = model.act_schemaset
         else:
             mode = 'Error'
             console_message = item  + ' Item not found in pool.'
             return
-    word_act, l1, l2, l1schema, l2schema = getActivations()
-    plt.title('Input word: {0:s} Activ: {1:4f}'.format(input_word.upper(),word_act))
+        item_index = dataset.index(item)
+        if item_index is None and dataset is model.act_dataset and model.act_topset is not None:
+            dataset = model.topDataset()    # the cycles it was in the top K
+            item_index = dataset.index(item)
+        if item_index is None:
+            mode = 'Error'
+            console_message = item + ' Item not recorded in trace.'
+            return
+        plt.plot(x_vals, extract_col(item_index,dataset),next(linecycler))
+        key_list.append(item)
+    word_act, l1, l2, l1schema, l2schema = model.getActivations()
+    plt.title('Input word: {0:s} Activ: {1:4f}'.format(model.input_word.upper(),word_act))
     plt.legend(key_list, loc='best')
     plt.show()
     return
@@ -627,15 +380,18 @@ def doDisplayTop10():
     rows = 10
     left_margin = 10
     max_word_len = 5 + 1
-    global act_dataset, input_word, display_cols, mode, console_message
-    if cycleno == 0:
+    global display_cols, mode, console_message
+    if model.cycleno == 0:
         mode = 'Error'
         console_message = 'No data available until a cycle is run.'
         return
     mode = 'Top 10 Activs'
     buildConsoleMsg()
-    activations_t = act_dataset[-1]     # get latest activations
-    activations_t.sort(key=operator.itemgetter(1), reverse=True)
+    if model.act_topset is not None and len(model.act_topset) > 0 and model.act_topset.k >= rows:
+        activations_t = model.act_topset.getTop()     # the top K recorded at the last cycle
+    else:
+        activations_t = [[act[0][:-1], act[1]] for act in im.readActivations(model.words)]    # get latest activations
+        activations_t.sort(key=lambda act: act[1], reverse=True)
 
     print ''
     print (5 * ' '),
@@ -645,7 +401,7 @@ def doDisplayTop10():
     print ((left_margin) * ' '),
     print('----------------')
     for i in range(rows):
-        word = activations_t[i][0][:-1]
+        word = activations_t[i][0]
         word_str = word + (max_word_len - len(word)) * ' '
         print (left_margin * ' '),
         print('%s%+.4f' % (word_str, activations_t[i][1]))
@@ -654,31 +410,32 @@ def doDisplayTop10():
 
 #   display a subplot for each word. Function calculates number of rows based on display_cols, a global parameter
 def doDisplaySubPlots():
-    global act_dataset, input_word, display_cols, mode, console_message, max_subplots
-    if cycleno == 0:
+    global display_cols, mode, console_message, max_subplots
+    if model.cycleno == 0:
         mode = 'Error'
         console_message = 'No data available until a cycle is run.'
         return
     mode = 'Subplot words'
     buildConsoleMsg()
-    num_words = len(act_dataset[1])
+    dataset = model.wordDataset()
+    num_words = dataset.getNumUnits()
     if num_words > max_subplots:
         mode = 'Error'
         console_message = 'Too many subplots to display'
         return
     display_rows = int(math.ceil(num_words / display_cols))
     word_ctr = 0
-    key_list = build_keys(words)
-    x_vals = genx_axis(1,len(act_dataset)+1)
+    key_list = dataset.getKeys()
+    x_vals = genx_axis(1,len(dataset)+1)
     f, axarr = plt.subplots(display_rows,int(display_cols),sharex='col', sharey='row')
     for i in range(display_rows):
         for j in range(int(display_cols)):
             if word_ctr <= (num_words - 1):
-                axarr[i][j].plot(x_vals, extract_col(word_ctr,act_dataset))
+                axarr[i][j].plot(x_vals, extract_col(word_ctr,dataset))
                 axarr[i][j].set_title('%s' %key_list[word_ctr], va='center', size='small',weight='demi', style='italic')
                 word_ctr += 1
-    word_act, l1, l2, l1schema, l2schema = getActivations()
-    plt.suptitle('Input word: {0:s} Activ: {1:4f}'.format(input_word.upper(),word_act), size='large',weight='bold')
+    word_act, l1, l2, l1schema, l2schema = model.getActivations()
+    plt.suptitle('Input word: {0:s} Activ: {1:4f}'.format(model.input_word.upper(),word_act), size='large',weight='bold')
     plt.setp([a.get_xticklabels() for a in axarr[0, :]], visible=False)
     plt.setp([a.get_yticklabels() for a in axarr[:, 0]], size='x-small')
     plt.show()
@@ -688,25 +445,12 @@ def doDisplaySubPlots():
 #  NEW VERSION display a subplot for each word. Show 10 subplots per chart. Allows Scrolling.
 #  Function calculates number of rows based on display_cols, a global parameter
 def doDisplaySubPlots_NEW():
-    global act_dataset, input_word, display_cols, mode, console_message, max_subplots
-
-    def build_key_list(activation_set):
-        key_list = []
-        for word_tuple in activation_set:
-            key_list.append(word_tuple[0][:-1])
-        return key_list
-
-    def build_next_act_list(act_list, i_pos, j_pos):
-        next_act_list = []
-        sliceObj = slice(i_pos, j_pos)
-        for time_step in act_list:
-            next_act_list.append(time_step[sliceObj])
-        return next_act_list
+    global display_cols, mode, console_message, max_subplots
 
     action_set = {'p', 'n', 'q'}
     step = 12 # this is number of activations we will display
 
-    if cycleno == 0:
+    if model.cycleno == 0:
         mode = 'Error'
         console_message = 'No data available until a cycle is run.'
         return
@@ -715,13 +459,14 @@ def doDisplaySubPlots_NEW():
     buildConsoleMsg()
 
     # Since we want to be able to handle large lexicon, let the user cycle through 10 at a time
-    iterations = divmod(len(act_dataset[0]), step)  # (quotient, remainder)
+    dataset = model.wordDataset()
+    iterations = divmod(dataset.getNumUnits(), step)  # (quotient, remainder)
     pos = 0
     i_pos = 0
 
     while True:
-        next_act_dataset = build_next_act_list(act_dataset, i_pos, i_pos + step)
-        key_list = build_key_list(next_act_dataset[0])
+        next_act_dataset = dataset.getData()[:, i_pos:i_pos + step]
+        key_list = dataset.getKeys()[i_pos:i_pos + step]
         num_words = len(key_list)
         display_rows = int(math.ceil(num_words / display_cols))
         word_ctr = 0
@@ -730,13 +475,13 @@ def doDisplaySubPlots_NEW():
         for i in range(display_rows):
             for j in range(int(display_cols)):
                 if word_ctr <= (num_words - 1):
-                    axarr[i][j].plot(x_vals, extract_col(word_ctr, next_act_dataset))
+                    axarr[i][j].plot(x_vals, next_act_dataset[:, word_ctr])
                     axarr[i][j].set_title('%s' % key_list[word_ctr], va='center', size='small', weight='demi',
                                           style='italic')
                     word_ctr += 1
 
-        word_act, l1, l2, l1schema, l2schema = getActivations()
-        plt.suptitle('Input word: {0:s} Activ: {1:4f}'.format(input_word.upper(), word_act), size='large',
+        word_act, l1, l2, l1schema, l2schema = model.getActivations()
+        plt.suptitle('Input word: {0:s} Activ: {1:4f}'.format(model.input_word.upper(), word_act), size='large',
                      weight='bold')
         plt.setp([a.get_xticklabels() for a in axarr[0, :]], visible=False)
         plt.setp([a.get_yticklabels() for a in axarr[:, 0]], size='x-small')
@@ -767,10 +512,11 @@ def doDisplaySubPlots_NEW():
 #   Provides a user interface for altering the IAC parameters.
 #   Note: Must reset the model as well
 def doSetParams():
-    global params, mode, console_message
+    global mode, console_message
 
     def mapvars(kwargs):
-        global params, mode, console_message
+        global mode, console_message
+        params = model.params
         if kwargs != ['']:
 
             for key in kwargs:
@@ -786,18 +532,64 @@ def doSetParams():
     mode = 'Parameter reset'
     p = raw_input('Enter params separated by a comma:').split(',')
     mapvars(p)
-    console_message = 'Params: ' + repr(params)
+    console_message = 'Params: ' + repr(model.params)
+    return
+
+
+#   Turns the compiled sparse-matrix engine on/off
+def doEngine():
+    global mode, console_message
+    mode = 'Engine'
+    if model.network_cached:
+        mode = 'Error: Engine'
+        console_message = 'Network loaded from cache: it only runs on the compiled engine'
+        return
+    model.use_engine = not model.use_engine
+    if model.use_engine:
+        network = model.compileNetwork()
+        console_message = 'Compiled engine on: {0:d} units, {1:d} weight entries'.format(
+            network.getNumUnits(), network.getNNZ())
+    else:
+        console_message = 'Compiled engine off'
+    return
+
+
+#   Stream the activation traces to disk, keeping only a window of cycles in memory, or back to memory only.
+#   Starts new traces. Asks again until the window is blank (keep the current one) or a whole number of at least 1.
+def doTraceSpill():
+    global mode, console_message
+    mode = 'Trace to disk'
+    spill_dir = raw_input('Enter trace directory (blank to keep traces in memory): ').strip()
+    if spill_dir == '':
+        model.setTraceDir(None)
+        console_message = 'Traces kept in memory'
+    elif not os.path.isdir(spill_dir):
+        mode = 'Error'
+        console_message = 'Trace directory does not exist: ' + repr(spill_dir)
+        return
+    else:
+        while True:
+            window = raw_input('Enter number of cycles kept in memory [{0:d}]: '.format(model.trace_window)).strip()
+            if window == '':
+                model.setTraceDir(spill_dir)
+                break
+            try:
+                model.setTraceDir(spill_dir, int(window))
+                break
+            except ValueError:
+                print '          Not a number of cycles of at least 1: ' + repr(window)
+        console_message = 'Traces streamed to {0:s}, {1:d} cycles in memory'.format(spill_dir, model.trace_window)
     return
 
 
 #   Turns verbose flag on/off
 def doLogging():
-    global verbose, mode, console_message, input_word
-    console_message = 'You entered: {0:s}'.format(input_word)
+    global mode, console_message
+    console_message = 'You entered: {0:s}'.format(model.input_word)
     mode = 'Verbose'
-    if verbose is True:
-        verbose = False
-    else: verbose = True
+    if model.verbose is True:
+        model.verbose = False
+    else: model.verbose = True
     return
 
 
@@ -807,164 +599,22 @@ def doExit():
 
 
 #   Read new word stimuli from file and update lets, words, and lang pools
-#   Steps to add a new word to Word pool
-#   1. copy word3,word4, or word5 template and make lets_word projections dictionary (+)
-#   2. copy word_si_template, replacing 'new_word" with corresponding string literal of new word (+)
-#   3. in lets_word_proj dict, replace the inhib weight with the excit weight in each letter unit corresponding to the
-#      letter pos in the new_word (+)
-#   4a Scan through all the words in the pool and build a self-inhibitory list and append to lets_word proj dict
-#   4b While scanning words in pool (step 4a), append copied word_si_template to its unit
-#   5. add new dictionary entry to word pool: key = new word string, value = new_word proj list
-#
-#   Steps to add a new word to Lets pool
-#   1. copy word_lets_template, replacing 'new_word' with string literal of word to be added (+)
-#   1. For each let in new word, find corresponding let and let position unit in lets pool
-#      and append wordn_lets_template (+)
-#
-#   Steps to add new word to Lang pool
-#   1. copy word_lang_template, replacing 'new_word' with string literal of new word
-#   1. append copied word_lang_template to proj list in appropriate lang pool
+#   All stimuli are added in one pass by IA_lexicon.build_lexicon (see there for the projections each word gets),
+#   giving the same projections as adding the words one at a time from the templates in IA_pools.
 
 #   Stimuli in CSV file format, i.e., word,language,resting_activation\n
 
 def doAutoLoad():
-    global mode, console_message, a2z, rest
-
-    def is_number(s):
-        try:
-            float(s)
-            return True
-        except ValueError:
-            return False
-
-    def load_stimuli(file_str):
-        i = 0
-        csv_pattern = re.compile(',')
-        script = []
-        with open(file_str) as f:
-            for i, line in enumerate(f):
-                line = line.strip()
-                split = csv_pattern.split(line)
-                # split[-1] = split[-1][:-1]
-                script.append(split)
-        print('*** Read (%d) words ***' % (i + 1))
-        return script
-    #
-    # Create the letter dictionary. This is used to locate the offset (letter X position-in-word) of the letter unit
-
-    let_dict = {v: k for k, v in enumerate(a2z)}
+    global mode, console_message
 
     stimuli_file = raw_input('             Please enter the stimuli filename: ')
-    if not os.path.isfile(stimuli_file):
-        mode = 'Error: Auto-load'
-        console_message = 'Stimuli file does not exist: ' + repr(stimuli_file)
-        return
-    stimuli = load_stimuli(stimuli_file)
     print '*** Building Pools. This may take a moment. ***'
     mode = 'Auto-loading Stimuli'
-    #
-    # process each stimulus
-
-    # ARI_EDIT
-    nonword_resting_activation = 0.0
-
-    for new_stim in stimuli:
-        resting_activation = params['rest'] # we can alter the default resting level for auto-loaded words this way
-        nonword_resting_activation = resting_activation
-
-        # stimulus properly formatted?
-        if len(new_stim) < 2:
-            mode = 'Error: Auto-load'
-            console_message = 'Stimuli improperly formatted'
-            break
-        new_word = new_stim[0].lower()
-        language = new_stim[1].lower()
-        # do we have a resting activation?
-        if len(new_stim) == 3:
-            if  not is_number(new_stim[2]):
-                mode = 'Warning: Auto-load'
-                # console_message = 'Resting value is not a float ' + repr(new_stim)
-                console_message = 'One or more resting values defaulted'
-                resting_activation = params['rest']
-            else:
-                resting_activation = float(new_stim[2])
-        # language recognized?
-        if language not in lang:
-            mode = 'Error: Auto-load'
-            console_message = 'Unknown language attribute ' + repr(language)
-
-            break
-        # word length 3, 4, or 5?
-        if len(new_word) not in word_lets_template:
-            mode = 'Error: Auto-load'
-            console_message = 'Stimulus 3 <= word <= 5 lets'
-            break
-
-        # passed preliminary error checking
-        # make a deep copy of the word_lets and word_si templates, updating placeholder with our new word
-        word_lets_proj = copy.deepcopy(word_lets_template[len(new_word)])
-        word_lets_proj[0][0] = new_word  # word projections for corresponding letters in the lets pool
-        word_lang_proj = copy.deepcopy(word_lang_template)
-        word_lang_proj[0][0] = new_word  # word projection for corresponding language
-        new_word_si = copy.deepcopy(word_si_template)
-        new_word_si[0][0] = new_word      # new_word si projection appended to proj list of all other word units
-        #
-        # deep copy word3,word4, or word5 template and make new_word projections list: lets_word_proj
-        # lets_word_proj are all the projections from corresponding letter positions to the new word
-        word_len = len(new_word)
-        lets_word_proj = copy.deepcopy(lets_word_template[word_len])
-
-        # in lets_word_proj dict, replace the inhib weight with the excit weight in each letter unit corresponding
-        # to the letter pos in the new_word
-        for pos, let in enumerate(new_word):
-            list_index = (let_dict[let] * word_len) + pos
-            lets_word_proj[list_index][1] *= -1
-
-        # Scan through all the words in the pool and build word_si_list and EXTEND lets_word proj dict
-        # While scanning words in pool (step 4a), append copied word_si_template to its unit
-        word_si_list = []
-        for word in words:
-            # print word
-            word_si = copy.deepcopy(word_si_template)  # a word self-inhibitory projection
-            word_si[0][0] = word
-            word_si_list.append(word_si)    # build the si list of all words except new_word
-            if not words[word][0].isProjNone():
-                unit_proj_list = words[word][0].getProjList()
-                unit_proj_list.append(new_word_si)
-             # print new_word_si
-             # print unit_proj_list
-                words[word][0].setProjList(unit_proj_list)
-            else: print "isProjNone: word pool. " + word
-
-        # add new_word to the word pool: key: new word string value; lets_word_proj dict
-        # NOTE: We EXTEND the lets_word_proj list to create the properly formatted projection list
-        lets_word_proj.extend(word_si_list)
-        words[new_word] = [Unit(lets_word_proj, resting_activation)]
-
-
-    # print(new_word + ': ' + repr(words[new_word][0].getProjList()))
-
-    # For each let in new word, find corresponding let and let position unit in lets pool and append wordn_lets_template
-        for pos in range(len(new_word)):
-            if not lets[new_word[pos]][pos].isProjNone():
-                unit_proj_list = lets[new_word[pos]][pos].getProjList()
-                unit_proj_list.append(word_lets_proj)
-                lets[new_word[pos]][pos].setProjList(unit_proj_list)
-            else:
-                lets[new_word[pos]][pos].setProjList([word_lets_proj])
-
-    # Append the new word to the corresponding language pool
-        if not lang[language][0].isProjNone():
-            lang_proj_list = lang[language][0].getProjList()
-            lang_proj_list.append(word_lang_proj)
-            lang[language][0].setProjList(lang_proj_list)
-        else:
-            lang[language][0].setProjList([word_lang_proj])
-
-
-    # ARI_EDIT
-    words['non-word'] = [Unit(activation=nonword_resting_activation)] # set the activation, no projections to letters
-
+    status, message = model.autoLoad(stimuli_file, network_cache_dir)
+    if status is not None:
+        mode = status
+    if message is not None:
+        console_message = message
 
     #   DEBUGGING CODE
     # printLets()
@@ -974,8 +624,8 @@ def doAutoLoad():
 #  *************** script versions of above model operations ************************
 
 #   This processes a simple script of records to automate the testing process.
-#   Note: error processing is VERY limited. Best to assume script items are correct.
-#   Each record is in CSV format and invokes a model function as follows:
+#   The script is compiled first (see IA_script.compile_script): a script with unknown commands, unknown items or bad
+#   cycle counts is reported and not run at all. Each record is in CSV format and invokes a model function as follows:
 #   ['r']                resets the model
 #   ['n',word]           present a new 3 to 5 letter word to the lets pool
 #   ['c1' | 'c2']        turns on cue1 or cue2 and turns off complementary cue
@@ -986,187 +636,70 @@ def doAutoLoad():
 #   ['d',item1,item2,...itemn}  displays plot of listed items
 #   ['t',comment]        adds a trace rec to a log table with: cycleno, word (act), l1, l2, l1schema, l2schema, comment
 #   ['pt']               prints all trace records in the log file to std output i.e. console
-#   ['wt']               creates log.csv file containing all trace records in CSV format
+#   ['wt',file]          writes all trace records to file (default: log.csv) in CSV format, or NPZ if file ends in .npz
+#   ['rsn',e,pool]       run settle network: cycles model until no unit of the network (or of pool, if given) changes
+#                        by more than e (default: the global e). Cycles-to-settle of each unit go to settle_cycles.
+#   ['rec',item1,...]    limits the activation traces (used by 'd') to the listed units, pools and/or top=K most active
+#                        words; with no items everything is traced. Starts new traces.
+#   ['ws',cue,ncycles]   warm start: resets the model and starts it from the state reached by cycling without a word,
+#                        cue (c1, c2 or none) on, for ncycles (until it settles if none given). The state is computed
+#                        once per cue and ncycles, and restored by every later warm start.
+#   ['cs',file]          checkpoint save: saves the complete state of the model to file
+#   ['cr',file]          checkpoint restore: restores the state saved to file
 
 
 def scriptProcessor():
-    global script_mode, list_script, mode, item_script, cycleno, ncycles, log
-    #   Clear the ExtInput to the letters and the cues and cycle the network
-    #   Script command: ['B',ncycles]
-
-    def runBlankCycle():
-        global ncycles, mode, blankCycle
-        mode = 'runBlankCycles'
-        blankCycle = True
-        for pos in range(len(input_word)):
-            lets[input_word[pos]][pos].setExtInput(0)
-        cues['cue2'][0].setExtInput(0)
-        cues['cue1'][0].setExtInput(0)
-        for i in range(ncycles):
-            cycle_pool()
-        buildConsoleMsg()
-        ncycles = 0     # reset ncycle between script statements
-        return
-
-
-#   runCycle will cycle the model until ncycles
-    def runCycle():
-        global item_script, ncycles, e, mode
-        #
-        #   process ['rc', ncycles]
-        if ncycles != 0:
-
-            mode = 'runCycle ncycles'
-            for i in range(ncycles):
-                cycle_pool()
-            buildConsoleMsg()
-            ncycles = 0
-            return
-
-
-#   runSettle will cycle the model until the node given in item settles
-    def runSettle():
-        global item_script, ncycles, e, mode
-        #   process ['rs', item]
-        if item_script != '':
-            mode = 'runCycle until convergence'
-            if item_script in words:
-                unit = words[item_script][0]
-                last_act = unit.getActivation()
-            elif item_script in lang:
-                unit = lang[item_script][0]
-                last_act = unit.getActivation()
-            elif item_script in schemas:
-                unit = schemas[item_script][0]
-                last_act = unit.getActivation()
-            else:
-                mode = 'Error in Run Cycle Script'
-                buildConsoleMsg()
-                return
-
-            # Check for convergence to epsilon
-            cycleno_settle = 0
-            while True:
-                cycle_pool()
-                curr_act = unit.getActivation()
-                # give it a few cycles to become activated but don't let it run away!
-                cycle_range = (5 < cycleno_settle < 10000)
-                if (abs((last_act - curr_act)) <= e) and cycle_range:
-                    break
-                else:
-                    last_act = curr_act
-                    cycleno_settle += 1
-        buildConsoleMsg()
-        return
-
-
-#   read and load the script
-    def load_script(file_str):
-        print('Loading script')
-        csv_pattern = re.compile(',')
-        script = []
-        with open(file_str) as f:
-            for line in f:
-                split = csv_pattern.split(line)
-                split[-1] = split[-1][:-1]
-                script.append(split)
-        return script
-
-    #   Logs events to log list
-    def runTrace():
-        global log, item_script, blankCycle
-
-        rec = list(getActivations())        # this unpacks the tuple and converts to a list
-        rec = [round(act,4) for act in rec] # round to a reasonable precision
-        if not blankCycle:
-            rec.insert(0,input_word)           # append item_script to front of list
-        else:
-            rec.insert(0,'BLANK')           # append item_script to front of list
-
-        rec.insert(0,item_script)
-        rec.extend([cycleno])
-        rec.extend([0])                     # this is a placeholder for event duration
-        log.append(rec)
-        return
+    global mode, console_message
 
-    #   Prints a formatted trace to std output
-    def printTrace():
-        global log
-        for i in log:
-            print i
-        return
+    #   'd' displays the listed items, which must be units of the model
+    def compileDisplay(model, args, warnings):
+        for item in args:
+            if not sc.find_item(model, item.lower()):
+                raise ValueError(item + ' Item not found in pool.')
+        return displayItems, (list(args),)
 
-    #   write log to CSV file
-    def writeCSV():
-        global log, input_word
-        header = ['Type','Input','Word','L1','L2','L1 LDT','L2 LDT','No. cycles','Event duration']
-        last_cycleno = 0
-        with open('log.csv', 'wb') as csvfile:
-            logwriter = csv.writer(csvfile)
-            logwriter.writerow(header)
-            for rec in log:
-                event_duration = rec[7] - last_cycleno
-                rec[8] = event_duration
-                logwriter.writerow(rec)
-                last_cycleno = rec[7]
-        csvfile.close()
+    def displayItems(model, items):
+        doDisplayItems(items)
         return
 
-
-    def showScriptProgress():
-        instr_params = str(line[1:]).strip('[]')
+    def showScriptProgress(instr, result):
+        global console_message
+        if instr.op is not displayItems:
+            buildConsoleMsg()
+        if instr.op in (im.BIAModel.settle, im.BIAModel.settleItem):
+            console_message = 'Settled in {0:d} cycles\n          '.format(result) + console_message
+        instr_params = str(instr.line[1:]).strip('[]')
         print '-----------------------------------------------------'
-        print '           Script: %s %s Mode: %s' % (instr, instr_params, mode)
-        print ('                Trial: %d Cycle: %d' % (trial, cycleno))
+        print '           Script: %s %s Mode: %s' % (instr.line[0], instr_params, mode)
+        print ('                Trial: %d Cycle: %d' % (model.trial, model.cycleno))
         print
         print ('          %s' % console_message)
         return
 
-#   Script processing is implemented as a switch using a Python dictionary
-    run_script = {
-        'b':    runBlankCycle,
-        'c1':   doSetCue1,
-        'c2':   doSetCue2,
-        'd':    doDisplayItems,
-        'n':    doNewWord,
-        'pt':   printTrace,
-        'r':    reset,
-        'rc':   runCycle,
-        'rs':   runSettle,
-        't':    runTrace,
-        'wt':   writeCSV
-    }
-
-    #   Read the script and process each items
+    #   Read the script, compile it and run it
     script_name = raw_input('             Please enter the script filename: ')
-    script = load_script(script_name)
-    script_mode = True
-    ncycles = 0
-    list_script = []
-    item_script = ''
-    temp = params['ncycles']
-    params['ncycles'] = 1
-    print script
-    #
-    #   pre-process script instructions
-    for line in script:
-        instr = line[0]
-
-        if instr not in run_script:
-            mode = 'Error in Script. Command not found.'
-            buildConsoleMsg()
-            break
-        if (instr == 'rc') or (instr == 'b'):
-            ncycles = int(float(line[1]))  # just in case a floating point is entered
-        if (instr == 'rs') or (instr == 'n') or (instr == 't'):
-            item_script = line[1]
-        if instr == 'd':
-            list_script = line[1:]
-        run_script.get(instr,errhandler)()
-        showScriptProgress()
-    script_mode = False
-    params['ncycles'] = temp
-    #writeCSV()
+    print('Loading script')
+    try:
+        script = sc.load_script(script_name)
+    except IOError as err:
+        mode = 'Error in Script'
+        console_message = '{0:s}: {1:s}'.format(script_name, err.strerror)
+        return
+    program, errors, warnings = sc.compile_script(model, script, 'log.csv', ops={'d': compileDisplay})
+    for message in warnings:
+        print '          Warning: ' + message
+    if len(errors) > 0:
+        mode = 'Error in Script. Nothing was run.'
+        console_message = '\n          '.join(errors)
+        return
+    mode = 'Running script'
+    error = sc.execute(model, program, showScriptProgress)
+    if error is not None:
+        mode = 'Error in Script'
+        console_message = error
+        return
+    mode = 'Script done'
+    buildConsoleMsg()
     return
 
 
@@ -1193,9 +726,10 @@ def showBanner():
     print '              R:  Reset model'
     print '              S:  Script processor'
     print '              T:  Toggle logging'
+    print '              TD: Trace to disk'
     print '              X:  Exit program'
     print
-    print ('          Trial: %d Cycle: %d Mode: %s' % (trial, cycleno, mode))
+    print ('          Trial: %d Cycle: %d Mode: %s' % (model.trial, model.cycleno, mode))
     print ('          %s' % console_message)
     print '******************************************************'
     return
@@ -1209,6 +743,7 @@ takeaction = {
     'D1': doDisplay,
     'D2': doDisplaySubPlots_NEW,
     'D10': doDisplayTop10,
+    'E': doEngine,
     'L': doDisplayLang,
     'P': doSetParams,
     'PAZ': printLets,
@@ -1220,15 +755,17 @@ takeaction = {
     'R': reset,
     'S': scriptProcessor,
     'T': doLogging,
+    'TD': doTraceSpill,
     'X': doExit
 }
 #   ****************************Model's User Interface Processing Loop*********************************
-plt.ion()   # turn on interactive charting
-while True:
-    showBanner()
-    action = raw_input('             Please enter an action: ')
-    takeaction.get(action.upper(),errhandler)()
-    # plt.show()
+if __name__ == '__main__':
+    plt.ion()   # turn on interactive charting
+    while True:
+        showBanner()
+        action = raw_input('             Please enter an action: ')
+        takeaction.get(action.upper(),errhandler)()
+        # plt.show()
 
 
 
@@ -0,0 +1,163 @@
+#!/usr/bin/python
+import os, sys, argparse
+import IA_model as im
+import IA_script as sc
+import IA_cache as ca
+import IA_store as st
+
+# IA_batch.py: Headless batch runner for BIA/BIAPlus Model scripts
+#
+# Runs one or many script files (see IA_script) unattended, without the console UI and without matplotlib, e.g.
+#   python IA_batch.py -o results -s lexicon_1300.csv --engine scripts/*.txt
+# Every script runs trial by trial (the stretches between resets, see IA_script.run_trials), each trial from a reset
+# model, and the trace records of all its trials are merged in script order into the one log of the script, written
+# once the script ends to <output dir>/<script name>.csv (.npz with --format npz, see IA_model.write_log), with the
+# cycles every 'rs' and 'rsn' took to settle in <output dir>/<script name>.settle.csv (in the .npz). The log is
+# the same whichever of the options below runs the trials. 'wt' records are ignored, as the whole log is written
+# anyway; nothing is written to the log.csv of the UI, so batch runs with different output dirs never overwrite each
+# other's logs. Scripts that fail are reported on stderr and the exit status is 1. Every script is compiled first (see
+# IA_script.compile_script): a script with errors is not run at all, and its warnings (e.g. stimuli that are not in
+# the lexicon) are reported on stderr.
+#
+# With --jobs N the trials of each script run on a pool of N worker processes, each with its own copy of the model.
+#
+# With --result-cache DIR the trace logs of the trials are kept in DIR (see IA_script, Result cache), and a trial
+# that was run before with the same params and network is read back instead of simulated.
+#
+# With --share-prefixes the trials run in this process on a prefix tree (see IA_script, Prefix tree): the records
+# that trials start with in common run once, and every trial continues from a checkpoint of the state they lead to.
+#
+# With --db FILE every trial is also added to the SQLite database FILE (see IA_store): its script, stimulus, language,
+# cue, params, trace log records, settles, per-cycle word activations and RT (at each distinct --rt-threshold), to be
+# queried across runs.
+
+__author__ = 'Andy Valenti'
+__copyright__ = "Copyright 2016. Tufts University"
+
+
+#   File of the trace log of a script: log_format is csv or npz
+def log_path(output_dir, script_file, log_format='csv'):
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(script_file))[0] + '.' + log_format)
+
+
+#   'name=value' -> (name, float value) for a params override
+def param_arg(text):
+    name, sep, value = text.partition('=')
+    if sep == '' or name not in im.default_params:
+        raise argparse.ArgumentTypeError('expected one of {0:s} as name=value'.format(sorted(im.default_params)))
+    return name, float(value)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Run BIA model scripts without the console UI.')
+    parser.add_argument('scripts', nargs='+', help='script files')
+    parser.add_argument('-o', '--output-dir', required=True, help='directory for the trace logs')
+    parser.add_argument('-f', '--format', choices=('csv', 'npz'), default='csv', help='file format of the trace logs')
+    parser.add_argument('-s', '--stimuli', help='stimuli file to auto-load before running the scripts')
+    parser.add_argument('-e', '--engine', action='store_true', help='run on the compiled sparse-matrix engine')
+    parser.add_argument('--cache-dir', default=None, help='network cache directory (with --engine)')
+    parser.add_argument('-p', '--param', action='append', type=param_arg, default=[], metavar='NAME=VALUE',
+                        help='set a model parameter, e.g. -p alpha=0.2 (repeatable)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='run the trials of a script on JOBS processes')
+    parser.add_argument('--share-prefixes', action='store_true',
+                        help='run the leading records that trials have in common once (not with --jobs)')
+    parser.add_argument('--result-cache', default=None, metavar='DIR', help='cache the trace logs of trials in DIR')
+    parser.add_argument('--result-cache-size', type=int, default=10000, metavar='N',
+                        help='most trials kept in the result cache (least recently used ones are removed)')
+    parser.add_argument('--db', default=None, metavar='FILE', help='add the trials to the SQLite database FILE')
+    parser.add_argument('--rt-threshold', type=float, action='append', default=[], metavar='T',
+                        help='word activation that counts as the RT in the database (repeatable; default 0.5)')
+    return parser.parse_args(argv)
+
+
+#   Build the model of a batch, auto-loading stimuli if given. Returns the model, or None if the stimuli did not load.
+def new_model(stimuli=None, use_engine=False, cache_dir=None, params=None):
+    model = im.BIAModel(params=params, use_engine=use_engine)
+    if stimuli is not None:
+        status, message = model.autoLoad(stimuli, cache_dir)
+        if status == 'Error: Auto-load':
+            print >> sys.stderr, 'Error: ' + message
+            return None
+        elif status is not None:
+            print >> sys.stderr, status + ': ' + message
+    return model
+
+
+#   Builds the model, then runs every script on it (or on a pool of jobs copies of it). result_cache: the
+#   IA_cache.ResultCache of the trials, if any. share_prefixes: run the trials on a prefix tree (in this process).
+#   log_format: csv or npz. store: the IA_store.ResultStore the trials are added to, with RTs at rt_thresholds (each
+#   once), if any.
+#   Returns the number of scripts that failed.
+def run_batch(scripts, output_dir, stimuli=None, use_engine=False, cache_dir=None, params=None, jobs=1,
+              result_cache=None, share_prefixes=False, log_format='csv', store=None, rt_thresholds=(0.5,)):
+    model = new_model(stimuli, use_engine, cache_dir, params)
+    if model is None:
+        return len(scripts)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    paths = [log_path(output_dir, script_file, log_format) for script_file in scripts]
+    if len(set(paths)) < len(paths):
+        print >> sys.stderr, 'Error: script names must be unique, their logs are written to <output dir>/<name>.' + \
+                             log_format
+        return len(scripts)
+
+    pool = None
+    if jobs > 1:
+        pool = sc.trial_pool(model, jobs, new_model, (stimuli, use_engine, cache_dir, params), result_cache)
+    else:
+        sc.set_worker(model, result_cache)
+    if store is not None:
+        run = store.newRun(stimuli, model.networkKey(), use_engine)
+        param_set = store.getParamSet(model.params)
+        rt_thresholds = sorted(set(rt_thresholds))     # an RT per trial and threshold
+    failed = 0
+    for i, (script_file, path) in enumerate(zip(scripts, paths)):
+        model.reset()
+        try:
+            script = sc.load_script(script_file)
+        except IOError as err:
+            failed += 1
+            print >> sys.stderr, '{0:s}: {1:s}'.format(script_file, err.strerror)
+            continue
+        errors, warnings = sc.compile_script(model, script)[1:]
+        for message in warnings:
+            print >> sys.stderr, '{0:s}: warning: {1:s}'.format(script_file, message)
+        if len(errors) > 0:
+            failed += 1
+            for message in errors:
+                print >> sys.stderr, '{0:s}: {1:s}'.format(script_file, message)
+            continue
+        if pool is None and share_prefixes:
+            logs, error = sc.run_trial_tree(script)
+        else:
+            logs, error = sc.run_trials(pool, script)
+        im.write_log(path, logs)
+        if store is not None:
+            store.addTrials(run, param_set, script_file, sc.split_trials(script), logs, error, rt_thresholds)
+        if error is not None:
+            failed += 1
+            print >> sys.stderr, '{0:s}: {1:s}'.format(script_file, error)
+        print '[{0:d}/{1:d}] {2:s}: {3:d} trace records -> {4:s}'.format(i + 1, len(scripts), script_file,
+                                                                        sum(map(len, logs)), path)
+    if pool is not None:
+        pool.close()
+        pool.join()
+    return failed
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    if args.share_prefixes and args.jobs > 1:
+        print >> sys.stderr, 'Error: --share-prefixes runs the trials in this process; it cannot be used with --jobs'
+        sys.exit(1)
+    result_cache = None
+    if args.result_cache is not None:
+        result_cache = ca.ResultCache(args.result_cache, args.result_cache_size)
+    store = None
+    if args.db is not None:
+        store = st.ResultStore(args.db)
+    failed = run_batch(args.scripts, args.output_dir, args.stimuli, args.engine, args.cache_dir, dict(args.param),
+                       args.jobs, result_cache, args.share_prefixes, args.format, store, args.rt_threshold or [0.5])
+    if store is not None:
+        store.close()
+    sys.exit(1 if failed > 0 else 0)
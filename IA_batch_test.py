@@ -0,0 +1,33 @@
+import os, shutil, tempfile
+import IA_batch as bt
+import IA_cache as ca
+
+# The log of a script is the merged log of all its trials, whichever way the trials are run; also when it saves a
+# checkpoint ('cs'), which a later trial may restore ('cr'): the records of the trials before its last reset are kept
+
+work = tempfile.mkdtemp()
+checkpoint = os.path.join(work, 'prime.ckpt')
+scripts = {
+	'trials': ['c1', 'n,hello', 'rc,10', 't,hello', 'r', 'c2', 'n,cama', 'rc,10', 't,cama', 'r', 'n,hola', 'rc,5',
+			   't,hola'],
+	'saved': ['c1', 'n,hello', 'rc,10', 't,hello', 'cs,' + checkpoint, 'r', 'c2', 'n,cama', 'rc,10', 't,cama', 'r',
+			  'n,hola', 'rc,5', 't,hola'],
+	'restored': ['c1', 'n,hello', 'rc,10', 'cs,' + checkpoint, 't,hello', 'r', 'n,hola', 'rc,5', 't,hola', 'r',
+				 'cr,' + checkpoint, 'n,cama', 'rc,10', 't,cama']}
+script_files = []
+for name in sorted(scripts):
+	script_files.append(os.path.join(work, name + '.txt'))
+	with open(script_files[-1], 'w') as f:
+		f.write('\n'.join(scripts[name]) + '\n')
+
+logs = {}
+for name, options in (('plain', {}), ('jobs', {'jobs': 2}), ('prefixes', {'share_prefixes': True}),
+		('cache', {'result_cache': ca.ResultCache(os.path.join(work, 'cache'))})):
+	bt.run_batch(script_files, os.path.join(work, name), **options)
+	for script in scripts:
+		with open(os.path.join(work, name, script + '.csv')) as f:
+			logs.setdefault(script, []).append(f.read())
+print str(len(logs['trials'][0].splitlines()) == 4)
+print str(all(log == logs['trials'][0] for log in logs['trials'] + logs['saved']))
+print str(len(logs['restored'][0].splitlines()) == 4 and all(log == logs['restored'][0] for log in logs['restored']))
+shutil.rmtree(work)
@@ -0,0 +1,89 @@
+import os, json, hashlib
+from IA_util import to_str
+
+# IA_cache.py: Persistent cache of simulation results
+#
+# A ResultCache keeps JSON-encodable results in a directory, one <key>.json file per result, where the key is the
+# SHA-1 of everything the result depends on (see ResultCache.key). Results are written under a temporary name and
+# renamed, so the cache can be shared by the worker processes of a pool and by runs of the model one after the other.
+# Reading a result touches its file; once the cache holds more than max_entries results, the least recently used
+# ones (the oldest modification times) are removed, down to evict_fraction of max_entries at once. A cache counts the
+# results it adds rather than listing the directory on every put; the directory is only listed (and the count set to
+# what is in it, whichever processes added it) when the count goes over max_entries.
+
+
+evict_fraction = 0.9     # of max_entries left in a cache after an eviction
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_entries=10000):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.entries = None         # number of results in the cache, as of the last listing plus those put since
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                if not os.path.isdir(cache_dir):     # not just made by another process
+                    raise
+
+    #   Key of a result: the SHA-1 of its JSON-encodable parts
+    def key(self, *parts):
+        return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+    def getPath(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    #   The result stored under key, or None
+    def get(self, key):
+        path = self.getPath(key)
+        try:
+            with open(path, 'rb') as f:
+                value = to_str(json.load(f))
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self.getPath(key)
+        partial = path + '.' + repr(os.getpid())
+        with open(partial, 'wb') as f:
+            json.dump(value, f)
+        if self.entries is None:
+            self.entries = len(self.listEntries())
+        if not os.path.isfile(path):
+            self.entries += 1
+        os.rename(partial, path)
+        if self.entries > self.max_entries:
+            self.evict()
+        return
+
+    def listEntries(self):
+        return [name for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+
+    #   Remove the least recently used results beyond max_entries, down to evict_fraction of max_entries
+    def evict(self):
+        entries = self.listEntries()
+        self.entries = len(entries)
+        if len(entries) <= self.max_entries:
+            return
+        keep = int(self.max_entries * evict_fraction)
+        used = []
+        for name in entries:
+            try:
+                used.append((os.path.getmtime(os.path.join(self.cache_dir, name)), name))
+            except OSError:
+                pass            # removed by another process
+        used.sort()
+        for mtime, name in used[:len(used) - keep]:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+        self.entries = min(len(used), keep)
+        return
@@ -0,0 +1,21 @@
+import os, shutil, tempfile
+import IA_cache as ca
+
+# A result comes back as it was put, in a new cache on the same directory too; a full cache drops the least recently
+# used results, so it never holds more than max_entries
+
+work = tempfile.mkdtemp()
+cache = ca.ResultCache(os.path.join(work, 'cache'), max_entries=10)
+key = cache.key('trial', 1, {'alpha': 0.1})
+cache.put(key, [['t'], [12], [0.5, 0.25]])
+print str(cache.get(key) == [['t'], [12], [0.5, 0.25]] and cache.get(cache.key('trial', 2)) is None)
+print str(ca.ResultCache(cache.cache_dir).get(key) == [['t'], [12], [0.5, 0.25]])
+
+for i in range(30):
+	cache.put(cache.key('trial', i + 2), i)
+	cache.get(key)
+	if len(os.listdir(cache.cache_dir)) > 10:
+		break
+print str(len(os.listdir(cache.cache_dir)) <= 10 and cache.get(key) is not None)
+print str(cache.get(cache.key('trial', 2)) is None and cache.get(cache.key('trial', 31)) == 29)
+shutil.rmtree(work)
@@ -0,0 +1,736 @@
+import os, json, struct, hashlib
+import numpy as np
+import cohort_math_activations as cm
+import IA_trace as tr
+
+# IA_engine.py: Sparse-matrix execution engine for the BIA/BIAPlus Models
+#
+# The pools in IA_pools (lets, words, lang, schemas, cues) are compiled into a single activation vector and a
+# pair of CSR weight matrices, one holding the excitatory (weight > 0) projections and one the inhibitory
+# (weight < 0) projections. netInput and update then become NumPy matvec/elementwise operations which give the same
+# results as IA.netInput / IA.update walking the projection lists of every Unit.
+#
+# Word-to-word lateral inhibition: every word receives a projection of weight si from every other word, which is
+# O(N^2) entries. An auto-loaded word carries it as a lateral inhibition over the group of words of its load (see
+# Unit.getLateral), which is compiled into one UniformInhibition block per group,
+#   inhibition(word) = si * (sum of positive activations of the group)
+# plus an entry in the inhibitory matrix per delta sender (itself, a duplicate), O(N) in all. The explicit si
+# projections of the words of the default lexicon are factored the same way with lateral=True: words whose si
+# projections do not cover (at least half of) the pool keep their explicit entries; the few senders a covered word
+# lacks (itself, or e.g. the non-word unit for the default lexicon) are kept as correction entries in the inhibitory
+# matrix so the result stays equivalent to the explicit lists.
+#
+# Letter-to-word projections: a word built from lets_word_template[n] carries 26*n letter projections, all -w_n
+# except the n that match its own letters. With letter_index=True the inhibitory part is compiled into one
+# UniformInhibition block per letter position,
+#   inhibition(word) = -w_n * (sum over positions of the total positive letter activation at that position)
+# and the n matching letters (+w_n excitation, plus the correction of the uniform inhibition) are stored in a
+# (letter, position) -> word-id LetterIndex. The per-cycle letter-to-word cost then scales with the active letters
+# rather than with 26*n projections per word.
+#
+# Batches: every matvec also takes a (batch x units) matrix, one row per independent simulation. run_batch uses this
+# to present many stimuli at once through the same dynamics as IA.cycle_pool.
+#
+# Unit ordering: pools in the order given by pool_list, keys sorted within a pool, then position within the key.
+# Senders are taken from the references resolve_projections stores in each Unit.
+#
+# Saving: getArrays returns the compiled network (unit names and ordering, resting levels, and every weight block) as
+# flat arrays, which save_network writes to a flat binary network file. load_arrays maps that file read-only
+# (np.memmap), and a Network built with the mapped arrays binds to the Units of the pools by name and uses the weights
+# in place, without resolving or factoring any projections and without copying them: processes that load the same
+# network file share one physical copy of its weights through the page cache.
+
+
+#   Resolve every [[key,pos],weight] projection in the pools to a direct (sending Unit, weight) reference, stored in
+#   the receiving Unit (see Unit.getSenders). A key is looked up the way netInput always has: the first pool in
+#   pool_list holding the key wins. The whole graph is validated here, once; an unknown key or a position out of
+#   range raises ValueError. Must be called again whenever projections are added to the pools.
+#   The lateral inhibition of a unit (see Unit.getLateral) is resolved the same way, each group once.
+def resolve_projections(pool_list):
+    owner = {}
+    for pool in pool_list:
+        for key in pool:
+            if key not in owner:
+                owner[key] = pool[key]
+    groups = {}     # id(group) -> [sending Unit,..]
+    for pool in pool_list:
+        for key, unit_list in pool.items():
+            for unit in unit_list:
+                senders = []
+                if not unit.isProjNone():
+                    for sender in unit.getProjList():
+                        senders.append((resolve_sender(owner, sender[0][0], sender[0][1], key), sender[1]))
+                unit.setSenders(senders)
+                lateral_senders = None
+                if unit.getLateral() is not None:
+                    weight, group, delta = unit.getLateral()
+                    if id(group) not in groups:
+                        groups[id(group)] = [resolve_sender(owner, from_key, 0, key) for from_key in group]
+                    lateral_senders = (weight, groups[id(group)],
+                                       [(resolve_sender(owner, from_key, 0, key), count)
+                                        for from_key, count in sorted(delta.items())])
+                unit.setLateralSenders(lateral_senders)
+    return
+
+
+#   The sending Unit of a projection from [from_key,from_pos] to key (owner: key -> unit list of the first pool
+#   holding the key). Raises ValueError for an unknown key or a position out of range.
+def resolve_sender(owner, from_key, from_pos, key):
+    if from_key not in owner:
+        raise ValueError('resolve_projections: No pool found for ' + repr(from_key) + ' projecting to ' + repr(key))
+    if not 0 <= from_pos < len(owner[from_key]):
+        raise ValueError('resolve_projections: Position ' + repr(from_pos) + ' out of range for ' + repr(from_key) +
+                         ' projecting to ' + repr(key))
+    return owner[from_key][from_pos]
+
+
+#   Sum products into their receiving units: y[rows[k]] += products[k]. products is a vector, or a (batch x entries)
+#   matrix in which case y is (batch x num_units).
+def accumulate(rows, products, num_units):
+    if products.ndim == 1:
+        return np.bincount(rows, weights=products, minlength=num_units)
+    batch = products.shape[0]
+    slots = rows + num_units * np.arange(batch)[:, None]
+    return np.bincount(slots.ravel(), weights=products.ravel(), minlength=batch * num_units).reshape(batch, num_units)
+
+
+# Compressed Sparse Row matrix of projection weights.
+#   indptr:  row i owns the entries indptr[i]:indptr[i+1]
+#   indices: sending unit index of each entry
+#   data:    weight of each entry
+#   rows:    receiving unit index of each entry (expanded indptr), used to accumulate the products
+class CSRMatrix:
+    def __init__(self, rows, cols, weights, num_units):
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if np.all(rows[1:] >= rows[:-1]):              # already in row order (e.g. a mapped network file): no copy
+            self.rows, self.indices, self.data = rows, cols, weights
+        else:
+            order = np.argsort(rows, kind='mergesort')     # stable: keeps the projection order within a row
+            self.rows = rows[order]
+            self.indices = cols[order]
+            self.data = weights[order]
+        self.num_units = num_units
+        self.indptr = np.zeros(num_units + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.rows, minlength=num_units), out=self.indptr[1:])
+
+    def getNNZ(self):
+        return len(self.data)
+
+    #   (rows, cols, weights) of the entries, in row order
+    def getEntries(self):
+        return self.rows, self.indices, self.data
+
+    #   y = W . x, where x is typically the vector (or batch of vectors) of positive activations
+    def matvec(self, x):
+        return accumulate(self.rows, x[..., self.indices] * self.data, self.num_units)
+
+
+# Uniform inhibition from a group of sending units: receiver r gets weight[r] * (sum of x over senders).
+#   senders:   unit indices of the sending group
+#   receivers: unit indices of the receiving units
+#   weight:    one weight per receiver
+class UniformInhibition:
+    def __init__(self, senders, receivers, weight, num_units):
+        self.senders = np.asarray(senders, dtype=np.int64)
+        self.receivers = np.asarray(receivers, dtype=np.int64)
+        self.weight = np.asarray(weight, dtype=np.float64)
+        self.num_units = num_units
+
+    def getNumReceivers(self):
+        return len(self.receivers)
+
+    def matvec(self, x):
+        y = np.zeros(x.shape)
+        y[..., self.receivers] = self.weight * np.sum(x[..., self.senders], axis=-1)[..., None]
+        return y
+
+
+# (letter, position) -> word-id index of the letter-to-word projections, stored sender-major: the entries of letter
+# unit s are entries[indptr[s]:indptr[s+1]]. Excitatory and inhibitory entries are kept apart since they are scaled
+# by alpha and gamma respectively.
+class LetterIndex:
+    def __init__(self, letters, exc, inh, num_units):
+        self.letters = np.asarray(letters, dtype=np.int64)
+        self.num_units = num_units
+        slot = np.zeros(num_units, dtype=np.int64)
+        slot[self.letters] = np.arange(len(self.letters))
+        self.exc = self.__postings__(exc, slot)
+        self.inh = self.__postings__(inh, slot)
+
+    def __postings__(self, entries, slot):
+        rows = np.asarray(entries[0], dtype=np.int64)
+        weights = np.asarray(entries[2], dtype=np.float64)
+        senders = slot[np.asarray(entries[1], dtype=np.int64)]
+        indptr = np.zeros(len(self.letters) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(senders, minlength=len(self.letters)), out=indptr[1:])
+        if np.all(senders[1:] >= senders[:-1]):        # already sender-major (e.g. a mapped network file): no copy
+            return indptr, rows, weights
+        order = np.argsort(senders, kind='mergesort')
+        return indptr, rows[order], weights[order]
+
+    def getNNZ(self):
+        return len(self.exc[1]) + len(self.inh[1])
+
+    #   (rows, cols, weights) of the excitatory and of the inhibitory entries
+    def getEntries(self):
+        entries = []
+        for indptr, words, weights in (self.exc, self.inh):
+            entries.append((words, np.repeat(self.letters, np.diff(indptr)), weights))
+        return entries[0], entries[1]
+
+    #   returns the (excitation, inhibition) the active (positive) letters send to the words. For a batch, a letter is
+    #   gathered when it is active in any row.
+    def matvec(self, x):
+        active = x[..., self.letters] > 0
+        if active.ndim > 1:
+            active = active.any(axis=0)
+        active = np.nonzero(active)[0]
+        return self.__gather__(self.exc, active, x), self.__gather__(self.inh, active, x)
+
+    def __gather__(self, postings, active, x):
+        indptr, words, weights = postings
+        if len(active) == 0:
+            return np.zeros(x.shape)
+        entries = np.concatenate([np.arange(indptr[s], indptr[s + 1]) for s in active])
+        senders = np.repeat(self.letters[active], indptr[active + 1] - indptr[active])
+        return accumulate(words[entries], x[..., senders] * weights[entries], self.num_units)
+
+
+#   Factor the uniform inhibitory projections from a group of senders out of the inhibitory (rows, cols, weights)
+#   entries. A receiver qualifies when at least half of the group projects to it with the same (summed) weight.
+#   Returns the UniformInhibition block and the remaining (rows, cols, weights), which include a correction
+#   entry for every group member whose weight differs from the uniform one: the receiver itself, senders it lacks,
+#   senders listed more than once (a word auto-loaded twice), or the letters of the word itself.
+def factor_uniform(rows, cols, weights, group, num_units, receivers=None):
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    group = np.asarray(group, dtype=np.int64)
+    in_group = np.zeros(num_units, dtype=bool)
+    in_group[group] = True
+    group_pos = np.zeros(num_units, dtype=np.int64)
+    group_pos[group] = np.arange(len(group))
+    is_receiver = in_group
+    if receivers is not None:
+        is_receiver = np.zeros(num_units, dtype=bool)
+        is_receiver[receivers] = True
+
+    in_block = is_receiver[rows] & in_group[cols]
+    block = np.nonzero(in_block)[0]
+    block = block[np.argsort(rows[block], kind='mergesort')]
+    uniform_receivers = []
+    receiver_weights = []
+    drop = np.zeros(len(rows), dtype=bool)
+    extra_rows, extra_cols, extra_weights = [], [], []
+    if len(block) > 0:
+        block_rows = rows[block]
+        starts = np.concatenate(([0], np.nonzero(np.diff(block_rows))[0] + 1))
+        ends = np.append(starts[1:], len(block))
+        for start, end in zip(starts, ends):
+            entries = block[start:end]
+            if 2 * len(entries) < len(group):
+                continue
+            total = np.zeros(len(group))
+            np.add.at(total, group_pos[cols[entries]], weights[entries])
+            values, counts = np.unique(total[total != 0.0], return_counts=True)
+            weight = values[np.argmax(counts)]
+            if 2 * np.max(counts) < len(group):
+                continue
+            rcvr = block_rows[start]
+            uniform_receivers.append(rcvr)
+            receiver_weights.append(weight)
+            drop[entries] = True
+            differs = np.nonzero(total != weight)[0]
+            extra_rows.extend([rcvr] * len(differs))
+            extra_cols.extend(group[differs].tolist())
+            extra_weights.extend((total[differs] - weight).tolist())
+
+    uniform = UniformInhibition(group, uniform_receivers, receiver_weights, num_units)
+    keep = ~drop
+    rows = np.concatenate((rows[keep], np.asarray(extra_rows, dtype=np.int64)))
+    cols = np.concatenate((cols[keep], np.asarray(extra_cols, dtype=np.int64)))
+    weights = np.concatenate((weights[keep], np.asarray(extra_weights, dtype=np.float64)))
+    return uniform, rows, cols, weights
+
+
+info_gain_scale = 0.1      # ARI_EDIT: scale applied to the information gain driving the non-word unit
+info_gain_max = 100         # ceiling of the per-letter information gain
+word_rest = -0.1           # word activation reported for a stimulus that is not in the lexicon (IA.getActivations)
+
+
+class Network:
+    def __init__(self, pool_list, pool_names, lateral=True, letter_index=True, arrays=None):
+        self.pool_names = list(pool_names)
+        self.units = []             # Unit objects, in compiled order
+        self.names = []             # (pool_name, key, pos) of each unit
+        self.pool_index = {}        # pool_name -> np.array of unit indices, in readActivations (sorted) order
+        for pool_name, pool in zip(self.pool_names, pool_list):
+            for key in sorted(pool):
+                for pos, unit in enumerate(pool[key]):
+                    self.names.append((pool_name, key, pos))
+                    self.units.append(unit)
+        self.unit_index = dict((name, i) for i, name in enumerate(self.names))    # (pool_name, key, pos) -> index
+        for pool_name in self.pool_names:
+            members = [i for i, name in enumerate(self.names) if name[0] == pool_name]
+            self.pool_index[pool_name] = np.array(sorted(members, key=lambda i: self.names[i][1] +
+                                                         repr(self.names[i][2])), dtype=np.int64)
+
+        self.cohort = cm.CohortContext([self.names[i][1] + repr(self.names[i][2]) for i in self.pool_index['words']])
+
+        num_units = len(self.units)
+        self.rest = np.array([unit.getRest() for unit in self.units], dtype=np.float64)
+        self.activation = self.rest.copy()
+        self.ext_input = np.zeros(num_units)
+        self.net_input = np.zeros(num_units)
+
+        if arrays is not None:
+            self.__restore__(arrays)
+            return
+        resolve_projections(pool_list)
+        slot = dict((id(unit), i) for i, unit in enumerate(self.units))
+        exc = ([], [], [])
+        inh = ([], [], [])
+        for rcvr, unit in enumerate(self.units):
+            for sender, weight in unit.getSenders():
+                if weight > 0:
+                    target = exc
+                elif weight < 0:
+                    target = inh
+                else:
+                    continue
+                target[0].append(rcvr)
+                target[1].append(slot[id(sender)])
+                target[2].append(weight)
+        self.lateral = []           # UniformInhibition blocks
+        # the lateral inhibition of the auto-loaded words: a block per group (in order of its first receiver) and an
+        # entry per delta sender; with lateral=False, an entry per group member instead of the block
+        blocks = []
+        for rcvr, unit in enumerate(self.units):
+            if unit.getLateralSenders() is None:
+                continue
+            weight, group, delta = unit.getLateralSenders()
+            if lateral:
+                found = [block for block in blocks if block[0] is group]
+                if len(found) == 0:
+                    found = [(group, [], [])]
+                    blocks.extend(found)
+                found[0][1].append(rcvr)
+                found[0][2].append(weight)
+            else:
+                delta = [(sender, 1) for sender in group] + delta
+            for sender, count in delta:
+                inh[0].append(rcvr)
+                inh[1].append(slot[id(sender)])
+                inh[2].append(weight * count)
+        for group, receivers, weights in blocks:
+            self.lateral.append(UniformInhibition([slot[id(sender)] for sender in group], receivers, weights,
+                                                  num_units))
+        if lateral and 'words' in self.pool_index:
+            uniform, rows, cols, weights = factor_uniform(inh[0], inh[1], inh[2], self.pool_index['words'],
+                                                          num_units)
+            if uniform.getNumReceivers() > 0:
+                self.lateral.append(uniform)
+                inh = (rows, cols, weights)
+        self.letter_index = None
+        if letter_index and 'lets' in self.pool_index and 'words' in self.pool_index:
+            letters = self.pool_index['lets']
+            for pos in sorted(set(self.names[i][2] for i in letters)):
+                at_pos = [i for i in letters if self.names[i][2] == pos]
+                uniform, rows, cols, weights = factor_uniform(inh[0], inh[1], inh[2], at_pos, num_units,
+                                                              receivers=self.pool_index['words'])
+                if uniform.getNumReceivers() > 0:
+                    self.lateral.append(uniform)
+                    inh = (rows, cols, weights)
+            exc, exc_letters = self.__split_letters__(exc, letters)
+            inh, inh_letters = self.__split_letters__(inh, letters)
+            self.letter_index = LetterIndex(letters, exc_letters, inh_letters, num_units)
+        self.excitatory = CSRMatrix(exc[0], exc[1], exc[2], num_units)
+        self.inhibitory = CSRMatrix(inh[0], inh[1], inh[2], num_units)
+
+    #   Set the weight blocks from the arrays of getArrays, after checking they were compiled for these units (raises
+    #   ValueError if not)
+    def __restore__(self, arrays):
+        names = zip(arrays['pool'].tolist(), arrays['key'].tolist(), arrays['pos'].tolist())
+        if names != self.names or not np.array_equal(arrays['rest'], self.rest):
+            raise ValueError('Network: Saved network does not match the units of the pools')
+        num_units = len(self.units)
+        self.lateral = []
+        for i in range(int(arrays['num_lateral'])):
+            prefix = 'lateral%d_' % i
+            self.lateral.append(UniformInhibition(arrays[prefix + 'senders'], arrays[prefix + 'receivers'],
+                                                  arrays[prefix + 'weight'], num_units))
+        self.letter_index = None
+        if 'letters' in arrays:
+            exc = (arrays['letter_exc_rows'], arrays['letter_exc_cols'], arrays['letter_exc_weights'])
+            inh = (arrays['letter_inh_rows'], arrays['letter_inh_cols'], arrays['letter_inh_weights'])
+            self.letter_index = LetterIndex(arrays['letters'], exc, inh, num_units)
+        self.excitatory = CSRMatrix(arrays['exc_rows'], arrays['exc_cols'], arrays['exc_weights'], num_units)
+        self.inhibitory = CSRMatrix(arrays['inh_rows'], arrays['inh_cols'], arrays['inh_weights'], num_units)
+        return
+
+    #   The compiled network as a dict of flat arrays: unit names (pool, key, pos) in compiled order, resting levels,
+    #   and the entries of every weight block
+    def getArrays(self):
+        arrays = {'pool': np.array([name[0] for name in self.names]),
+                  'key': np.array([name[1] for name in self.names]),
+                  'pos': np.array([name[2] for name in self.names], dtype=np.int64),
+                  'rest': self.rest,
+                  'num_lateral': np.array(len(self.lateral))}
+        for i, block in enumerate(self.lateral):
+            prefix = 'lateral%d_' % i
+            arrays[prefix + 'senders'] = block.senders
+            arrays[prefix + 'receivers'] = block.receivers
+            arrays[prefix + 'weight'] = block.weight
+        if self.letter_index is not None:
+            arrays['letters'] = self.letter_index.letters
+            for kind, entries in zip(('letter_exc_', 'letter_inh_'), self.letter_index.getEntries()):
+                arrays[kind + 'rows'], arrays[kind + 'cols'], arrays[kind + 'weights'] = entries
+        for kind, matrix in (('exc_', self.excitatory), ('inh_', self.inhibitory)):
+            arrays[kind + 'rows'], arrays[kind + 'cols'], arrays[kind + 'weights'] = matrix.getEntries()
+        return arrays
+
+    #   split (rows, cols, weights) into the letter-to-word entries and all the others
+    def __split_letters__(self, entries, letters):
+        rows, cols, weights = [np.asarray(a) for a in entries]
+        is_word = np.zeros(len(self.units), dtype=bool)
+        is_word[self.pool_index['words']] = True
+        is_letter = np.zeros(len(self.units), dtype=bool)
+        is_letter[letters] = True
+        mask = is_word[rows] & is_letter[cols]
+        return (rows[~mask], cols[~mask], weights[~mask]), (rows[mask], cols[mask], weights[mask])
+
+    def getNumUnits(self):
+        return len(self.units)
+
+    def getNNZ(self):
+        nnz = self.excitatory.getNNZ() + self.inhibitory.getNNZ()
+        if self.letter_index is not None:
+            nnz += self.letter_index.getNNZ()
+        return nnz
+
+    #   copy activation and external input from the Unit objects into the activation vectors
+    def load(self):
+        for i, unit in enumerate(self.units):
+            self.activation[i] = unit.getActivation()
+            self.ext_input[i] = unit.getExtInput()
+        return
+
+    #   copy activation and net input back into the Unit objects
+    def store(self):
+        activation = self.activation.tolist()
+        net_input = self.net_input.tolist()
+        for i, unit in enumerate(self.units):
+            unit.setActivation(activation[i])
+            unit.setNetInput(net_input[i])
+        return
+
+    #   Vector form of IA.netInput: only positive activations are propagated; the excitatory input is scaled by alpha,
+    #   the inhibitory input by gamma and the external input by estr. activation and ext_input are vectors or
+    #   (batch x units) matrices.
+    def computeNetInput(self, activation, ext_input, params):
+        positive = np.where(activation > 0, activation, 0.0)    # as Unit.netInput: a NaN activation sends nothing
+        excitation = self.excitatory.matvec(positive)
+        inhibition = self.inhibitory.matvec(positive)
+        if self.letter_index is not None:
+            letter_exc, letter_inh = self.letter_index.matvec(positive)
+            excitation += letter_exc
+            inhibition += letter_inh
+        for block in self.lateral:
+            inhibition += block.matvec(positive)
+        excitation *= params['alpha']
+        inhibition *= params['gamma']
+        return excitation + inhibition + ext_input * params['estr']
+
+    #   Vector form of IA.update
+    def computeUpdate(self, activation, net_input, params):
+        scale = np.where(activation > 0, params['max'] - activation, activation - params['min'])
+        return activation + scale * net_input - params['decay'] * (activation - self.rest)
+
+    def netInput(self, params):
+        self.net_input = self.computeNetInput(self.activation, self.ext_input, params)
+        return self.net_input
+
+    def update(self, params):
+        self.activation = self.computeUpdate(self.activation, self.net_input, params)
+        return self.activation
+
+    def cycle(self, params):
+        self.netInput(params)
+        self.update(params)
+        return
+
+    #   ARI_EDIT: the non-word unit is driven by the information gain of the input word given the word activations,
+    #   times scale, as in IA.cycle_pool. activation is an activation vector, or a (batch x units) matrix with one
+    #   input word per row. Rows without an input word ('') are left alone: there is no information gain yet.
+    #   The information gains of all the rows are computed at once (see CohortContext.get_info_gains).
+    def setInfoGain(self, activation, input_words, scale=info_gain_scale):
+        if ('words', 'non-word', 0) not in self.unit_index:
+            return
+        activation = np.atleast_2d(activation)      # a view: a single activation vector is updated in place
+        rows = np.array([row for row, input_word in enumerate(input_words) if input_word != ''], dtype=int)
+        if len(rows) == 0:
+            return
+        words = self.pool_index['words']
+        non_word = self.unit_index[('words', 'non-word', 0)]
+        info_gains, offsets = self.cohort.get_info_gains([input_words[row] for row in rows],
+                                                         activation[rows][:, words], True, cm.avg,
+                                                         info_gain_max)
+        activation[rows, non_word] = info_gains * scale
+        return
+
+    #   Same [[key+pos, activation],..] list readActivations builds from the Unit objects
+    def readActivations(self, pool_name):
+        activation = self.activation
+        return [[self.names[i][1] + repr(self.names[i][2]), float(activation[i])]
+                for i in self.pool_index[pool_name]]
+
+
+# Convergence check over the whole network (or the units in columns, e.g. one pool): a run has settled once the
+# largest |change in activation| of a cycle is within tolerance, after more than min_cycles cycles (as runSettle
+# gives a unit a few cycles to become activated). Also tracks, for every unit, the cycle after which its own change
+# stayed within tolerance: unit_settle. activation is a vector, or a (batch x units) matrix of independent runs.
+class SettleMonitor:
+    def __init__(self, activation, tolerance, columns=None, min_cycles=5):
+        self.last = np.array(activation, dtype=np.float64)
+        self.tolerance = tolerance
+        self.columns = columns
+        self.min_cycles = min_cycles
+        self.cycles = np.zeros(self.last.shape[:-1], dtype=np.int64)
+        self.unit_settle = np.zeros(self.last.shape, dtype=np.int64)
+        self.settled = np.zeros(self.last.shape[:-1], dtype=bool)
+
+    #   Record one more cycle of the runs in rows (default: all of them); returns the settled flag(s)
+    def step(self, activation, rows=None):
+        if rows is None:
+            rows = Ellipsis
+        self.cycles[rows] += 1
+        delta = np.abs(activation[rows] - self.last[rows])
+        self.unit_settle[rows] = np.where(delta > self.tolerance, self.cycles[rows][..., None], self.unit_settle[rows])
+        self.last[rows] = activation[rows]
+        if self.columns is not None:
+            delta = delta[..., self.columns]
+        max_delta = np.max(delta, axis=-1) if delta.shape[-1] > 0 else np.zeros(delta.shape[:-1])
+        self.settled[rows] = (max_delta <= self.tolerance) & (self.cycles[rows] > self.min_cycles)
+        return self.settled
+
+
+# Result of run_batch. For every traced pool with units selected by the IA_trace.RecordSpec, traces[pool] is a
+# (batch x cycles x units) array of activations, with the units in readActivations order (keys[pool] holds their
+# names, columns[pool] their position in the pool). When the spec asks for the top K words, top_keys[b, c, :] and
+# top_values[b, c, :] hold the K most active words of stimulus b at cycle c. word_act is the (batch x cycles)
+# activation of each stimulus's own word unit (rest if it is not in the lexicon), the Word column of the 't' trace.
+# When run with a settle tolerance, settle_cycle[b] is the cycle at which stimulus b settled (ncycles if it did not)
+# and unit_settle[b, i] the cycle after which unit i stopped changing; the traces hold the settled activations from
+# settle_cycle on.
+class BatchResult:
+    def __init__(self, stimuli, cues, ncycles, record, network):
+        self.stimuli = stimuli
+        self.cues = cues
+        self.keys = {}
+        self.columns = {}
+        self.traces = {}
+        for pool in tr.traced_pools:
+            if pool not in network.pool_index:
+                continue
+            pool_keys = [network.names[i][1] + repr(network.names[i][2]) for i in network.pool_index[pool]]
+            columns = record.getColumns(pool, [key[:-1] for key in pool_keys])
+            if len(columns) == 0:
+                continue
+            self.columns[pool] = np.array(columns, dtype=np.int64)
+            self.keys[pool] = [pool_keys[col] for col in columns]
+            self.traces[pool] = np.zeros((len(stimuli), ncycles, len(columns)))
+        self.word_keys = [network.names[i][1] for i in network.pool_index['words']]
+        top_k = np.minimum(record.getTopK(), len(self.word_keys))
+        self.top_columns = np.zeros((len(stimuli), ncycles, top_k), dtype=np.int64)
+        self.top_values = np.zeros((len(stimuli), ncycles, top_k))
+        self.word_act = np.zeros((len(stimuli), ncycles))
+        self.settle_cycle = np.zeros(len(stimuli), dtype=np.int64) + ncycles
+        self.unit_settle = None
+
+    #   record the activations of rows start:end at a cycle
+    def record(self, network, activation, start, end, cycleno):
+        for pool in self.traces:
+            self.traces[pool][start:end, cycleno, :] = activation[:, network.pool_index[pool][self.columns[pool]]]
+        top_k = self.top_values.shape[2]
+        if top_k > 0:
+            word_acts = activation[:, network.pool_index['words']]
+            top = np.argsort(-word_acts, axis=1, kind='mergesort')[:, :top_k]
+            self.top_columns[start:end, cycleno, :] = top
+            self.top_values[start:end, cycleno, :] = word_acts[np.arange(len(word_acts))[:, None], top]
+        return
+
+    #   [[word, activation],..] of the top K words of stimulus b at a cycle (default: the last one)
+    def getTop(self, b, cycle=-1):
+        return [[self.word_keys[col], value] for col, value in zip(self.top_columns[b, cycle],
+                                                                   self.top_values[b, cycle])]
+
+    def getTrace(self, pool, item):
+        return self.traces[pool][:, :, self.keys[pool].index(item + '0')]
+
+
+#   Present each stimulus to a freshly reset copy of the network, all in one (batch x units) activation matrix, and
+#   cycle them together for ncycles, exactly as reset / c1|c2 / doNewWord / cycle_pool would one at a time.
+#   stimuli:    list of words; like doNewWord they are lower-cased and truncated to 5 letters
+#   cues:       None, 'c1' or 'c2' for all the stimuli, or a list with one of those per stimulus
+#   record:     what is kept for every cycle: an IA_trace.RecordSpec, or a list of pool and unit names
+#   batch_size: the largest number of stimuli simulated at once; bounds the memory used
+#   settle:     when given, a stimulus stops cycling once its network (or settle_pool) has settled to this tolerance
+#               (see SettleMonitor); ncycles is then the largest number of cycles run
+def run_batch(network, stimuli, params, ncycles, cues=None, record=('lang', 'schemas'), batch_size=256,
+              settle=None, settle_pool=None):
+    stimuli = [stim.lower()[:5] for stim in stimuli]
+    if cues is None or isinstance(cues, str):
+        cues = [cues] * len(stimuli)
+    if not isinstance(record, tr.RecordSpec):
+        record = tr.RecordSpec(list(record))
+    result = BatchResult(stimuli, cues, ncycles, record, network)
+    if settle is not None:
+        result.unit_settle = np.zeros((len(stimuli), network.getNumUnits()), dtype=np.int64)
+    scale = params.get('scale', info_gain_scale)
+    columns = None
+    if settle_pool is not None:
+        columns = network.pool_index[settle_pool]
+    for start in range(0, len(stimuli), batch_size):
+        end = min(start + batch_size, len(stimuli))
+        batch = range(start, end)
+        activation = np.tile(network.rest, (len(batch), 1))
+        ext_input = np.zeros(activation.shape)
+        own_word = np.zeros(len(batch), dtype=np.int64)
+        has_word = np.zeros(len(batch), dtype=bool)
+        for row, stim in enumerate(stimuli[start:end]):
+            cue = cues[start + row]
+            if cue == 'c1':
+                ext_input[row, network.unit_index[('cues', 'cue1', 0)]] = 1
+            elif cue == 'c2':
+                ext_input[row, network.unit_index[('cues', 'cue2', 0)]] = 1
+            for pos, let in enumerate(stim):
+                ext_input[row, network.unit_index[('lets', let, pos)]] = 1
+            if ('words', stim, 0) in network.unit_index:
+                own_word[row] = network.unit_index[('words', stim, 0)]
+                has_word[row] = True
+        monitor = None
+        running = np.arange(len(batch))
+        if settle is not None:
+            monitor = SettleMonitor(activation, settle, columns)
+        for cycleno in range(ncycles):
+            if len(running) == len(batch):
+                net_input = network.computeNetInput(activation, ext_input, params)
+                activation = network.computeUpdate(activation, net_input, params)
+                network.setInfoGain(activation, stimuli[start:end], scale)
+            elif len(running) > 0:
+                # settled stimuli keep their activations; only the others are cycled
+                net_input = network.computeNetInput(activation[running], ext_input[running], params)
+                updated = network.computeUpdate(activation[running], net_input, params)
+                network.setInfoGain(updated, [stimuli[start + row] for row in running], scale)
+                activation[running] = updated
+            if monitor is not None and len(running) > 0:
+                settled = monitor.step(activation, running)
+                just_settled = running[settled[running]]
+                result.settle_cycle[start + just_settled] = cycleno + 1
+                running = running[~settled[running]]
+            result.record(network, activation, start, end, cycleno)
+            result.word_act[start:end, cycleno] = np.where(has_word, activation[np.arange(len(batch)), own_word],
+                                                           word_rest)
+        if monitor is not None:
+            result.unit_settle[start:end] = monitor.unit_settle
+    return result
+
+
+#   Compile the pools into a Network. pool_list and pool_names are parallel lists, e.g. [lets, words, ...] and
+#   ['lets', 'words', ...]
+#   lateral: compile the word-to-word si projections as uniform lateral inhibition
+#   letter_index: compile the letter-to-word projections as per-position uniform inhibition plus a LetterIndex
+def compile_network(pool_list, pool_names=('lets', 'words', 'lang', 'schemas', 'cues'), lateral=True,
+                    letter_index=True):
+    return Network(pool_list, pool_names, lateral, letter_index)
+
+
+network_magic = 'BIANET01'     # first bytes of a network file
+network_alignment = 64          # byte alignment of each array in a network file
+
+
+def aligned(offset):
+    return -(-offset // network_alignment) * network_alignment
+
+
+#   Write the compiled network to a flat binary file (see save_arrays)
+def save_network(network, path):
+    save_arrays(network.getArrays(), path)
+    return
+
+
+#   Write a dict of arrays to a flat binary file: the magic string, the length of the JSON header as a little-endian
+#   uint64, the header ({name: [dtype, shape, offset],..} with offsets relative to the first array), then every array
+#   in C order, each starting on a 64 byte boundary. The file is written under a temporary name and renamed, so a
+#   process mapping path never sees it half written.
+def save_arrays(arrays, path, magic=network_magic):
+    arrays = dict(arrays)
+    layout = {}
+    offset = 0
+    for name in sorted(arrays):
+        arrays[name] = np.ascontiguousarray(arrays[name])
+        layout[name] = [arrays[name].dtype.str, list(arrays[name].shape), offset]
+        offset = aligned(offset + arrays[name].nbytes)
+    header = json.dumps(layout, sort_keys=True)
+    start = aligned(len(magic) + 8 + len(header))
+    partial = path + '.' + repr(os.getpid())
+    with open(partial, 'wb') as f:
+        f.write(magic)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for name in sorted(arrays):
+            f.seek(start + layout[name][2])
+            f.write(arrays[name].tobytes())
+    os.rename(partial, path)
+    return
+
+
+#   Map a file written by save_arrays (a network file by default) read-only: returns {name: array}, every array a view
+#   into one np.memmap of the file. Raises ValueError if path is not a complete file of magic (e.g. a file of some
+#   other kind, or one that was cut short).
+def load_arrays(path, magic=network_magic):
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError('Not a {0:s} file: {1:s}'.format(magic, repr(path)))
+        header = f.read(struct.calcsize('<Q'))
+        if len(header) < struct.calcsize('<Q'):
+            raise ValueError('Truncated {0:s} file: {1:s}'.format(magic, repr(path)))
+        header = f.read(struct.unpack('<Q', header)[0])
+    try:
+        layout = json.loads(header)
+    except ValueError:
+        raise ValueError('Damaged {0:s} file: {1:s}'.format(magic, repr(path)))
+    start = aligned(len(magic) + 8 + len(header))
+    size = os.path.getsize(path)
+    arrays = {}
+    mapped = None
+    for name, (dtype, shape, offset) in layout.items():
+        dtype = np.dtype(str(dtype))
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        if start + offset + nbytes > size:
+            raise ValueError('Truncated {0:s} file: {1:s}'.format(magic, repr(path)))
+        if mapped is None:
+            mapped = np.memmap(path, dtype=np.uint8, mode='r')
+        arrays[str(name)] = mapped[start + offset:start + offset + nbytes].view(dtype).reshape(shape)
+    return arrays
+
+
+#   The network saved in path, bound to the Units of the pools in pool_list
+def load_network(path, pool_list, pool_names=('lets', 'words', 'lang', 'schemas', 'cues')):
+    return Network(pool_list, pool_names, arrays=load_arrays(path))
+
+
+#   SHA-1 of the arrays of a network (see Network.getArrays): networks with the same units, resting levels and weights
+#   have the same digest, whether compiled from the pools or loaded from a network file
+def network_digest(network):
+    digest = hashlib.sha1()
+    arrays = network.getArrays()
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(name)
+        digest.update(array.dtype.str)
+        digest.update(repr(array.shape))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,74 @@
+import os, shutil, tempfile
+import numpy as np
+import IA_engine as ie
+import IA_model as im
+
+# The engine and the projection lists must cycle to the same activations, also before any word is presented (the
+# information gain of the empty input word is not a number)
+
+def run(use_engine):
+	model = im.BIAModel(use_engine=use_engine)
+	model.set_cue('c1')
+	model.cycle(5)
+	before = np.array([unit.getActivation() for unit in model.listUnits()])
+	model.present('hello')
+	model.cycle(10)
+	after = np.array([unit.getActivation() for unit in model.listUnits()])
+	return before, after
+
+list_before, list_after = run(False)
+engine_before, engine_after = run(True)
+print str(not np.any(np.isnan(engine_before)) and not np.any(np.isnan(engine_after)))
+print str(np.allclose(list_before, engine_before, rtol=0, atol=1e-12))
+print str(np.allclose(list_after, engine_after, rtol=0, atol=1e-12))
+
+# The letter-to-word projections compiled into a LetterIndex give the net input the explicit entries give, from fewer
+# stored entries
+
+model = im.BIAModel()
+indexed = ie.compile_network(model.pool_list, model.pool_names)
+explicit = ie.compile_network(model.pool_list, model.pool_names, letter_index=False)
+activation = np.random.RandomState(0).uniform(-0.2, 1.0, (3, indexed.getNumUnits()))
+ext_input = np.zeros(activation.shape)
+print str(indexed.letter_index is not None and explicit.letter_index is None and indexed.getNNZ() < explicit.getNNZ())
+print str(np.allclose(indexed.computeNetInput(activation, ext_input, model.params),
+					  explicit.computeNetInput(activation, ext_input, model.params), rtol=0, atol=1e-12))
+
+# Every projection is resolved to its sending Unit, found in the first pool holding its key, with its weight; a key no
+# pool holds is reported when the projections are resolved
+
+def sender(key, pos):
+	for pool in model.pool_list:
+		if key in pool:
+			return pool[key][pos]
+unit = model.words['cama'][0]
+print str(len(unit.getSenders()) > 0 and
+		  unit.getSenders() == [(sender(key, pos), weight) for (key, pos), weight in unit.getProjList()])
+model.words['zzz'] = [im.Unit([[['nosuch', 0], 0.1]])]
+try:
+	model.resolveProjections()
+	print str(False)
+except ValueError as err:
+	print str("'nosuch'" in str(err) and "'zzz'" in str(err))
+
+# A network loaded from a network file runs on read-only maps of the file, not on copies of the weights, and cycles
+# to the activations of the network it was saved from
+
+work = tempfile.mkdtemp()
+path = os.path.join(work, 'default.net')
+compiled = im.BIAModel(use_engine=True)
+ie.save_network(compiled.compileNetwork(), path)
+loaded = im.BIAModel(use_engine=True)
+network = loaded.loadNetwork(path)
+def mapped_file(array):
+	while array is not None and not isinstance(array, np.memmap):
+		array = array.base
+	return None if array is None else array.filename
+weights = [network.excitatory.data, network.inhibitory.data, network.excitatory.indices, network.inhibitory.indices]
+print str(all(mapped_file(array) == path and not array.flags.writeable for array in weights))
+for model in (compiled, loaded):
+	model.set_cue('c1')
+	model.present('hola')
+	model.cycle(10)
+print str(np.array_equal(compiled.network.activation, loaded.network.activation))
+shutil.rmtree(work)
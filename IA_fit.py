@@ -0,0 +1,262 @@
+#!/usr/bin/python
+import sys, csv, re, argparse
+import numpy as np
+import IA_model as im
+import IA_batch as bt
+import IA_sweep as sw
+import IA_script as sc
+import IA_lexicon as lx
+
+# IA_fit.py: Fitting BIA/BIAPlus Model params to lexical decision RTs
+#
+# Fits the params named with -f to the RTs of a stimulus set, e.g.
+#   python IA_fit.py rts.csv -s lexicon_1300.csv -f alpha=0.05:0.2 -f gamma=0.05:0.2 -f scale=0:0.3 -o residuals.csv
+# rts.csv holds word,rt(,cue) lines (a header line is skipped). The model RT of a stimulus is the number of cycles its
+# word unit takes to reach the threshold, interpolated between the cycles before and after it crossed (ncycles + 1 if
+# it never does), and the predicted RT is a + b * cycles, with a and b the least squares fit to the observed RTs with
+# b >= 0 (see rt_map: more cycles never predict a faster RT). The fit minimizes the RMSE of the predictions with the
+# Nelder-Mead simplex method, keeping every param within its range.
+#
+# Every evaluation of the objective runs the whole stimulus set at once through the compiled engine
+# (BIAModel.runBatch), split into --jobs chunks run by a pool of worker processes, and evaluations are cached, so the
+# simplex coming back to a point (e.g. one clipped to the ranges) costs nothing. rest cannot be fitted: it is the
+# resting level given to the words when they are auto-loaded, so every evaluation would rebuild the lexicon; set it
+# with -p instead.
+
+__author__ = 'Andy Valenti'
+__copyright__ = "Copyright 2016. Tufts University"
+
+
+#   Read the RTs to fit from a CSV file of word,rt(,cue) lines; cue is c1, c2 or none (default: cue). A first line
+#   whose rt is not a number is a header. Returns ([word,..], [cue,..], np.array of rts).
+def load_rts(file_str, cue=None):
+    csv_pattern = re.compile(',')
+    words = []
+    cues = []
+    rts = []
+    with open(file_str) as f:
+        for lineno, line in enumerate(f):
+            line = line.strip()
+            if line == '':
+                continue
+            split = [field.strip() for field in csv_pattern.split(line)]
+            if len(split) < 2 or not lx.is_number(split[1]):
+                if lineno == 0:
+                    continue
+                raise ValueError('line {0:d}: expected word,rt(,cue): {1:s}'.format(lineno + 1, repr(line)))
+            word_cue = cue
+            if len(split) > 2 and split[2] != '':
+                word_cue = split[2].lower()
+            if word_cue == 'none':
+                word_cue = None
+            if word_cue not in (None, 'c1', 'c2'):
+                raise ValueError('line {0:d}: unknown cue {1:s}'.format(lineno + 1, repr(word_cue)))
+            words.append(split[0].lower())
+            cues.append(word_cue)
+            rts.append(float(split[1]))
+    return words, cues, np.array(rts)
+
+
+#   Minimize func over vectors with the Nelder-Mead simplex method, starting from the simplex of x0 and x0 + steps[i]
+#   along every axis i. Stops after max_evals evaluations of func, or once the simplex has shrunk to within xtol and
+#   its values to within ftol. Returns (x, func(x)) of the best vertex.
+def nelder_mead(func, x0, steps, max_evals=200, xtol=1e-4, ftol=1e-6):
+    x0 = np.asarray(x0, dtype=np.float64)
+    simplex = [x0] + [x0 + np.eye(len(x0))[i] * steps[i] for i in range(len(x0))]
+    values = [func(x) for x in simplex]
+    evals = len(simplex)
+    while evals < max_evals:
+        order = np.argsort(values, kind='mergesort')
+        simplex = [simplex[i] for i in order]
+        values = [values[i] for i in order]
+        spread = max(np.max(np.abs(x - simplex[0])) for x in simplex[1:]) if len(simplex) > 1 else 0.0
+        if spread <= xtol and values[-1] - values[0] <= ftol:
+            break
+        centroid = np.mean(simplex[:-1], axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        f_reflected = func(reflected)
+        evals += 1
+        if f_reflected < values[0]:
+            expanded = centroid + 2.0 * (centroid - simplex[-1])
+            f_expanded = func(expanded)
+            evals += 1
+            if f_expanded < f_reflected:
+                simplex[-1], values[-1] = expanded, f_expanded
+            else:
+                simplex[-1], values[-1] = reflected, f_reflected
+        elif f_reflected < values[-2]:
+            simplex[-1], values[-1] = reflected, f_reflected
+        else:
+            # contract towards the better of the worst vertex and its reflection
+            if f_reflected < values[-1]:
+                contracted = centroid + 0.5 * (reflected - centroid)
+            else:
+                contracted = centroid + 0.5 * (simplex[-1] - centroid)
+            f_contracted = func(contracted)
+            evals += 1
+            if f_contracted < min(f_reflected, values[-1]):
+                simplex[-1], values[-1] = contracted, f_contracted
+            else:
+                # shrink the simplex towards the best vertex
+                for i in range(1, len(simplex)):
+                    simplex[i] = simplex[0] + 0.5 * (simplex[i] - simplex[0])
+                    values[i] = func(simplex[i])
+                    evals += 1
+    best = int(np.argmin(values))
+    return simplex[best], values[best]
+
+
+#   Cycles for the activations in word_act (stimuli x cycles) to reach threshold, linearly interpolated between the
+#   last cycle below it and the first at or above it; ncycles + 1 for those that never reach it
+def crossing_cycles(word_act, threshold):
+    ncycles = word_act.shape[1]
+    crossed = word_act >= threshold
+    first = np.argmax(crossed, axis=1)
+    rows = np.arange(len(word_act))
+    before = word_act[rows, np.maximum(first - 1, 0)]
+    after = word_act[rows, first]
+    rise = np.where(first > 0, after - before, 1.0)
+    fraction = np.where(first > 0, (threshold - before) / np.where(rise > 0, rise, 1.0), 1.0)
+    return np.where(np.any(crossed, axis=1), first + fraction, ncycles + 1.0)
+
+
+#   Pool task: the word_act of a chunk of the stimuli, run on the model of the worker (see IA_script.trial_pool)
+def run_chunk(task):
+    params, words, cues, ncycles = task
+    sc.worker_model.params.update(params)
+    return sc.worker_model.runBatch(words, cues, ncycles, record=('lang',)).word_act
+
+
+# Fit of the params names (each within bounds[i] = (low, high)) of model to the RTs of the stimuli words/cues.
+# evaluate(x) is the RMSE of the predicted RTs at the param values x (clipped to the bounds); the evaluations are
+# cached in evals, keyed by the clipped values. With a pool (IA_script.trial_pool of model), every evaluation runs
+# the stimuli in one chunk per process.
+class RTFit:
+    def __init__(self, model, words, cues, rts, names, bounds, ncycles=100, threshold=0.5, pool=None, processes=1):
+        self.model = model
+        self.pool = pool
+        self.chunks = np.array_split(np.arange(len(words)), processes if pool is not None else 1)
+        self.words = words
+        self.cues = cues
+        self.rts = rts
+        self.names = list(names)
+        self.low = np.array([low for low, high in bounds], dtype=np.float64)
+        self.high = np.array([high for low, high in bounds], dtype=np.float64)
+        self.ncycles = ncycles
+        self.threshold = threshold
+        self.evals = {}             # clipped param values -> RMSE
+        self.hits = 0               # number of evaluations answered from evals
+
+    def clip(self, x):
+        return np.minimum(np.maximum(x, self.low), self.high)
+
+    #   Run the stimuli at param values x; returns (cycles, predicted RTs, a, b)
+    def predict(self, x):
+        params = dict(zip(self.names, self.clip(x).tolist()))
+        if self.pool is not None:
+            tasks = [(params, [self.words[i] for i in chunk], [self.cues[i] for i in chunk], self.ncycles)
+                     for chunk in self.chunks if len(chunk) > 0]
+            word_act = np.vstack(self.pool.map(run_chunk, tasks))
+        else:
+            self.model.params.update(params)
+            word_act = self.model.runBatch(self.words, self.cues, self.ncycles, record=('lang',)).word_act
+        cycles = crossing_cycles(word_act, self.threshold)
+        a, b = rt_map(cycles, self.rts)
+        return cycles, a + b * cycles, a, b
+
+    def evaluate(self, x):
+        key = tuple(self.clip(x).tolist())
+        if key in self.evals:
+            self.hits += 1
+        else:
+            cycles, predicted, a, b = self.predict(x)
+            self.evals[key] = float(np.sqrt(np.mean((self.rts - predicted) ** 2)))
+        return self.evals[key]
+
+    #   Nelder-Mead from the param values x0 (default: the params of the model), with a first simplex spanning a tenth
+    #   of every range. Returns (best param values, their RMSE).
+    def fit(self, x0=None, max_evals=200):
+        if x0 is None:
+            x0 = [self.model.params[name] for name in self.names]
+        x, rmse = nelder_mead(self.evaluate, self.clip(np.asarray(x0, dtype=np.float64)),
+                              (self.high - self.low) / 10.0, max_evals)
+        return self.clip(x), rmse
+
+
+#   Least squares fit of rts = a + b * cycles with b >= 0: returns (a, b). When the unconstrained slope is negative,
+#   the best fit with b >= 0 is the flat one, b = 0 and a the mean RT.
+def rt_map(cycles, rts):
+    design = np.column_stack((np.ones(len(cycles)), cycles))
+    (a, b), residues, rank, sv = np.linalg.lstsq(design, rts, rcond=-1)
+    if b < 0:
+        a, b = float(np.mean(rts)), 0.0
+    return a, b
+
+
+residual_header = ['Input', 'Cue', 'RT', 'Cycles', 'Predicted', 'Residual']
+
+
+#   Per-item table of a fit (see RTFit.predict): [[word, cue, rt, cycles, predicted, residual],..]
+def residual_rows(words, cues, rts, cycles, predicted):
+    return [[word, cue if cue is not None else 'none', rt, cycle, pred, rt - pred]
+            for word, cue, rt, cycle, pred in zip(words, cues, rts.tolist(), cycles.tolist(), predicted.tolist())]
+
+
+#   'name=low:high' -> (name, (low, high)) for a fitted parameter
+def fit_arg(text):
+    name, bounds = sw.range_arg(text)
+    if name == 'rest':
+        raise argparse.ArgumentTypeError('rest cannot be fitted; set it with -p rest=VALUE')
+    return name, bounds
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Fit BIA model params to lexical decision RTs.')
+    parser.add_argument('rts', help='RTs to fit: CSV file of word,rt(,cue) lines')
+    parser.add_argument('-f', '--fit', action='append', type=fit_arg, required=True, metavar='NAME=LOW:HIGH',
+                        help='fit a parameter within a range (repeatable)')
+    parser.add_argument('-o', '--output', help='CSV file of the per-item residuals of the best fit')
+    parser.add_argument('-s', '--stimuli', help='stimuli file to auto-load into the lexicon')
+    parser.add_argument('--cache-dir', default=None, help='network cache directory')
+    parser.add_argument('-p', '--param', action='append', type=bt.param_arg, default=[], metavar='NAME=VALUE',
+                        help='set a model parameter, e.g. the starting point of a fitted one (repeatable)')
+    parser.add_argument('--cue', choices=['c1', 'c2', 'none'], default='none', help='cue of the words without one')
+    parser.add_argument('-n', '--ncycles', type=int, default=100, help='number of cycles to run each stimulus')
+    parser.add_argument('-t', '--threshold', type=float, default=0.5, help='word activation that counts as the RT')
+    parser.add_argument('-m', '--max-evals', type=int, default=200, help='largest number of evaluations')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes per evaluation')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    try:
+        words, cues, rts = load_rts(args.rts, None if args.cue == 'none' else args.cue)
+    except (IOError, ValueError) as err:
+        print >> sys.stderr, 'Error: ' + str(err)
+        sys.exit(1)
+    model = bt.new_model(args.stimuli, True, args.cache_dir, dict(args.param))
+    if model is None:
+        sys.exit(1)
+    pool = None
+    if args.jobs > 1:
+        pool = sc.trial_pool(model, args.jobs, bt.new_model, (args.stimuli, True, args.cache_dir, dict(args.param)))
+    names = [name for name, bounds in args.fit]
+    rt_fit = RTFit(model, words, cues, rts, names, [bounds for name, bounds in args.fit], args.ncycles,
+                   args.threshold, pool, args.jobs)
+    x, rmse = rt_fit.fit(max_evals=args.max_evals)
+    cycles, predicted, a, b = rt_fit.predict(x)
+    if pool is not None:
+        pool.close()
+        pool.join()
+    print 'Best fit: ' + ', '.join('{0:s}={1:s}'.format(name, repr(value)) for name, value in zip(names, x.tolist()))
+    print 'RMSE: {0:.6g}  RT = {1:.6g} + {2:.6g} * cycles  ({3:d} evaluations, {4:d} cached)'.format(
+        rmse, a, b, len(rt_fit.evals), rt_fit.hits)
+    if b == 0:
+        print >> sys.stderr, 'Warning: the RTs do not increase with the cycles of the best fit; the slope is held ' \
+                             'at 0 and every word is predicted the mean RT'
+    if args.output is not None:
+        with open(args.output, 'wb') as csvfile:
+            logwriter = csv.writer(csvfile)
+            logwriter.writerow(residual_header)
+            logwriter.writerows(residual_rows(words, cues, rts, cycles, predicted))
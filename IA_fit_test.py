@@ -0,0 +1,11 @@
+import numpy as np
+import IA_fit as ft
+
+# Model RTs map to observed RTs by least squares with a slope that is never negative; the cycles to threshold are
+# interpolated between the cycles around the crossing, ncycles + 1 if there is none
+
+cycles = np.array([10.0, 20.0, 30.0])
+print str(np.allclose(ft.rt_map(cycles, 500 + 3 * cycles), (500, 3)))
+print str(ft.rt_map(cycles, np.array([900.0, 800.0, 790.0])) == (830.0, 0.0))
+print str(list(ft.crossing_cycles(np.array([[0.1, 0.3, 0.7], [0.1, 0.2, 0.3], [0.6, 0.7, 0.8]]), 0.5)) ==
+		  [2.5, 4.0, 1.0])
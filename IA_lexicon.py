@@ -0,0 +1,215 @@
+import hashlib, re
+import IA_pools
+from IA_pools import Unit
+from IA_pools import lets_word_template, word_lets_template, word_si_template, word_lang_template
+
+# IA_lexicon.py: Bulk construction of the lets, words, and lang pools from a list of stimuli
+#
+# Auto-loading one word at a time deep-copies the templates and walks the whole word pool to append a self-inhibitory
+# projection to every word already loaded, i.e. O(N^2) deep copies for N stimuli. build_lexicon adds all stimuli in a
+# single pass instead and gives the pools the same projections:
+#   - every loaded word gets its letter projections (the lets_word_template, excitatory where the letter matches),
+#     an si projection from every word in the pool when it was loaded (itself included if it is a duplicate),
+#     and an si projection from every word loaded after it (once per occurrence);
+#   - every word already in the pool with projections gets an si projection from every loaded word;
+#   - every letter position unit and the language unit get a projection from every loaded word.
+# The si projections are not listed one by one, which would still be O(N^2): a loaded word gets a lateral inhibition
+# (see Unit.getLateral) over one group shared by all the words of the load, the words in the pool and the loaded
+# words, with a delta for the few words it gets a different number of si projections from (itself, and the words
+# loaded more than once or already in the pool). A word already in the pool has the loaded words added to its group.
+# The letter projections are copies of the template lists, so the pools of different models share no state.
+#
+# Stimuli are [word, language(, resting activation)] lists. As in the incremental loader, loading stops at the first
+# improperly formatted stimulus and a non-numeric resting activation falls back to the default.
+#
+# Network cache: the network compiled from the pools after auto-loading a stimulus file is a function of that file,
+# the literal pools and weight constants in IA_pools, the default resting level, and the pools before the load, i.e.
+# the stimuli files loaded before it. lexicon_key hashes all of them into the name of the cache file, chaining the key
+# of the pools before the load; restore_words rebuilds the word units (names and resting levels) from the cached
+# network and restore_projections the projections from the words to the letter and language units, so the build can
+# be skipped altogether. The restored letter and language units get the same projections as built, but in the sender
+# order of the compiled network rather than in load order: after more than one load, or a word loaded twice, only the
+# multiset of a unit's projections matches the built one. The model runs on the cached network from then on (see
+# BIAModel.loadNetwork), so the order of the lists does not change its results.
+
+
+#   Read a stimuli file in CSV format, i.e., word,language,resting_activation\n, into a list of [word, language(, rest)]
+def load_stimuli(file_str):
+    i = 0
+    csv_pattern = re.compile(',')
+    script = []
+    with open(file_str) as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            split = csv_pattern.split(line)
+            # split[-1] = split[-1][:-1]
+            script.append(split)
+    print('*** Read (%d) words ***' % (i + 1))
+    return script
+
+
+def is_number(s):
+    try:
+        float(s)
+        return True
+    except ValueError:
+        return False
+
+
+#   Check the stimuli in order and return ([(word, language, rest),..], mode, message) for those loaded before the
+#   first error. mode is None, 'Warning: Auto-load', or 'Error: Auto-load'.
+def parse_stimuli(stimuli, lets, lang, resting_activation):
+    entries = []
+    mode = None
+    message = None
+    for stim in stimuli:
+        # stimulus properly formatted?
+        if len(stim) < 2:
+            return entries, 'Error: Auto-load', 'Stimuli improperly formatted'
+        word = stim[0].lower()
+        language = stim[1].lower()
+        rest = resting_activation
+        # do we have a resting activation?
+        if len(stim) == 3:
+            if not is_number(stim[2]):
+                mode = 'Warning: Auto-load'
+                message = 'One or more resting values defaulted'
+            else:
+                rest = float(stim[2])
+        # language recognized?
+        if language not in lang:
+            return entries, 'Error: Auto-load', 'Unknown language attribute ' + repr(language)
+        # word length 3, 4, or 5?
+        if len(word) not in word_lets_template:
+            return entries, 'Error: Auto-load', 'Stimulus 3 <= word <= 5 lets'
+        # every letter has a letter unit?
+        for let in word:
+            if let not in lets:
+                return entries, 'Error: Auto-load', 'Unknown letter ' + repr(let) + ' in ' + repr(word)
+        entries.append((word, language, rest))
+    return entries, mode, message
+
+
+#   Add the stimuli to the words, lets, and lang pools (in place). resting_activation is the default resting level of
+#   the loaded words. Returns (mode, message) as parse_stimuli.
+def build_lexicon(stimuli, words, lets, lang, resting_activation):
+    entries, mode, message = parse_stimuli(stimuli, lets, lang, resting_activation)
+    loaded = [entry[0] for entry in entries]
+    si = word_si_template[1]
+
+    # the words already in the pool with projections get an si projection from every loaded word: the loaded words
+    # join the group of their lateral inhibition, or a new group of the loaded words
+    groups = []
+    loaded_group = list(loaded)
+    for word in words:
+        unit = words[word][0]
+        if unit.isProjNone():
+            continue
+        if unit.getLateral() is None:
+            unit.setLateral([si, loaded_group, {}])
+        elif not any(group is unit.getLateral()[1] for group in groups):
+            groups.append(unit.getLateral()[1])
+    for group in groups:
+        group.extend(loaded)
+
+    # the loaded words get an si projection from the group of the words in the pool and the loaded words, corrected
+    # by delta for the words not in the pool yet when a word is loaded (itself) or loaded more than once (repeated)
+    in_pool = set(words)
+    pool_group = list(words) + loaded
+    counts = {}
+    for word in loaded:
+        counts[word] = counts.get(word, 0) + 1
+    repeated = [word for word in counts if counts[word] > 1 or word in in_pool]
+    last = dict((word, i) for i, word in enumerate(loaded))
+    seen = dict((word, 0) for word in repeated)
+    template_slots = dict((n, dict((tuple(proj[0]), slot) for slot, proj in enumerate(template)))
+                          for n, template in lets_word_template.items())
+
+    for i, (word, language, rest) in enumerate(entries):
+        seen[word] = seen.get(word, 0) + 1
+        if last[word] == i:         # the unit of an earlier occurrence is replaced by this one
+            # projections from the letter units: inhibitory except from the letters of the word. Every projection is
+            # a copy, so that nothing is shared with the template or with the words of other models.
+            proj_list = [[list(sender), weight] for sender, weight in lets_word_template[len(word)]]
+            for pos, let in enumerate(word):
+                if (let, pos) in template_slots[len(word)]:
+                    slot = template_slots[len(word)][(let, pos)]
+                    proj_list[slot] = [[let, pos], -proj_list[slot][1]]
+            delta = {}
+            for other in set(repeated + [word]):
+                earlier = seen.get(other, 0) - (other == word)
+                count = int(other in in_pool or earlier > 0) - int(other in in_pool) - seen.get(other, 0)
+                if count != 0:
+                    delta[other] = count
+            words[word] = [Unit(proj_list, rest)]
+            words[word][0].setLateral([si, pool_group, delta])
+
+        # the word projects to each of its letter position units
+        word_lets_proj = [[word, word_lets_template[len(word)][0][1]], word_lets_template[len(word)][1]]
+        for pos, let in enumerate(word):
+            if lets[let][pos].isProjNone():
+                lets[let][pos].setProjList([word_lets_proj])
+            else:
+                lets[let][pos].getProjList().append(word_lets_proj)
+
+        # and to its language unit
+        word_lang_proj = [[word, word_lang_template[0][1]], word_lang_template[1]]
+        if lang[language][0].isProjNone():
+            lang[language][0].setProjList([word_lang_proj])
+        else:
+            lang[language][0].getProjList().append(word_lang_proj)
+
+    return mode, message
+
+
+#   Hash of everything the pools built by auto-loading stimuli_file depend on. base: the key of the pools before the
+#   load ('' for a fresh copy of the default lexicon of IA_pools, the lexicon_key of the last load after that)
+def lexicon_key(stimuli_file, resting_activation, base=''):
+    digest = hashlib.sha1()
+    digest.update(base)
+    with open(stimuli_file, 'rb') as f:
+        digest.update(f.read())
+    with open(IA_pools.__file__.replace('.pyc', '.py'), 'rb') as f:
+        digest.update(f.read())
+    for constant in (IA_pools.c, IA_pools.wd, IA_pools.lg, IA_pools.si, IA_pools.scsi, IA_pools.rest,
+                     resting_activation):
+        digest.update(repr(float(constant)))
+    return digest.hexdigest()
+
+
+#   Replace the units of the words pool with those of a cached network (see IA_engine.Network.getArrays): one Unit per
+#   word and position with its resting level. The units carry no projection lists; the cached network holds the
+#   weights.
+def restore_words(arrays, words):
+    restored = {}
+    for pool, key, rest in zip(arrays['pool'].tolist(), arrays['key'].tolist(), arrays['rest'].tolist()):
+        if pool == 'words':
+            restored.setdefault(key, []).append(Unit(activation=rest))
+    words.clear()
+    words.update(restored)
+    return
+
+
+#   Rebuild the projection lists of the units of the named pools (pools: {pool name: pool}) that receive from the
+#   words pool, i.e. the letter and language units, from the weights of a cached network, so that they project from
+#   the restored words only. The projections of a unit are in compiled (sender) order: the same projections as built
+#   by build_lexicon, but not necessarily in the same order.
+def restore_projections(arrays, pools, receivers=('lets', 'lang')):
+    names = zip(arrays['pool'].tolist(), arrays['key'].tolist(), arrays['pos'].tolist())
+    others = [name for name in pools if name not in ('lets', 'words')]
+    proj_lists = {}
+    for kind in ('exc_', 'inh_'):
+        for rcvr, sender, weight in zip(arrays[kind + 'rows'].tolist(), arrays[kind + 'cols'].tolist(),
+                                        arrays[kind + 'weights'].tolist()):
+            if names[rcvr][0] in receivers and names[sender][0] == 'words':
+                proj_lists.setdefault(rcvr, []).append((sender, [[names[sender][1], names[sender][2]], weight]))
+    for i, (pool_name, key, pos) in enumerate(names):
+        if pool_name not in receivers:
+            continue
+        unit = pools[pool_name][key][pos]
+        # keep the projections that resolve to a unit outside the words pool (see IA_engine.resolve_projections)
+        kept = [proj for proj in unit.getProjList() or [] if proj[0][0] in pools['lets'] or
+                (proj[0][0] not in pools['words'] and any(proj[0][0] in pools[name] for name in others))]
+        restored = [proj for sender, proj in sorted(proj_lists.get(i, []))]
+        unit.setProjList(kept + restored if len(kept + restored) > 0 else None)
+    return
@@ -0,0 +1,60 @@
+import os, shutil, tempfile
+import numpy as np
+import IA_model as im
+import IA_pools
+
+# Auto-loaded words get their resting level and the projections to their letter and language units, in lists of
+# their own: the models share none with each other or with the templates
+
+work = tempfile.mkdtemp()
+stimuli = os.path.join(work, 'stimuli.csv')
+with open(stimuli, 'w') as f:
+	f.write('perro,spanish,-0.3\nzebra,english\n')
+
+built = im.BIAModel()
+print str(built.autoLoad(stimuli) == (None, None))
+print str(built.words['perro'][0].getActivation() == -0.3 and 'zebra' in built.words)
+print str(['perro', 0] in [proj[0] for proj in built.lets['p'][0].getProjList()] and
+		  ['zebra', 0] in [proj[0] for proj in built.lang['english'][0].getProjList()])
+
+other = im.BIAModel()
+other.autoLoad(stimuli)
+def lists(projs):
+	return set(id(proj) for proj in projs) | set(id(proj[0]) for proj in projs)
+own = lists(built.words['zebra'][0].getProjList())
+print str(len(own & (lists(other.words['zebra'][0].getProjList()) | lists(IA_pools.lets_word_template[5]))) == 0)
+
+# A model that takes the network from the cache cycles to the same activations as the one that built it
+
+def run(model):
+	model.reset()
+	model.set_cue('c2')
+	model.present('perro')
+	model.cycle(10)
+	return np.array([unit.getActivation() for unit in model.listUnits()])
+
+cache_dir = os.path.join(work, 'networks')
+os.mkdir(cache_dir)
+built = im.BIAModel(use_engine=True)
+built.autoLoad(stimuli, cache_dir)
+restored = im.BIAModel(use_engine=True)
+print str(restored.autoLoad(stimuli, cache_dir)[1].startswith('Compiled network loaded'))
+print str(np.array_equal(run(built), run(restored)))
+
+# A cached network of other units (here, a letter unit of another resting level) or a damaged one is built and saved
+# again, not loaded
+
+cache_file = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+for damage in ('stale', 'damaged'):
+	if damage == 'stale':
+		arrays = dict((name, np.array(array)) for name, array in im.ie.load_arrays(cache_file).items())
+		arrays['rest'][list(arrays['pool']).index('lets')] += 0.1
+		im.ie.save_arrays(arrays, cache_file)
+	else:
+		with open(cache_file, 'r+b') as f:
+			f.truncate(100)
+	rebuilt = im.BIAModel(use_engine=True)
+	print str(rebuilt.autoLoad(stimuli, cache_dir) == (None, None))
+	print str(np.array_equal(run(built), run(rebuilt)))
+print str(im.BIAModel(use_engine=True).autoLoad(stimuli, cache_dir)[1].startswith('Compiled network loaded'))
+shutil.rmtree(work)
@@ -0,0 +1,749 @@
+import os, csv, copy, json
+import numpy as np
+import IA_pools
+from IA_pools import Unit
+import cohort_math_activations as cm
+import IA_engine as ie
+import IA_trace as tr
+import IA_lexicon as lx
+from IA_util import to_str
+
+# IA_model.py: The BIA/BIAPlus Model as an object
+#
+# A BIAModel owns everything a simulation needs: its own copy of the pools (lets, words, lang, schemas, cues), its
+# params, the activation traces, the trace log and the cycle/trial counters. Models share no state, so any number of
+# them can run side by side in one process or thread pool. IA.py drives a single BIAModel from its console UI; without
+# the UI a model is used as
+#   model = BIAModel()
+#   model.set_cue('c1')
+#   model.present('hello')
+#   model.cycle(20)
+#   model.settle()
+#
+# The dynamics are those of the original IA.py: netInput/update over the projection lists of the Units (or, with
+# use_engine, the compiled sparse-matrix network of IA_engine), and the non-word unit driven by the information gain
+# of the input word.
+
+__author__ = 'Andy Valenti'
+__copyright__ = "Copyright 2016. Tufts University"
+
+
+#   Parameter definitions (from Explorations in Parallel Distributed Processing: A Handbook of Models,
+#   Programs, and Exercises. James McClelland. July 28th, 2015)
+
+max = 1.0       # maximum activation parameter
+min = -0.2      # minimum activation parameter
+rest = -0.1     # the resting activation level to which activations tend to settle in the absence of external input
+decay = 0.1    # the decay rate parameter, which determines the strength of the tendency to return to resting level
+estr = 0.4      # this parameter stands for the strength of external input (inputs from outside the network). It scales
+                # the influence of external signals relative to internally generated inputs to units
+alpha = 0.1     # this parameter scales the strength of the excitatory input to units from other units in the network
+gamma = 0.1     # this parameter scales the strength of the inhibitory input to units from other units in the network
+scale = ie.info_gain_scale  # ARI_EDIT: scales the information gain of the input word that drives the non-word unit
+ncycles_default = 10   # default number of cycles
+default_params = {'max': max, 'min': min, 'rest': rest, 'decay': decay, 'estr': estr, 'alpha': alpha, 'gamma': gamma,
+                  'scale': scale, 'ncycles': ncycles_default}
+
+e = 0.0002      # epsilon value. settle stops cycling when activations change by this amount.
+pool_names = ['lets', 'words', 'lang', 'schemas', 'cues']
+log_header = ['Type', 'Input', 'Word', 'L1', 'L2', 'L1 LDT', 'L2 LDT', 'No. cycles', 'Event duration']
+log_columns = ['label', 'input', 'word', 'l1', 'l2', 'l1_ldt', 'l2_ldt', 'cycle', 'duration']  # NPZ names of log_header
+settle_header = ['Trial', 'Item', 'No. cycles', 'Cycles to settle', 'Settled']     # of the settles of the trace logs
+settle_columns = ['settle_trial', 'settle_item', 'settle_cycle', 'settle_cycles', 'settled']   # their NPZ names
+top_header = ['Trial', 'Record', 'Rank', 'Word', 'Activation']     # of the top K words at the records of the logs
+top_columns = ['top_trial', 'top_record', 'top_rank', 'top_word', 'top_act']   # their NPZ names
+checkpoint_magic = 'BIACKP02'   # first bytes of a checkpoint file (see BIAModel.saveCheckpoint)
+
+
+#   A fresh copy of the default lexicon of IA_pools: [lets, words, lang, schemas, cues]
+def new_pools():
+    return copy.deepcopy([IA_pools.lets, IA_pools.words, IA_pools.lang, IA_pools.schemas, IA_pools.cues])
+
+
+#   NEW readActivation using generic pool structure
+#   Reads all units in pool and if the pool is legal (a dict obj), returns:
+#   act_list: [[unit_name0, activation],..,[unit_name,activation]]
+#   Input: a pool such as words, lets, lang and an activation data set.
+#           It is up to the caller to initialize an empty dataset.
+def readActivations(pool):
+    def getKey(item):
+        return item[0]
+    act_list = []
+    for key, unit_list in pool.iteritems():
+        posnum = 0
+        for unit in unit_list:
+            activation = unit.getActivation()
+            act_list.append([key + repr(posnum),activation])
+            posnum += 1
+    act_list = sorted(act_list, key=getKey)
+
+    return act_list
+
+
+#   function netInput(rcvr_pool, params) reads the activation of each sending unit of the units in rcvr_pool. The
+#   senders are resolved once by IA_engine.resolve_projections, so no pool lookups are done here. The lateral
+#   inhibition of an auto-loaded word (see Unit.getLateralSenders) is the weight times the positive activation summed
+#   over its group, which is summed once per group, plus its delta senders.
+#   The standard netInput routine computes the net input for
+#   each pool. The net input consists of three things: the external input, scaled by
+#   estr; the excitatory input from other units, scaled by alpha; and the inhibitory
+#   input from other units, scaled by gamma. For each pool, the netInput routine first
+#   accumulates the excitatory and inhibitory inputs from other units, then scales
+#   the inputs and adds them to the scaled external input to obtain the net input.
+def netInput(rcvr_pool, params):
+    # generic pool function
+    group_totals = {}
+    for key, unit_list in rcvr_pool.iteritems():
+        for unit in unit_list:
+            excitation = 0
+            inhibition = 0
+            for sender, weight in unit.getSenders():
+                activation = sender.getActivation()
+                if activation > 0:     # process only positive activations
+                    if weight > 0:
+                        excitation += weight * activation
+                    elif weight < 0:
+                        inhibition += weight * activation
+            if unit.getLateralSenders() is not None:
+                weight, group, delta = unit.getLateralSenders()
+                if id(group) not in group_totals:
+                    group_totals[id(group)] = sum([activation for activation in
+                                                   [sender.getActivation() for sender in group] if activation > 0])
+                total = group_totals[id(group)]
+                for sender, count in delta:
+                    activation = sender.getActivation()
+                    if activation > 0:
+                        total += count * activation
+                if weight > 0:
+                    excitation += weight * total
+                elif weight < 0:
+                    inhibition += weight * total
+            excitation *= params['alpha']
+            inhibition *= params['gamma']
+            unit.setNetInput(excitation + inhibition + unit.getExtInput()*params['estr'])
+    return
+
+
+# Standard update. The update routine increments the activation of each unit,
+# based on the net input and the existing activation value.
+def update(pool, params):
+    # generic pool update
+    for key, unit_list in pool.iteritems():
+        for unit in unit_list:
+            activation = unit.getActivation()
+            resting_level = unit.getRest()
+            if activation > 0:
+                unit.setActivation(activation + (params['max'] - activation) * unit.getNetInput()
+                                   - params['decay'] * (activation - resting_level))
+            else:
+                unit.setActivation(activation + (activation - params['min']) * unit.getNetInput()
+                                   - params['decay'] * (activation - resting_level))
+    return
+
+
+#   Write trace logs (IA_trace.TraceLogs, see BIAModel.logTrace) to a file in bulk, one after the other: a CSV file with
+#   the log_header columns, or, if path ends in .npz, a NumPy .npz file with one typed array per column (log_columns),
+#   plus 'trial', the number of the log of each record (from 1). The event duration of a record is the number of
+#   cycles since the previous record of the same log, as the cycle count restarts with every log. The settles of the
+#   logs (see BIAModel.settle) go into the settle_columns of the .npz file, or into a CSV file with the settle_header
+#   columns next to the CSV file (log.csv: log.settle.csv), if there are any; the top K words at the records (when
+#   recorded, see BIAModel.setRecording) likewise go into the top_columns, or log.top.csv with the top_header
+#   columns. Files are written under a temporary name and renamed, so runs writing the same file never leave it
+#   half written.
+def write_log(path, logs):
+    labels = []
+    inputs = []
+    for log in logs:
+        labels.extend(log.labels)
+        inputs.extend(log.inputs)
+    trials = np.concatenate([np.zeros(0, dtype=np.int64)] + [np.repeat(trial, len(log)) for trial, log in
+                                                             enumerate(logs, 1)])
+    cycles = np.concatenate([np.zeros(0, dtype=np.int64)] + [log.getData()[2] for log in logs])
+    durations = np.concatenate([np.zeros(0, dtype=np.int64)] + [log.getDurations() for log in logs])
+    acts = np.concatenate([np.zeros((0, tr.log_acts))] + [log.getData()[3] for log in logs])
+    settles = [[trial] + settle for trial, log in enumerate(logs, 1) for settle in log.getSettles()]
+    tops = [[trial] + top for trial, log in enumerate(logs, 1) for top in log.getTops()]
+    partial = path + '.' + repr(os.getpid())
+    if path.endswith('.npz'):
+        columns = {'trial': trials, 'label': np.array(labels, dtype=str), 'input': np.array(inputs, dtype=str),
+                   'cycle': cycles, 'duration': durations}
+        for col, name in enumerate(log_columns[2:7]):
+            columns[name] = acts[:, col]
+        for col, (name, dtype) in enumerate(zip(settle_columns, (np.int64, str, np.int64, np.int64, bool))):
+            columns[name] = np.array([settle[col] for settle in settles], dtype=dtype)
+        for col, (name, dtype) in enumerate(zip(top_columns, (np.int64, np.int64, np.int64, str, np.float64))):
+            columns[name] = np.array([top[col] for top in tops], dtype=dtype)
+        with open(partial, 'wb') as f:
+            np.savez(f, **columns)
+    else:
+        with open(partial, 'wb') as csvfile:
+            logwriter = csv.writer(csvfile)
+            logwriter.writerow(log_header)
+            logwriter.writerows([label, input_word] + row + [cycleno, duration] for label, input_word, row, cycleno,
+                                duration in zip(labels, inputs, acts.tolist(), cycles.tolist(), durations.tolist()))
+        for ext, header, rows in (('.settle.csv', settle_header, settles), ('.top.csv', top_header, tops)):
+            if len(rows) > 0:
+                rows_path = os.path.splitext(path)[0] + ext
+                with open(rows_path + '.' + repr(os.getpid()), 'wb') as csvfile:
+                    logwriter = csv.writer(csvfile)
+                    logwriter.writerow(header)
+                    logwriter.writerows(rows)
+                os.rename(rows_path + '.' + repr(os.getpid()), rows_path)
+    os.rename(partial, path)
+    return
+
+
+class BIAModel:
+    #   pools: [lets, words, lang, schemas, cues] (default: a fresh copy of the default lexicon). params: overrides of
+    #   default_params. use_engine: run on the compiled sparse-matrix engine instead of the projection lists.
+    def __init__(self, pools=None, params=None, use_engine=False):
+        self.lexicon_key = '' if pools is None else None    # IA_lexicon.lexicon_key of the pools; None if unknown
+        if pools is None:
+            pools = new_pools()
+        self.lets, self.words, self.lang, self.schemas, self.cues = pools
+        self.pool_list = [self.lets, self.words, self.lang, self.schemas, self.cues]
+        self.pool_names = list(pool_names)
+        self.params = dict(default_params)
+        if params is not None:
+            self.params.update(params)
+        self.use_engine = use_engine  # when True, cycle runs the compiled sparse-matrix engine (IA_engine)
+        self.network = None         # the compiled network; rebuilt by compileNetwork() whenever the pools change
+        self.network_cached = False     # True when the word units were restored from a network file
+        self.network_key = None     # network_digest of the network; computed by networkKey()
+        self.cohort = None          # cohort_math context of the words pool; rebuilt by buildCohort()
+
+        self.trial = 1              # counts the number of times the model has been reset. It is never reset.
+        self.cycleno = 0            # current cycle; it is reset by reset()
+        self.input_word = ''
+        self.blank = False          # True while cycling without a word (blank)
+        self.verbose = False        # print the word and language activations of every cycle
+        self.log = tr.TraceLog()    # trace records (see logTrace)
+
+        self.act_dataset = None     # accumulates word activations (IA_trace.TraceStore); built by newTraces()
+        self.act_langset = None     # accumulates language node activations
+        self.act_schemaset = None   # accumulates schema node activations
+        self.act_topset = None      # top-K word activations of every cycle, when record_spec asks for them
+        self.pool_units = {}        # pool name -> Units of the traced pools in readActivations order
+        self.trace_columns = {}     # pool name -> columns (into pool_units) recorded in the pool's trace
+        self.record_spec = tr.RecordSpec()  # what is traced; everything by default (see setRecording)
+        self.trace_dir = None       # when set, traces are streamed to files in this directory
+        self.trace_window = 1000    # number of cycles of a streamed trace kept in memory
+        self.settle_cycles = {}     # unit name -> cycle after which its activation settled, from the last settle()
+        self.warm_states = {}       # (cue, ncycles, tolerance, engine, params) -> pre-stimulus state (see warmStart)
+
+        self.resolveProjections()
+        self.buildCohort()
+        self.newTraces()
+
+    # Reset completely restarts the model.
+    # NOTES: Does NOT reset the params
+    def reset(self):
+        # reset each unit to default activation, rest, net-input, and ext_input values
+        for pool in self.pool_list:
+            for key, unit_list in pool.iteritems():
+                for unit in unit_list:
+                    unit.resetActivation()
+                    unit.setExtInput(0.0)
+                    unit.setNetInput(0.0)
+        self.trial += 1
+        self.cycleno = 0
+        self.verbose = False
+        self.newTraces()
+        self.input_word = ''
+        self.blank = False
+        self.log = tr.TraceLog()
+        return
+
+    #   Present a new input word to the lets pool (truncated to 5 letters); clears the ext_input of the last word.
+    #   Returns the word as presented.
+    def present(self, word):
+        self.clearInput()
+        self.blank = False
+        self.input_word = word.lower()[:5]
+        for pos in range(len(self.input_word)):
+            self.lets[self.input_word[pos]][pos].setExtInput(1)
+        return self.input_word
+
+    #   clear the ext_input of the letters of the input word (which stays the input word)
+    def clearInput(self):
+        for pos in range(len(self.input_word)):
+            self.lets[self.input_word[pos]][pos].setExtInput(0)
+        return
+
+    #   Set the cue ext input: 'c1' activates cue1, 'c2' cue2 (turning the complementary cue off); None turns both off
+    def set_cue(self, cue):
+        self.cues['cue1'][0].setExtInput(1 if cue == 'c1' else 0)
+        self.cues['cue2'][0].setExtInput(1 if cue == 'c2' else 0)
+        return
+
+    #  cycle(ncycles) cycles through the pools, collecting the net input of each unit and then updating the unit
+    #  activation, ncycles times (default: params['ncycles']). Each cycle is recorded in the traces, and once a word is
+    #  presented in the word trace of the log. until: a test run after every cycle that stops the cycling when it
+    #  returns True (see settle). Returns the number of cycles run.
+    #  verbose controls printing of each update cycle to the standard output (console)
+    def cycle(self, ncycles=None, until=None):
+        if ncycles is None:
+            ncycles = self.params['ncycles']
+        if self.use_engine:
+            if self.network is None:
+                self.compileNetwork()
+            self.network.load()
+        cycles = 0
+        for reps in range(int(ncycles)):  # ensure ncycles is type int bc params may hold it as a float
+            self.cycleno += 1
+            cycles += 1
+            if self.use_engine:
+                # same netInput/update and info gain as below, run as sparse matrix ops on the compiled network
+                self.network.cycle(self.params)
+                self.network.setInfoGain(self.network.activation, [self.input_word], self.params['scale'])
+            else:
+                # gather netInput from pools
+                for pool in (self.cues, self.lets, self.words, self.lang, self.schemas):
+                    netInput(pool, self.params)
+                # update the pools
+                for pool in (self.cues, self.lets, self.words, self.lang, self.schemas):
+                    update(pool, self.params)
+
+                # ARI_EDIT
+                # calculate information gain to stimulate non-word node (there is none before a word is presented)
+                if self.input_word != '':
+                    actvals = self.poolActivations('words')
+                    info_gain, offset = self.cohort.get_info_gain(self.input_word, actvals, True, cm.avg, 100)
+                    info_gain = info_gain * self.params['scale']
+                    self.words['non-word'][0].setActivation(info_gain)
+
+            self.recordTraces()
+            if self.input_word != '':
+                self.log.appendWord('BLANK' if self.blank else self.input_word, self.cycleno, self.inputActivation())
+            if self.verbose is True:
+                if self.use_engine:
+                    word_acts, lang_acts = self.network.readActivations('words'), self.network.readActivations('lang')
+                else:
+                    word_acts, lang_acts = readActivations(self.words), readActivations(self.lang)
+                print 'Word Activations:'
+                print('Cycleno: ' + repr(reps + 1) + ' ' + repr(word_acts))
+                print 'Language Node Activations:'
+                print('Cycleno: ' + repr(reps + 1) + ' ' + repr(lang_acts))
+            if until is not None and until():
+                break
+        if self.use_engine:
+            self.network.store()
+        return cycles
+
+    #   Clear the ext_input to the letters and the cues and cycle the network ncycles times
+    def blankCycle(self, ncycles=None):
+        self.blank = True
+        self.clearInput()
+        self.set_cue(None)
+        self.cycle(ncycles)
+        return
+
+    #   Cycle the model until the largest change in activation over the whole network (or over the units of pool_name)
+    #   is within tolerance (see IA_engine.SettleMonitor), or max_cycles have run. With the engine the test runs on
+    #   the activation vector of the compiled network, within one cycle() call. Returns the number of cycles run;
+    #   settle_cycles then holds the cycles-to-settle of every unit, and the settle is added to the log (see
+    #   IA_trace.TraceLog) as pool_name or 'network'.
+    def settle(self, tolerance=e, pool_name=None, max_cycles=10000):
+        names = []
+        units = []
+        columns = []
+        for name, pool in zip(self.pool_names, self.pool_list):
+            for key in sorted(pool):
+                for pos, unit in enumerate(pool[key]):
+                    if name == pool_name:
+                        columns.append(len(units))
+                    names.append(key + repr(pos))
+                    units.append(unit)
+        if pool_name is None:
+            columns = None
+
+        def read():
+            if self.use_engine:
+                return self.network.activation      # the compiled network has the same unit order
+            return np.array([unit.getActivation() for unit in units])
+
+        monitor = ie.SettleMonitor([unit.getActivation() for unit in units], tolerance, columns)
+        cycles = self.cycle(max_cycles, lambda: monitor.step(read()))
+        self.settle_cycles = dict(zip(names, monitor.unit_settle.tolist()))
+        self.log.appendSettle('network' if pool_name is None else pool_name, self.cycleno, cycles,
+                              bool(monitor.settled))
+        return cycles
+
+    #   Cycle the model until the activation of item (a word, language or schema unit) changes by at most tolerance,
+    #   giving it a few cycles to become activated, or max_cycles have run. The settle is added to the log as item.
+    #   Returns the number of cycles run, or None for an unknown item.
+    def settleItem(self, item, tolerance=e, max_cycles=10000):
+        for pool_name, pool in (('words', self.words), ('lang', self.lang), ('schemas', self.schemas)):
+            if item in pool:
+                unit = pool[item][0]
+                break
+        else:
+            return None
+
+        def read():
+            if self.use_engine:
+                return self.network.activation[[self.network.unit_index[(pool_name, item, 0)]]]
+            return np.array([unit.getActivation()])
+
+        # Check for convergence to epsilon, after more than 6 cycles
+        monitor = ie.SettleMonitor([unit.getActivation()], tolerance, min_cycles=6)
+        cycles = self.cycle(max_cycles, lambda: monitor.step(read()))
+        self.log.appendSettle(item, self.cycleno, cycles, bool(monitor.settled))
+        return cycles
+
+    #   Every unit of the pools, in pool, key and position order
+    def listUnits(self):
+        return [unit for pool in self.pool_list for key in sorted(pool) for unit in pool[key]]
+
+    #   The dynamic state of the model: (cycleno, [[activation, net_input],..] of listUnits)
+    def getState(self):
+        return self.cycleno, [[unit.getActivation(), unit.getNetInput()] for unit in self.listUnits()]
+
+    def setState(self, state):
+        self.cycleno, values = state
+        for unit, (activation, net_input) in zip(self.listUnits(), values):
+            unit.setActivation(activation)
+            unit.setNetInput(net_input)
+        self.loadUnits()
+        return
+
+    #   Copy the state of the Units into the compiled network, when the model runs on it (cycle does so before every
+    #   run of cycles; this keeps what is read from the network in between current)
+    def loadUnits(self):
+        if self.use_engine and self.network is not None:
+            self.network.load()
+            self.network.net_input = np.array([unit.getNetInput() for unit in self.network.units])
+        return
+
+    #   Reset the model and start it from the pre-stimulus state of cue ('c1', 'c2' or None): the state reached by
+    #   cycling the network without a word, the cue on, for ncycles (until it settles to tolerance if ncycles is None,
+    #   see settle). The state is computed the first time a cue, ncycles, tolerance and params come up, and restored
+    #   from then on; either way the traces and the log start after the warm-up. Returns the cycleno of the state.
+    def warmStart(self, cue, ncycles=None, tolerance=e):
+        self.reset()
+        self.set_cue(cue)
+        self.blank = True
+        key = (cue, ncycles, tolerance, self.use_engine, tuple(sorted(self.params.items())))
+        if key in self.warm_states:
+            self.setState(self.warm_states[key])
+        else:
+            if ncycles is None:
+                self.settle(tolerance)
+            else:
+                self.cycle(ncycles)
+            self.warm_states[key] = self.getState()
+            self.newTraces()
+            self.log = tr.TraceLog()
+        return self.cycleno
+
+    #   The complete state of the model as (arrays, meta): the activation, ext and net input of every unit, and the
+    #   traces and the cycle numbers and activations of the trace log recorded so far, in arrays; cycleno, trial, input
+    #   word, params, the record spec, the labels and input words of the trace log and the digest of the network (see
+    #   networkKey) in meta. Nothing in it is shared with the model.
+    def getCheckpoint(self):
+        units = self.listUnits()
+        arrays = {'activation': np.array([unit.getActivation() for unit in units], dtype=np.float64),
+                  'ext_input': np.array([unit.getExtInput() for unit in units], dtype=np.float64),
+                  'net_input': np.array([unit.getNetInput() for unit in units], dtype=np.float64)}
+        for pool_name, trace in zip(tr.traced_pools, (self.act_dataset, self.act_langset, self.act_schemaset)):
+            arrays['trace_' + pool_name] = np.array(trace.getData(), dtype=np.float64)
+        if self.act_topset is not None:
+            columns, values = self.act_topset.getData()
+            arrays['top_columns'], arrays['top_values'] = columns.copy(), values.copy()
+        labels, inputs, cycles, acts = self.log.getData()
+        arrays['log_cycles'], arrays['log_acts'] = cycles.copy(), acts.copy()
+        word_inputs, word_cycles, word_acts = self.log.getWordTrace()
+        arrays['word_cycles'], arrays['word_acts'] = word_cycles.copy(), word_acts.copy()
+        meta = {'network': self.networkKey(), 'num_units': len(units), 'cycleno': self.cycleno, 'trial': self.trial,
+                'input_word': self.input_word, 'blank': self.blank, 'params': dict(self.params),
+                'use_engine': self.use_engine, 'record': self.record_spec.getItems(),
+                'log_labels': list(labels), 'log_inputs': list(inputs), 'word_inputs': list(word_inputs),
+                'log_settles': [list(settle) for settle in self.log.getSettles()],
+                'log_tops': [list(top) for top in self.log.getTops()],
+                'settle_cycles': dict(self.settle_cycles)}
+        return arrays, meta
+
+    #   Restore the state of getCheckpoint, which must have been taken from a model with the same network. Returns
+    #   None, or an error message (the model is then left as it was).
+    def setCheckpoint(self, arrays, meta):
+        units = self.listUnits()
+        if meta['num_units'] != len(units) or meta['network'] != self.networkKey():
+            return 'Checkpoint was taken from a model with a different network'
+        for unit, activation, ext_input, net_input in zip(units, arrays['activation'].tolist(),
+                                                          arrays['ext_input'].tolist(), arrays['net_input'].tolist()):
+            unit.setActivation(activation)
+            unit.setExtInput(ext_input)
+            unit.setNetInput(net_input)
+        self.cycleno = meta['cycleno']
+        self.trial = meta['trial']
+        self.input_word = meta['input_word']
+        self.blank = meta['blank']
+        self.params = dict(meta['params'])
+        self.use_engine = meta['use_engine'] or self.network_cached
+        self.log = tr.TraceLog()
+        self.log.restore(meta['log_labels'], meta['log_inputs'], arrays['log_cycles'], arrays['log_acts'])
+        if 'word_inputs' in meta:       # not in checkpoints saved before the word trace
+            self.log.restoreWordTrace(meta['word_inputs'], arrays['word_cycles'], arrays['word_acts'])
+        self.log.restoreSettles(meta.get('log_settles', []))
+        self.log.restoreTops(meta.get('log_tops', []))
+        self.settle_cycles = dict(meta['settle_cycles'])
+        self.record_spec = tr.RecordSpec(meta['record'])
+        self.newTraces()
+        for pool_name, trace in zip(tr.traced_pools, (self.act_dataset, self.act_langset, self.act_schemaset)):
+            for row in arrays['trace_' + pool_name]:
+                trace.append(row)
+        if self.act_topset is not None:
+            self.act_topset.restore(arrays['top_columns'], arrays['top_values'])
+        self.loadUnits()
+        return None
+
+    #   Save the complete state of the model (see getCheckpoint) to a checkpoint file. The file has the layout of a
+    #   network file (IA_engine.save_arrays), with meta in a JSON 'meta' array.
+    def saveCheckpoint(self, path):
+        arrays, meta = self.getCheckpoint()
+        arrays['meta'] = np.frombuffer(json.dumps(meta), dtype=np.uint8)
+        ie.save_arrays(arrays, path, checkpoint_magic)
+        return
+
+    #   Restore the state saved by saveCheckpoint. Returns None, or an error message (the model is then left as it
+    #   was).
+    def restoreCheckpoint(self, path):
+        if not os.path.isfile(path):
+            return 'Checkpoint file does not exist: ' + repr(path)
+        try:
+            arrays = ie.load_arrays(path, checkpoint_magic)
+            meta = to_str(json.loads(arrays['meta'].tobytes()))
+        except (ValueError, KeyError):
+            return 'Not a checkpoint file: ' + repr(path)
+        error = self.setCheckpoint(arrays, meta)
+        if error is not None:
+            return error + ': ' + repr(path)
+        return None
+
+    #   Activation of the input word (rest if it is not in the lexicon), read from the compiled network when it is
+    #   running
+    def inputActivation(self):
+        if self.input_word not in self.words:
+            return rest
+        if self.use_engine:
+            return float(self.network.activation[self.network.unit_index[('words', self.input_word, 0)]])
+        return self.words[self.input_word][0].getActivation()
+
+    #   Get and return activation of input word, l1 lang, l2 lang, l1 schema, l2 schema
+    def getActivations(self):
+        if self.input_word not in self.words:
+            word_act = rest
+        else:
+            word_act = self.words[self.input_word][0].getActivation()
+        return (word_act, self.lang['english'][0].getActivation(), self.lang['spanish'][0].getActivation(),
+                self.schemas['l1'][0].getActivation(), self.schemas['l2'][0].getActivation())
+
+    #   Add a trace record to the log: label, input word (or BLANK), cycleno and the getActivations values (the event
+    #   duration is worked out when the log is written), and the top K words of the last cycle, when recorded
+    def logTrace(self, label):
+        acts = [round(act,4) for act in self.getActivations()]     # round to a reasonable precision
+        self.log.append(label, 'BLANK' if self.blank else self.input_word, self.cycleno, acts)
+        if self.act_topset is not None and len(self.act_topset) > 0:
+            self.log.appendTops([word, round(act,4)] for word, act in self.act_topset.getTop())
+        return
+
+    #   write the log to a CSV file, or an NPZ file if path ends in .npz (see write_log)
+    def writeLog(self, path='log.csv'):
+        write_log(path, [self.log])
+        return
+
+    #   Activations of the units of a pool in readActivations order, read from the compiled network when it is running
+    def poolActivations(self, pool_name):
+        if self.use_engine:
+            return self.network.activation[self.network.pool_index[pool_name]]
+        return [unit.getActivation() for unit in self.pool_units[pool_name]]
+
+    #   Append the current activations of the units selected by record_spec to the traces
+    def recordTraces(self):
+        for pool_name, trace in zip(tr.traced_pools, (self.act_dataset, self.act_langset, self.act_schemaset)):
+            columns = self.trace_columns[pool_name]
+            if self.use_engine:
+                trace.append(self.network.activation[self.network.pool_index[pool_name][columns]])
+            else:
+                units = self.pool_units[pool_name]
+                trace.append([units[col].getActivation() for col in columns])
+        if self.act_topset is not None:
+            self.act_topset.append(self.poolActivations('words'))
+        return
+
+    #   The word trace to display: act_dataset, or when it traces no words but the top K words are recorded, a
+    #   TraceStore of the words that were ever in the top K (see IA_trace.TopKTrace.getSeries)
+    def wordDataset(self):
+        if self.act_topset is None or self.act_dataset.getNumUnits() > 0:
+            return self.act_dataset
+        return self.topDataset()
+
+    #   A TraceStore of the words that were ever in the top K, NaN in the cycles they were not; None if the top K
+    #   words are not recorded
+    def topDataset(self):
+        if self.act_topset is None:
+            return None
+        keys, series = self.act_topset.getSeries()
+        dataset = tr.TraceStore(keys, len(series) + 1)
+        for row in series:
+            dataset.append(row)
+        return dataset
+
+    #   Start new, empty activation traces of the words, lang and schemas pools, limited to what record_spec selects.
+    #   Must be called again whenever units are added to the pools.
+    def newTraces(self):
+        for trace in (self.act_dataset, self.act_langset, self.act_schemaset):
+            if trace is not None:
+                trace.close()
+        traces = []
+        for pool_name, pool in zip(self.pool_names, self.pool_list):
+            if pool_name not in tr.traced_pools:
+                continue
+            keys = [act[0][:-1] for act in readActivations(pool)]
+            if pool_name == 'words':
+                word_keys = keys
+            self.pool_units[pool_name] = [pool[key][0] for key in keys]
+            self.trace_columns[pool_name] = np.array(self.record_spec.getColumns(pool_name, keys), dtype=np.int64)
+            traces.append(tr.new_store([keys[col] for col in self.trace_columns[pool_name]], pool_name,
+                                       self.trace_dir, self.trace_window))
+        self.act_dataset, self.act_langset, self.act_schemaset = traces
+        self.act_topset = None
+        if self.record_spec.getTopK() > 0:
+            self.act_topset = tr.TopKTrace(word_keys, self.record_spec.getTopK())
+        return
+
+    #   Limit the traces to the given items: unit names, pool names (words, lang, schemas) and/or 'top=K' for the K
+    #   most active words. No items traces everything. Starts new traces.
+    def setRecording(self, items=None):
+        self.record_spec = tr.RecordSpec(items)
+        self.newTraces()
+        return
+
+    #   Stream the traces to files in trace_dir, keeping window cycles in memory (trace_dir None: memory only).
+    #   Starts new traces. Raises ValueError for a window of less than one cycle, before changing anything.
+    def setTraceDir(self, trace_dir, window=None):
+        if window is not None and window < 1:
+            raise ValueError('trace window must be at least one cycle, not ' + repr(window))
+        self.trace_dir = trace_dir
+        if window is not None:
+            self.trace_window = window
+        self.newTraces()
+        return
+
+    #   Resolve every projection in the pools to a direct reference to its sending unit and validate the network.
+    #   Must be called again whenever projections are added to the pools.
+    def resolveProjections(self):
+        ie.resolve_projections(self.pool_list)
+        return
+
+    #   Precompute the cohort (letter-position membership of every word unit) used for the info gain in cycle.
+    #   Must be called again whenever words are added.
+    def buildCohort(self):
+        self.cohort = cm.CohortContext([act[0] for act in readActivations(self.words)])
+        return
+
+    #   Compile the pools into the sparse-matrix engine. Must be called again whenever projections are added to the
+    #   pools.
+    def compileNetwork(self):
+        if not self.network_cached:
+            self.network = ie.compile_network(self.pool_list, self.pool_names)
+            self.network_key = None
+        return self.network
+
+    #   Digest of the network the model runs (see IA_engine.network_digest), compiling it if need be. It keys the
+    #   results of the model, e.g. in an IA_cache.ResultCache.
+    def networkKey(self):
+        if self.network is None:
+            self.compileNetwork()
+        if self.network_key is None:
+            self.network_key = ie.network_digest(self.network)
+        return self.network_key
+
+    #   Load a network saved by IA_engine.save_network in place of the auto-loaded words: the word units are replaced
+    #   by the cached ones, which have no projection lists, so the model has to run on the compiled engine from then
+    #   on. Raises ValueError for a file that is not a complete network file, or one of a network of other units (the
+    #   pools are then left as they were).
+    def loadNetwork(self, path):
+        arrays = ie.load_arrays(path)
+        words = dict(self.words)
+        proj_lists = [(unit, unit.getProjList()) for pool in (self.lets, self.lang) for unit_list in pool.values()
+                      for unit in unit_list]
+        try:
+            lx.restore_words(arrays, self.words)
+            lx.restore_projections(arrays, dict(zip(self.pool_names, self.pool_list)))
+            self.resolveProjections()
+            network = ie.Network(self.pool_list, self.pool_names, arrays=arrays)
+        except (ValueError, KeyError, IndexError) as error:
+            self.words.clear()
+            self.words.update(words)
+            for unit, proj_list in proj_lists:
+                unit.setProjList(proj_list)
+            self.resolveProjections()
+            raise ValueError('Network file does not match the pools: {0:s} ({1:s})'.format(repr(path), str(error)))
+        self.warm_states = {}
+        self.buildCohort()
+        self.network = network
+        self.network_key = None
+        self.network_cached = True
+        self.use_engine = True
+        self.newTraces()
+        return self.network
+
+    #   Run many stimuli at once through the compiled engine, each from a freshly reset network (see
+    #   IA_engine.run_batch). Does not touch the state of the pools. Returns an IA_engine.BatchResult.
+    def runBatch(self, stimuli, cues=None, ncycles=None, record=('lang', 'schemas')):
+        if self.network is None:
+            self.compileNetwork()
+        if ncycles is None:
+            ncycles = int(self.params['ncycles'])
+        return ie.run_batch(self.network, stimuli, self.params, ncycles, cues, record)
+
+    #   Read new word stimuli from a CSV file (word,language,resting_activation) and add them to the lets, words, and
+    #   lang pools in one pass (see IA_lexicon.build_lexicon). With the engine on and a cache_dir, the compiled network
+    #   is taken from (or saved to) the network cache. Returns (status, message): status is None, or the
+    #   'Warning: Auto-load' / 'Error: Auto-load' mode of the UI.
+    def autoLoad(self, stimuli_file, cache_dir=None):
+        if not os.path.isfile(stimuli_file):
+            return 'Error: Auto-load', 'Stimuli file does not exist: ' + repr(stimuli_file)
+        # the pools after the load are a function of the pools before it only if those are known (see lexicon_key)
+        key = None
+        if self.lexicon_key is not None:
+            key = lx.lexicon_key(stimuli_file, self.params['rest'], self.lexicon_key)
+        cache_file = None
+        if self.use_engine and cache_dir is not None and key is not None:
+            cache_file = os.path.join(cache_dir, key + '.net')
+            if os.path.isfile(cache_file):
+                try:
+                    self.loadNetwork(cache_file)
+                except ValueError:
+                    pass        # a damaged cache file: built and saved again below
+                else:
+                    self.lexicon_key = key
+                    return None, 'Compiled network loaded from ' + repr(cache_file)
+        if self.network_cached:
+            return 'Error: Auto-load', 'Words were loaded from the network cache; restart to auto-load more stimuli'
+        stimuli = lx.load_stimuli(stimuli_file)
+        # we can alter the default resting level for auto-loaded words via params['rest']
+        status, message = lx.build_lexicon(stimuli, self.words, self.lets, self.lang, self.params['rest'])
+
+        # ARI_EDIT
+        nonword_resting_activation = self.params['rest'] if len(stimuli) > 0 else 0.0
+
+        # ARI_EDIT
+        self.words['non-word'] = [Unit(activation=nonword_resting_activation)]  # no projections to letters
+
+        self.resolveProjections()
+        self.buildCohort()
+        self.newTraces()
+        self.lexicon_key = key
+        self.network = None     # compiled from the pools before the load
+        self.network_key = None
+        self.warm_states = {}
+        if self.use_engine:
+            self.compileNetwork()
+            # cache the network of a clean load only, so that loading it again reports the same (lack of) messages
+            if cache_file is not None and status is None:
+                if not os.path.isdir(cache_dir):
+                    os.makedirs(cache_dir)
+                ie.save_network(self.network, cache_file)
+        return status, message
@@ -0,0 +1,142 @@
+import os, csv, shutil, tempfile
+import numpy as np
+import IA_model as im
+
+# Running a target from a checkpoint of the prime, in the same or a new model, ends where running the prime and the
+# target straight through does, trace log included; a file that is not a checkpoint is reported. With only the top K
+# words recorded, the log keeps the top K at every record, through checkpoints and into the written log.
+
+def prime(model):
+	model.set_cue('c1')
+	model.present('hello')
+	model.cycle(10)
+	model.logTrace('prime')
+
+def target(model):
+	model.present('cama')
+	model.cycle(10)
+	model.logTrace('target')
+	return np.array([unit.getActivation() for unit in model.listUnits()]), model.log.getRows()
+
+work = tempfile.mkdtemp()
+path = os.path.join(work, 'prime.ckpt')
+model = im.BIAModel()
+prime(model)
+model.saveCheckpoint(path)
+direct_acts, direct_rows = target(model)
+print str(model.restoreCheckpoint(path) is None)
+acts, rows = target(model)
+print str(np.array_equal(acts, direct_acts) and rows == direct_rows)
+restored = im.BIAModel()
+print str(restored.restoreCheckpoint(path) is None)
+acts, rows = target(restored)
+print str(np.array_equal(acts, direct_acts) and rows == direct_rows)
+
+junk = os.path.join(work, 'junk.ckpt')
+with open(junk, 'wb') as f:
+	f.write('not a checkpoint')
+print str(restored.restoreCheckpoint(junk).startswith('Not a checkpoint file'))
+
+model = im.BIAModel()
+model.setRecording(['top=3'])
+prime(model)
+model.saveCheckpoint(path)
+target(model)
+tops = model.log.getTops()
+print str([top[:3] for top in tops] == [[1, 1, 'hello'], [1, 2, 'non-word'], [1, 3, 'hola'], [2, 1, 'non-word'],
+                                        [2, 2, 'hello'], [2, 3, 'cama']])
+print str(model.wordDataset().getNumUnits() > 0 and 'cama' in model.wordDataset().getKeys())
+restored = im.BIAModel()
+restored.restoreCheckpoint(path)
+target(restored)
+print str(restored.log.getTops() == tops)
+im.write_log(os.path.join(work, 'log.csv'), [model.log, restored.log])
+with open(os.path.join(work, 'log.top.csv')) as f:
+	print str(len(f.readlines()) == 1 + 2 * len(tops))
+im.write_log(os.path.join(work, 'log.npz'), [model.log])
+print str(list(np.load(os.path.join(work, 'log.npz'))['top_word']) == [top[2] for top in tops])
+shutil.rmtree(work)
+
+# Every cycle adds a row to the trace of each pool: the activations of its units, in readActivations order
+
+model = im.BIAModel()
+model.set_cue('c1')
+model.present('hola')
+rows = {'words': [], 'lang': []}
+for i in range(5):
+	model.cycle(1)
+	for pool_name, pool in (('words', model.words), ('lang', model.lang)):
+		rows[pool_name].append([act for key, act in im.readActivations(pool)])
+for pool_name, pool, trace in (('words', model.words, model.act_dataset), ('lang', model.lang, model.act_langset)):
+	print str(trace.getKeys() == [key[:-1] for key, act in im.readActivations(pool)] and
+			  np.array_equal(trace.getData(), rows[pool_name]))
+
+# A network settle stops at the first cycle after which no unit changed by more than the tolerance, on the engine too,
+# and reports the last cycle each unit changed by more
+
+def start(use_engine):
+	model = im.BIAModel(use_engine=use_engine)
+	model.set_cue('c2')
+	model.present('cama')
+	return model
+
+def acts(model):
+	return np.array([unit.getActivation() for unit in model.listUnits()])
+
+model = start(False)
+cycles = model.settle(1e-4)
+print str(model.log.getSettles() == [['network', cycles, cycles, True]] and start(True).settle(1e-4) == cycles)
+replay = start(False)
+replay.cycle(cycles - 2)
+before = acts(replay)
+replay.cycle(1)
+last = acts(replay)
+replay.cycle(1)
+print str(np.max(np.abs(last - before)) > 1e-4 and np.max(np.abs(acts(replay) - last)) <= 1e-4)
+print str(max(model.settle_cycles.values()) == cycles - 1 and len(model.settle_cycles) == len(model.listUnits()))
+
+# A trial started from the cached pre-stimulus state of a cue ends where resetting and cycling the warm-up ends, the
+# first time (when the state is computed) and every time after (when it is restored)
+
+def trial(model):
+	model.present('hola')
+	model.cycle(10)
+	return model.cycleno, acts(model)
+
+cold = im.BIAModel()
+cold.reset()
+cold.set_cue('c1')
+cold.cycle(20)
+cold_cycleno, cold_acts = trial(cold)
+model = im.BIAModel()
+for i in range(2):
+	print str(model.warmStart('c1', 20) == 20)
+	cycleno, warm_acts = trial(model)
+	print str(cycleno == cold_cycleno and np.array_equal(warm_acts, cold_acts) and len(model.warm_states) == 1)
+
+# The trace logs of several trials written in bulk to CSV and to NPZ hold the same records, settles and durations
+
+logs = []
+for word in ('hola', 'cama'):
+	model = im.BIAModel()
+	model.present(word)
+	model.cycle(5)
+	model.logTrace('early')
+	model.settleItem(word)
+	model.logTrace('settled')
+	logs.append(model.log)
+work = tempfile.mkdtemp()
+im.write_log(os.path.join(work, 'log.csv'), logs)
+im.write_log(os.path.join(work, 'log.npz'), logs)
+columns = np.load(os.path.join(work, 'log.npz'))
+with open(os.path.join(work, 'log.csv'), 'rb') as f:
+	rows = list(csv.reader(f))
+print str(rows[0] == im.log_header and len(rows) == 5 and list(columns['trial']) == [1, 1, 2, 2])
+print str(all([row[col] for row in rows[1:]] == [str(value) for value in columns[name].tolist()]
+			  for col, name in enumerate(im.log_columns)))
+print str(list(columns['duration']) == [5, logs[0].getSettles()[0][2], 5, logs[1].getSettles()[0][2]])
+with open(os.path.join(work, 'log.settle.csv'), 'rb') as f:
+	rows = list(csv.reader(f))
+print str(rows[0] == im.settle_header and
+		  [row[1] for row in rows[1:]] == list(columns['settle_item']) == ['hola', 'cama'])
+shutil.rmtree(work)
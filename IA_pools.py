@@ -27,6 +27,12 @@ rest = -0.1     # the resting activation level to which activations tend to sett
 #        weight: the positive (excitatory) weight of negative (inhibitory) weight of the projection.
 # Unit vales accessible via get and set methods:
 #   Projection list exactly in the form as in Input. Caller can test for projections via isProjNone() method.
+#   Senders: the projection list resolved to [(sending Unit, weight),..] by IA_engine.resolve_projections
+#   Lateral: None, or the lateral inhibition an auto-loaded word gets instead of one si projection per word (see
+#            IA_lexicon.build_lexicon): [weight, group, delta], i.e. a projection of weight from every unit named in
+#            the group (a list of keys shared by the words of a load, position 0, once per occurrence), plus delta
+#            (a {key: count} dict) more from the named units (count < 0: fewer). Resolved by
+#            IA_engine.resolve_projections to (weight, [sending Unit,..], [(sending Unit, count),..]): Lateral Senders.
 #   Activation, net input, and external input for THIS unit
 class Unit:
     def __init__(self, projections=None, activation=None):
@@ -43,6 +49,9 @@ class Unit:
         self.activation = self.rest
         self.ext_input = 0.0
         self.net_input = 0.0
+        self.senders = []
+        self.lateral = None
+        self.lateral_senders = None
 
     def isProjNone(self):
         if self.projections is None:
@@ -71,6 +80,27 @@ class Unit:
         self.projections = proj_list
         return
 
+    def getSenders(self):
+        return self.senders
+
+    def setSenders(self, senders):
+        self.senders = senders
+        return
+
+    def getLateral(self):
+        return self.lateral
+
+    def setLateral(self, lateral):
+        self.lateral = lateral
+        return
+
+    def getLateralSenders(self):
+        return self.lateral_senders
+
+    def setLateralSenders(self, lateral_senders):
+        self.lateral_senders = lateral_senders
+        return
+
     def getProj(self,proj_index):
         if proj_index > len(self.projections):
             print("Error(getProj): Out of Index")
@@ -0,0 +1,516 @@
+import re, itertools
+import multiprocessing
+import IA_model as im
+import IA_trace as tr
+
+# IA_script.py: Script processing for the BIA/BIAPlus Models without the console UI
+#
+# Runs the script files of IA.scriptProcessor on a BIAModel. Each record is in CSV format and invokes a model
+# function as follows:
+#   ['r']                resets the model
+#   ['n',word]           present a new 3 to 5 letter word to the lets pool
+#   ['c1' | 'c2']        turns on cue1 or cue2 and turns off complementary cue
+#   ['rc',ncycles]       run cycle: cycles model for ncycles
+#   ['rs',item]          run settle: cycles model until item activation reaches equilibrium. The cycles it took go
+#                        to the settles of the log (see IA_model.write_log), as for 'rsn'.
+#   ['b',ncycles]        cycles model with 'blank' word for ncycles; turning off c1 and c2 while it does so.
+#   ['d',item1,item2,...itemn}  displays plot of listed items: ignored, there is no display
+#   ['t',comment]        adds a trace rec to a log table with: cycleno, word (act), l1, l2, l1schema, l2schema, comment
+#   ['pt']               prints all trace records in the log file to std output i.e. console
+#   ['wt',file]          writes all trace records to file (default: the log file) in CSV format, or NPZ if file ends in
+#                        .npz (see IA_model.write_log)
+#   ['rsn',e,pool]       run settle network: cycles model until no unit of the network (or of pool, if given) changes
+#                        by more than e (default: IA_model.e)
+#   ['rec',item1,...]    limits the activation traces to the listed units, pools and/or top=K most active words
+#   ['ws',cue,ncycles]   warm start: resets the model and starts it from the state reached by cycling without a word,
+#                        cue (c1, c2 or none) on, for ncycles (until it settles if none given); see BIAModel.warmStart
+#   ['cs',file]          checkpoint save: saves the complete state of the model to file (see BIAModel.saveCheckpoint)
+#   ['cr',file]          checkpoint restore: restores the state saved to file, e.g. to run another target after the
+#                        same prime, or to resume a long run
+#
+# Trials: a reset ('r' or 'ws') restarts the model and clears its trace log, so the stretches of a script between
+# resets are independent trials. run_trials splits a script at its resets and runs the trials on a multiprocessing
+# pool; the trace records of the trials come back in script order. Only the record spec ('rec') outlives a reset, so
+# each trial first applies the last 'rec' before it. The trials of a script that saves checkpoints ('cs') are run one
+# after the other in this process, as its later trials may restore them.
+#
+# Result cache: the trace log of a trial only depends on its records, the record spec, the params, and the network of
+# the model, so the trial runner can keep it in an IA_cache.ResultCache and skip the simulation the next time the
+# same trial comes up, in this run or a later one. Trials that print their trace log ('pt') or save or restore
+# checkpoints always run.
+#
+# Prefix tree: priming scripts repeat the same leading records (e.g. c1 / n,prime / rc,k / b,k) before varying
+# targets. run_trial_tree builds a trie of the trials (TrialNode), runs every shared prefix once, and at each branch
+# point continues every branch from a checkpoint of the state (BIAModel.getCheckpoint) instead of simulating the
+# prefix again. The trace logs are those of run_trials.
+
+
+#   read and load the script: a list of [command, arg1,..] records; blank lines are skipped
+def load_script(file_str):
+    csv_pattern = re.compile(',')
+    script = []
+    with open(file_str) as f:
+        for line in f:
+            line = line.strip()
+            if line != '':
+                script.append(csv_pattern.split(line))
+    return script
+
+
+#   Scripts are compiled once (compile_script) into a list of Instructions and then run by execute. Compiling checks
+#   every record up front: unknown commands, items that are not units of the model, bad cycle counts, tolerances and
+#   cues are errors, so a script with a typo fails before anything has run. Stimuli that are not in the lexicon are
+#   only warnings, as non-words are legitimate stimuli. The arguments are converted once, so execute is a tight loop
+#   of model calls.
+
+# A compiled record: op(model, *args) runs it; lineno and line are the number and fields of the record in the script
+class Instruction:
+    def __init__(self, op, args, lineno, line):
+        self.op = op
+        self.args = args
+        self.lineno = lineno
+        self.line = line
+
+
+def print_trace(model):
+    for rec in model.log.getRows():
+        print rec
+
+
+def restore_checkpoint(model, path):
+    error = model.restoreCheckpoint(path)
+    if error is not None:
+        raise ValueError(error)
+
+
+def warm_start(model, cue, ncycles):
+    model.warmStart(cue, ncycles)
+
+
+#   a cycle count argument as an int (a floating point is accepted, just in case)
+def cycle_count(arg):
+    try:
+        ncycles = int(float(arg))
+    except ValueError:
+        raise ValueError('bad cycle count ' + repr(arg))
+    if ncycles < 0:
+        raise ValueError('negative cycle count ' + repr(arg))
+    return ncycles
+
+
+#   the word, language or schema unit item
+def find_item(model, item):
+    return any(item in pool for pool in (model.words, model.lang, model.schemas))
+
+
+#   Each compile function takes (model, args, warnings), where args are the fields of the record after the command,
+#   and returns (op, op_args), or None when the record does nothing. It raises ValueError for a record that cannot be
+#   run and appends messages for records that can, but may not do what was meant, to warnings.
+
+def compileReset(model, args, warnings):
+    return im.BIAModel.reset, ()
+
+
+def compileNewWord(model, args, warnings):
+    word = args[0].strip().lower()
+    if word == '':
+        raise ValueError('no word given')
+    if len(word) > 5:
+        warnings.append('{0:s} is truncated to {1:s}'.format(repr(word), repr(word[:5])))
+    for letter in word[:5]:
+        if letter not in model.lets:
+            raise ValueError('no letter unit for ' + repr(letter))
+    if word[:5] not in model.words:
+        warnings.append('{0:s} is not in the lexicon'.format(repr(word[:5])))
+    return im.BIAModel.present, (word,)
+
+
+def compileCue1(model, args, warnings):
+    return im.BIAModel.set_cue, ('c1',)
+
+
+def compileCue2(model, args, warnings):
+    return im.BIAModel.set_cue, ('c2',)
+
+
+def compileCycle(model, args, warnings):
+    return im.BIAModel.cycle, (cycle_count(args[0]),)
+
+
+def compileSettle(model, args, warnings):
+    if args[0] == '':
+        return None
+    if not find_item(model, args[0]):
+        raise ValueError('Unknown item ' + repr(args[0]))
+    return im.BIAModel.settleItem, (args[0], im.e)
+
+
+def compileBlankCycle(model, args, warnings):
+    return im.BIAModel.blankCycle, (cycle_count(args[0]),)
+
+
+def compileDisplay(model, args, warnings):
+    return None
+
+
+def compileTrace(model, args, warnings):
+    return im.BIAModel.logTrace, (args[0],)
+
+
+def compilePrintTrace(model, args, warnings):
+    return print_trace, ()
+
+
+def compileSettleNetwork(model, args, warnings):
+    tolerance = im.e
+    pool_name = None
+    if len(args) > 0 and args[0].strip() != '':
+        try:
+            tolerance = float(args[0])
+        except ValueError:
+            raise ValueError('bad tolerance ' + repr(args[0]))
+    if len(args) > 1 and args[1].strip() != '':
+        pool_name = args[1].strip()
+        if pool_name not in model.pool_names:
+            raise ValueError('Unknown pool ' + repr(pool_name))
+    return im.BIAModel.settle, (tolerance, pool_name)
+
+
+def compileRecord(model, args, warnings):
+    for item in args:
+        item = item.strip().lower()
+        if item.startswith('top='):
+            try:
+                int(item[len('top='):])
+            except ValueError:
+                raise ValueError('bad top count ' + repr(item))
+        elif item != '' and item not in tr.traced_pools and not find_item(model, item):
+            warnings.append('{0:s} is not a traced unit or pool'.format(repr(item)))
+    return im.BIAModel.setRecording, (list(args),)
+
+
+def compileSaveCheckpoint(model, args, warnings):
+    return im.BIAModel.saveCheckpoint, (args[0],)
+
+
+def compileRestoreCheckpoint(model, args, warnings):
+    return restore_checkpoint, (args[0],)
+
+
+def compileWarmStart(model, args, warnings):
+    cue = args[0].strip().lower() if len(args) > 0 else ''
+    if cue not in ('c1', 'c2', 'none', ''):
+        raise ValueError('Unknown cue ' + repr(cue))
+    ncycles = None
+    if len(args) > 1 and args[1].strip() != '':
+        ncycles = cycle_count(args[1])
+    return warm_start, (cue if cue in ('c1', 'c2') else None, ncycles)
+
+
+compile_command = {
+    'b':    compileBlankCycle,
+    'c1':   compileCue1,
+    'c2':   compileCue2,
+    'cr':   compileRestoreCheckpoint,
+    'cs':   compileSaveCheckpoint,
+    'd':    compileDisplay,
+    'n':    compileNewWord,
+    'pt':   compilePrintTrace,
+    'r':    compileReset,
+    'rc':   compileCycle,
+    'rec':  compileRecord,
+    'rs':   compileSettle,
+    'rsn':  compileSettleNetwork,
+    't':    compileTrace,
+    'ws':   compileWarmStart,
+}
+
+
+#   Compile script (as read by load_script) for model; 'wt' writes the trace log to its file argument or log_path (all
+#   'wt' are dropped when log_path is None). ops maps commands to compile functions that replace those of
+#   compile_command (e.g. the display of the UI).
+#   Returns (program, errors, warnings): the list of Instructions, and the messages for the records that cannot be run
+#   and those that may not do what was meant. Records are numbered from first.
+def compile_script(model, script, log_path=None, first=1, ops=None):
+    program = []
+    errors = []
+    warnings = []
+    for lineno, line in enumerate(script, first):
+        instr = line[0]
+        record_warnings = []
+        try:
+            if instr == 'wt':
+                compiled = None
+                if log_path is not None:
+                    compiled = im.BIAModel.writeLog, (line[1].strip() if len(line) > 1 and line[1].strip() != '' else
+                                                      log_path,)
+            elif ops is not None and instr in ops:
+                compiled = ops[instr](model, line[1:], record_warnings)
+            elif instr in compile_command:
+                compiled = compile_command[instr](model, line[1:], record_warnings)
+            else:
+                errors.append('record {0:d}: command not found: {1:s}'.format(lineno, repr(instr)))
+                continue
+        except IndexError:
+            errors.append('record {0:d}: {1:s}: missing argument'.format(lineno, ','.join(line)))
+            continue
+        except ValueError as err:
+            errors.append('record {0:d}: {1:s}: {2:s}'.format(lineno, ','.join(line), err.args[0]))
+            continue
+        for message in record_warnings:
+            warnings.append('record {0:d}: {1:s}: {2:s}'.format(lineno, ','.join(line), message))
+        if compiled is not None:
+            program.append(Instruction(compiled[0], compiled[1], lineno, line))
+    return program, errors, warnings
+
+
+#   Run program (see compile_script) on model, calling after(instruction, result) after every instruction if given,
+#   with the value its op returned (e.g. the cycles a settle took). Returns None, or an error message for the first
+#   instruction that failed (the rest of the program is then skipped).
+def execute(model, program, after=None):
+    for instr in program:
+        try:
+            result = instr.op(model, *instr.args)
+        except (ValueError, KeyError, IOError) as err:
+            return 'record {0:d}: {1:s}: {2:s}'.format(instr.lineno, ','.join(instr.line), repr(err))
+        if after is not None:
+            after(instr, result)
+    return None
+
+
+#   Run script (as read by load_script) on model; 'wt' writes the trace log to log_path (skipped when log_path is
+#   None). Nothing runs if the script does not compile. Returns None, or an error message for the first record that
+#   could not be compiled or run. Records are numbered from first.
+def process_script(model, script, log_path, first=1):
+    program, errors, warnings = compile_script(model, script, log_path, first)
+    if len(errors) > 0:
+        return errors[0]
+    return execute(model, program)
+
+
+#   Split a script into trials, each starting with a reset or warm start (but the first, when the script does not start
+#   with one).
+#   Returns [(first, record, trial),..]: trial is the list of records of the trial, first the number of its first
+#   record in the script, and record the items of the last 'rec' record before it (None: trace everything).
+def split_trials(script):
+    trials = []
+    record = None
+    for lineno, line in enumerate(script):
+        if line[0] in ('r', 'ws') or len(trials) == 0:
+            trials.append((lineno + 1, record, []))
+        trials[-1][2].append(line)
+        if line[0] == 'rec':
+            record = line[1:]
+    return trials
+
+
+worker_model = None     # the model of a pool worker process (see run_trials)
+worker_cache = None     # the IA_cache.ResultCache of the trials run by worker_model, if any
+
+
+#   Pool initializer: builds the model of the worker by calling build(*args), unless the worker process was forked
+#   from a parent that set worker_model already
+def init_worker(build, args, cache=None):
+    global worker_model, worker_cache
+    if worker_model is None:
+        worker_model = build(*args)
+    worker_cache = cache
+    return
+
+
+#   Run the trials of run_trials(None, ..) on model in this process
+def set_worker(model, cache=None):
+    global worker_model, worker_cache
+    worker_model = model
+    worker_cache = cache
+    return
+
+
+side_effects = set(['pt', 'cs', 'cr'])    # commands with effects outside the model: never cached nor shared
+
+
+def has_side_effects(records):
+    return len(side_effects.intersection([line[0] for line in records])) > 0
+
+
+cache_version = 5   # of the cached trace logs: results cached by other versions are not read back
+
+
+#   Key of the result of a trial on model (see IA_cache.ResultCache.key)
+def trial_key(model, record, records):
+    return worker_cache.key(records, record, sorted(model.params.items()), model.networkKey(), model.use_engine,
+                            cache_version)
+
+
+#   The trace log cached under key by cache_log, or None
+def cached_log(key):
+    value = worker_cache.get(key)
+    if value is None:
+        return None
+    log = tr.TraceLog()
+    log.restore(*value[:4])
+    log.restoreWordTrace(*value[4:7])
+    log.restoreSettles(value[7])
+    log.restoreTops(value[8])
+    return log
+
+
+def cache_log(key, log):
+    labels, inputs, cycles, acts = log.getData()
+    word_inputs, word_cycles, word_acts = log.getWordTrace()
+    worker_cache.put(key, [labels, inputs, cycles.tolist(), acts.tolist(), word_inputs, word_cycles.tolist(),
+                           word_acts.tolist(), log.getSettles(), log.getTops()])
+    return
+
+
+#   Key of a trial of split_trials in the cache of the worker, or None if it is not to be cached
+def cache_key(trial):
+    first, record, records = trial
+    if worker_cache is None or has_side_effects(records):
+        return None
+    return trial_key(worker_model, record, records)
+
+
+#   Run one trial of split_trials on the model of the worker, from a reset model, unless its result is in the cache
+#   of the worker. Returns (trace log, error).
+def run_trial(trial):
+    first, record, records = trial
+    key = cache_key(trial)
+    if key is not None:
+        log = cached_log(key)
+        if log is not None:
+            return log, None
+    worker_model.setRecording(record)
+    worker_model.reset()
+    error = process_script(worker_model, records, None, first)
+    if key is not None and error is None:
+        cache_log(key, worker_model.log)
+    return worker_model.log, error
+
+
+#   Create the pool that runs trials on copies of model; build(*args) must build the same model for worker processes
+#   that are not forked from this one. cache: the IA_cache.ResultCache of the trials, if any.
+def trial_pool(model, processes, build, args, cache=None):
+    global worker_model, worker_cache
+    worker_model = model
+    worker_cache = cache    # for the scripts whose trials run in this process (see run_trials)
+    return multiprocessing.Pool(processes, init_worker, (build, args, cache))
+
+
+#   Whether script saves checkpoints, which its trials must then run in order for
+def saves_checkpoints(script):
+    return 'cs' in [line[0] for line in script]
+
+
+#   Run the trials of script on pool (see trial_pool), or in this process if pool is None (see set_worker) or the
+#   script saves checkpoints. Returns (logs, error): the trace log of every trial in script order, up to and including
+#   the first trial that failed, and its error message (None if all trials ran).
+def run_trials(pool, script, chunksize=1):
+    if pool is None or saves_checkpoints(script):
+        results = itertools.imap(run_trial, split_trials(script))
+    else:
+        results = pool.imap(run_trial, split_trials(script), chunksize)
+    logs = []
+    for log, error in results:
+        logs.append(log)
+        if error is not None:
+            return logs, error
+    return logs, None
+
+
+# Node of the prefix tree of trials: the records run so far are those on the path from the root. The edges from the
+# root are the record specs of the trials, (None, item1,..), which stand for setRecording and reset; every other edge
+# is a record of a trial, as a tuple.
+class TrialNode:
+    def __init__(self):
+        self.children = []      # [(edge, TrialNode),..] in the order of the trials
+        self.index = {}         # edge -> TrialNode
+        self.ends = []          # trials (indices into split_trials) whose last record leads here
+
+    def getChild(self, edge):
+        if edge not in self.index:
+            self.index[edge] = TrialNode()
+            self.children.append((edge, self.index[edge]))
+        return self.index[edge]
+
+    #   the trials that end in this subtree
+    def getTrials(self):
+        trials = list(self.ends)
+        for edge, child in self.children:
+            trials.extend(child.getTrials())
+        return trials
+
+
+#   Prefix tree of the trials at the given indices into trials (see split_trials)
+def trial_tree(trials, indices):
+    root = TrialNode()
+    for i in indices:
+        first, record, records = trials[i]
+        node = root.getChild((None,) + tuple(record or []))
+        for line in records:
+            node = node.getChild(tuple(line))
+        node.ends.append(i)
+    return root
+
+
+#   Run the edge to a node on model: returns None, or an error message
+def run_edge(model, edge):
+    if edge[0] is None:
+        model.setRecording(list(edge[1:]))
+        model.reset()
+        return None
+    return process_script(model, [list(edge)], None)
+
+
+#   Run the subtrees of node on model, from the state reached at node, and set results[i] to (trace log, None) for
+#   every trial i that ends in them. A trial that fails is left out, to be run on its own: a shared record can fail
+#   for trials that number it differently.
+def run_subtrees(model, node, results):
+    checkpoint = None
+    if len(node.children) > 1:
+        checkpoint = model.getCheckpoint()
+    for n, (edge, child) in enumerate(node.children):
+        if n > 0:
+            model.setCheckpoint(*checkpoint)
+        # follow the path down to the next branch point
+        while True:
+            if run_edge(model, edge) is not None:
+                break
+            for i in child.ends:
+                results[i] = (model.log.copy(), None)
+            if len(child.children) != 1:
+                run_subtrees(model, child, results)
+                break
+            edge, child = child.children[0]
+    return
+
+
+#   Run the trials of script on the model of set_worker, sharing the prefixes they have in common (see Prefix tree).
+#   Trials with side effects outside the model ('pt', 'cs', 'cr') are run on their own. Returns (logs, error) as
+#   run_trials.
+def run_trial_tree(script):
+    trials = split_trials(script)
+    results = [None] * len(trials)
+    shared = []
+    for i, trial in enumerate(trials):
+        key = cache_key(trial)
+        log = cached_log(key) if key is not None else None
+        if log is not None:
+            results[i] = (log, None)
+        elif not has_side_effects(trial[2]):
+            shared.append(i)
+    run_subtrees(worker_model, trial_tree(trials, shared), results)
+    shared = set(shared)
+    logs = []
+    for i, trial in enumerate(trials):
+        if results[i] is None:
+            results[i] = run_trial(trial)
+        elif i in shared:
+            key = cache_key(trial)
+            if key is not None:
+                cache_log(key, results[i][0])
+        log, error = results[i]
+        logs.append(log)
+        if error is not None:
+            return logs, error
+    return logs, None
@@ -0,0 +1,47 @@
+import IA_model as im
+import IA_script as sc
+
+# A script with bad records does not compile and nothing runs; a compiled script runs, passing the result of every
+# record on (a settle: the cycles it took, as in the settles of the log); trials start at the resets
+
+model = im.BIAModel()
+program, errors, warnings = sc.compile_script(model, [['c1'], ['n', 'hello'], ['rc', 'x'], ['rs', 'nosuchword'],
+													  ['zz'], ['n', 'qqqq']])
+print str(len(errors) == 3 and len(warnings) == 1 and model.cycleno == 0)
+
+results = []
+program, errors, warnings = sc.compile_script(model, [['c1'], ['n', 'hello'], ['rc', '5'], ['rs', 'hello'],
+													  ['t', 'end']])
+error = sc.execute(model, program, lambda instr, result: results.append((instr.line[0], result)))
+settles = model.log.getSettles()
+print str(error is None and results[2] == ('rc', 5) and len(settles) == 1)
+print str(results[3] == ('rs', settles[0][2]) and model.cycleno == 5 + settles[0][2])
+
+script = [['c1'], ['n', 'hello'], ['rc', '5'], ['r'], ['n', 'cama'], ['rc', '5'], ['ws', 'c2', '5'], ['rc', '2']]
+print str([first for first, record, trial in sc.split_trials(script)] == [1, 4, 7])
+
+# The trials of a priming script run on the prefix tree log what they log when run one by one, with each shared prefix
+# cycled once
+
+cycles_run = [0]
+cycle = im.BIAModel.cycle
+def counted_cycle(model, ncycles=None, until=None):
+	cycles = cycle(model, ncycles, until)
+	cycles_run[0] += cycles
+	return cycles
+im.BIAModel.cycle = counted_cycle
+
+prime = [['c1'], ['n', 'hello'], ['rc', '20'], ['b', '5']]
+script = []
+for target in ('hola', 'cama', 'gato'):
+	script += [['r']] + prime + [['n', target], ['rc', '10'], ['t', target]]
+results = []
+for run in (lambda: sc.run_trials(None, script), lambda: sc.run_trial_tree(script)):
+	cycles_run[0] = 0
+	sc.set_worker(im.BIAModel())
+	logs, error = run()
+	results.append(([(log.getRows(), log.getWordTrace()[0], log.getWordTrace()[2].tolist()) for log in logs],
+					cycles_run[0], error))
+print str(results[0][2] is None and results[1][2] is None and len(results[0][0]) == 3 and
+		  results[0][0] == results[1][0])
+print str(results[0][1] == 3 * 35 and results[1][1] == 25 + 3 * 10)
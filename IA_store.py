@@ -0,0 +1,165 @@
+import csv, json, time, sqlite3
+
+# IA_store.py: SQLite store of the trials of batch runs
+#
+# A ResultStore keeps the trials run by IA_batch (--db FILE) in one SQLite database, so results can be queried across
+# runs and millions of trials without reloading trace log CSVs. Every batch run adds to the database; nothing in it
+# is ever overwritten. The tables are normalized:
+#   runs(run, started, stimuli, network, engine)         a run of IA_batch: its stimuli file and network (see
+#                                                        BIAModel.networkKey)
+#   param_sets(param_set, key)                           the distinct params of the runs, key is their JSON
+#   param_values(param_set, name, value)                 the params of a set, one row each
+#   trials(trial, run, param_set, script, number, stimulus, language, cue, error)
+#                                                        a trial of a script (see IA_script.split_trials): its number in
+#                                                        the script, the last word it presented and that word's language
+#                                                        in the stimuli file, its last cue (c1, c2 or none), and the
+#                                                        error it failed with, if it did
+#   records(trial, seq, label, input, cycle, duration, word, l1, l2, l1_ldt, l2_ldt)
+#                                                        the trace log of a trial (see IA_model.write_log), in order
+#   settles(trial, seq, item, cycle, cycles, settled)    the settles of a trial ('rs' and 'rsn', see BIAModel.settle), in
+#                                                        order: the item or pool settled ('network' for all of it), the
+#                                                        cycle it ended at, the cycles it ran, and whether it settled
+#                                                        (0: it ran out of cycles)
+#   cycles(trial, cycle, input, word)                    the word trace of a trial (see IA_trace.TraceLog): per cycle
+#                                                        with an input word, that word and the activation of its word
+#                                                        unit
+#   rts(trial, threshold, rt)                            the RT of a trial: the first cycle at which the activation of
+#                                                        its stimulus reached threshold (NULL if it never did), from the
+#                                                        word trace of its log, which has every cycle
+# with indexes on the stimulus, language and param set of the trials, on param name and value and on the cycle number
+# of the word trace rows (besides their trial and cycle key), e.g.
+#   SELECT t.stimulus, t.cue, r.rt FROM trials t JOIN rts r USING (trial) JOIN param_values p USING (param_set)
+#   WHERE t.language = 'spanish' AND p.name = 'alpha' AND p.value = 0.1
+# The trials of a script are added in one transaction; concurrent runs wait for each other's (up to timeout seconds).
+
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run INTEGER PRIMARY KEY, started TEXT, stimuli TEXT, network TEXT, engine INTEGER);
+CREATE TABLE IF NOT EXISTS param_sets (
+    param_set INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS param_values (
+    param_set INTEGER NOT NULL REFERENCES param_sets, name TEXT NOT NULL, value REAL, PRIMARY KEY (param_set, name));
+CREATE TABLE IF NOT EXISTS trials (
+    trial INTEGER PRIMARY KEY, run INTEGER NOT NULL REFERENCES runs, param_set INTEGER NOT NULL REFERENCES param_sets,
+    script TEXT, number INTEGER, stimulus TEXT, language TEXT, cue TEXT, error TEXT);
+CREATE TABLE IF NOT EXISTS records (
+    trial INTEGER NOT NULL REFERENCES trials, seq INTEGER NOT NULL, label TEXT, input TEXT, cycle INTEGER,
+    duration INTEGER, word REAL, l1 REAL, l2 REAL, l1_ldt REAL, l2_ldt REAL, PRIMARY KEY (trial, seq));
+CREATE TABLE IF NOT EXISTS settles (
+    trial INTEGER NOT NULL REFERENCES trials, seq INTEGER NOT NULL, item TEXT, cycle INTEGER, cycles INTEGER,
+    settled INTEGER, PRIMARY KEY (trial, seq));
+CREATE TABLE IF NOT EXISTS cycles (
+    trial INTEGER NOT NULL REFERENCES trials, cycle INTEGER NOT NULL, input TEXT, word REAL,
+    PRIMARY KEY (trial, cycle));
+CREATE TABLE IF NOT EXISTS rts (
+    trial INTEGER NOT NULL REFERENCES trials, threshold REAL NOT NULL, rt INTEGER, PRIMARY KEY (trial, threshold));
+CREATE INDEX IF NOT EXISTS trials_stimulus ON trials (stimulus);
+CREATE INDEX IF NOT EXISTS trials_language ON trials (language);
+CREATE INDEX IF NOT EXISTS trials_param_set ON trials (param_set);
+CREATE INDEX IF NOT EXISTS trials_run ON trials (run);
+CREATE INDEX IF NOT EXISTS param_values_value ON param_values (name, value);
+CREATE INDEX IF NOT EXISTS cycles_cycle ON cycles (cycle);
+'''
+
+
+#   word -> language of the stimuli in a stimuli file (see IA_lexicon.load_stimuli); {} for None
+def stimulus_languages(stimuli_file):
+    languages = {}
+    if stimuli_file is None:
+        return languages
+    with open(stimuli_file, 'rb') as f:
+        for row in csv.reader(f):
+            if len(row) > 1:
+                languages.setdefault(row[0].strip().lower()[:5], row[1].strip().lower())
+    return languages
+
+
+#   (stimulus, cue) of the records of a trial: the last word presented ('n') and the last cue turned on ('c1', 'c2',
+#   or the cue of a warm start); None and 'none' if there are none
+def trial_conditions(records):
+    stimulus = None
+    cue = 'none'
+    for line in records:
+        if line[0] == 'n' and len(line) > 1:
+            stimulus = line[1].strip().lower()[:5]
+        elif line[0] in ('c1', 'c2'):
+            cue = line[0]
+        elif line[0] == 'ws':
+            cue = line[1].strip().lower() if len(line) > 1 and line[1].strip().lower() in ('c1', 'c2') else 'none'
+    return stimulus, cue
+
+
+#   The RT of a trace log (an IA_trace.TraceLog) for stimulus: the first cycle of its word trace at which stimulus was
+#   the input word with an activation of at least threshold, or None
+def log_rt(log, stimulus, threshold):
+    inputs, cycles, acts = log.getWordTrace()
+    for input_word, cycleno, word_act in zip(inputs, cycles.tolist(), acts.tolist()):
+        if input_word == stimulus and word_act >= threshold:
+            return cycleno
+    return None
+
+
+class ResultStore:
+    def __init__(self, path, timeout=60.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout)
+        self.connection.text_factory = str
+        self.connection.executescript(schema)
+        self.languages = {}
+
+    #   Start a run of stimuli_file on a model with the network of key network (see BIAModel.networkKey). Returns the
+    #   run id.
+    def newRun(self, stimuli_file, network, use_engine):
+        self.languages = stimulus_languages(stimuli_file)
+        with self.connection:
+            cursor = self.connection.execute('INSERT INTO runs (started, stimuli, network, engine) VALUES (?, ?, ?, ?)',
+                                             (time.strftime('%Y-%m-%d %H:%M:%S'), stimuli_file, network,
+                                              int(use_engine)))
+        return cursor.lastrowid
+
+    #   The id of the param set of params, added if it is new
+    def getParamSet(self, params):
+        key = json.dumps(sorted(params.items()))
+        with self.connection:
+            row = self.connection.execute('SELECT param_set FROM param_sets WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                return row[0]
+            param_set = self.connection.execute('INSERT INTO param_sets (key) VALUES (?)', (key,)).lastrowid
+            self.connection.executemany('INSERT INTO param_values VALUES (?, ?, ?)',
+                                        [(param_set, name, float(value)) for name, value in sorted(params.items())])
+        return param_set
+
+    #   Add the trials of a script to run: trials as split_trials, logs the trace logs of the trials that ran (see
+    #   IA_script.run_trials), error the error message of the last of them, if it failed. Each trial gets an RT
+    #   at every threshold in thresholds.
+    def addTrials(self, run, param_set, script_file, trials, logs, error=None, thresholds=(0.5,)):
+        with self.connection:
+            for number, ((first, record, records), log) in enumerate(zip(trials, logs), 1):
+                stimulus, cue = trial_conditions(records)
+                trial_error = error if number == len(logs) else None
+                trial = self.connection.execute('INSERT INTO trials (run, param_set, script, number, stimulus, '
+                                                'language, cue, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                                (run, param_set, script_file, number, stimulus,
+                                                 self.languages.get(stimulus), cue, trial_error)).lastrowid
+                labels, inputs, cycles, acts = log.getData()
+                self.connection.executemany('INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                            [(trial, seq, label, input_word, cycleno, duration) + tuple(row)
+                                             for seq, (label, input_word, cycleno, duration, row) in
+                                             enumerate(zip(labels, inputs, cycles.tolist(),
+                                                           log.getDurations().tolist(), acts.tolist()))])
+                self.connection.executemany('INSERT INTO settles VALUES (?, ?, ?, ?, ?, ?)',
+                                            [(trial, seq, item, cycleno, cycles, int(settled))
+                                             for seq, (item, cycleno, cycles, settled) in
+                                             enumerate(log.getSettles())])
+                word_inputs, word_cycles, word_acts = log.getWordTrace()
+                self.connection.executemany('INSERT INTO cycles VALUES (?, ?, ?, ?)',
+                                            [(trial, cycleno, input_word, act) for input_word, cycleno, act in
+                                             zip(word_inputs, word_cycles.tolist(), word_acts.tolist())])
+                self.connection.executemany('INSERT INTO rts VALUES (?, ?, ?)',
+                                            [(trial, threshold, log_rt(log, stimulus, threshold))
+                                             for threshold in thresholds])
+        return
+
+    def close(self):
+        self.connection.close()
+        return
@@ -0,0 +1,36 @@
+import os, shutil, tempfile
+import IA_batch as bt
+import IA_model as im
+import IA_store as st
+
+# The trials of a batch run go into the store with their conditions, settles, per-cycle word activations and RTs; an
+# RT is the first cycle at which the activation of the stimulus reached the threshold
+
+work = tempfile.mkdtemp()
+script_file = os.path.join(work, 'trials.txt')
+with open(script_file, 'w') as f:
+	f.write('c1\nn,hello\nrc,30\nt,hello\nr\nc2\nn,cama\nrs,cama\nt,cama\n')
+store = st.ResultStore(os.path.join(work, 'trials.db'))
+bt.run_batch([script_file], os.path.join(work, 'logs'), store=store, rt_thresholds=(0.5, 0.3, 0.5))
+trials = store.connection.execute('SELECT stimulus, cue, error FROM trials ORDER BY number').fetchall()
+print str(trials == [('hello', 'c1', None), ('cama', 'c2', None)])
+settles = store.connection.execute('SELECT item, settled FROM settles').fetchall()
+print str(settles == [('cama', 1)])
+
+model = im.BIAModel()
+model.set_cue('c1')
+model.present('hello')
+rt = None
+while rt is None and model.cycleno < 30:
+	model.cycle(1)
+	if model.getActivations()[0] >= 0.5:
+		rt = model.cycleno
+rts = store.connection.execute('SELECT r.threshold, r.rt FROM rts r JOIN trials t USING (trial) '
+							   'WHERE t.number = 1 ORDER BY r.threshold').fetchall()
+print str(len(rts) == 2 and rts[1] == (0.5, rt) and rt is not None and rts[0][1] <= rt)
+cycles = store.connection.execute('SELECT c.cycle, c.input, c.word FROM cycles c JOIN trials t USING (trial) '
+								  'WHERE t.number = 1 ORDER BY c.cycle').fetchall()
+print str([row[0] for row in cycles] == range(1, 31) and all(row[1] == 'hello' for row in cycles))
+print str(cycles[rt - 1][2] >= 0.5 and cycles[rt - 2][2] < 0.5)
+store.close()
+shutil.rmtree(work)
@@ -0,0 +1,303 @@
+#!/usr/bin/python
+import os, sys, csv, re, argparse, itertools
+import multiprocessing
+import numpy as np
+import IA_pools
+import IA_model as im
+import IA_batch as bt
+
+# IA_sweep.py: Parameter sweeps of the BIA/BIAPlus Model
+#
+# Runs a set of stimuli under every point of a parameter space, e.g.
+#   python IA_sweep.py words.csv -o sweep.csv -s lexicon_1300.csv -g alpha=0.05,0.1,0.2 -g scale=0,0.1 -j 4
+#   python IA_sweep.py words.csv -o sweep.csv -s lexicon_1300.csv -r decay=0.05:0.2 -r gamma=0.05:0.2 --lhs 50
+# The points are the grid (-g: every combination of the listed values) crossed with the samples (-r ranges, drawn
+# --random or Latin hypercube --lhs, reproducibly from --seed); any parameter of IA_model.default_params but ncycles
+# can be swept. Every point runs all the stimuli from a reset model for ncycles through the compiled engine (see
+# BIAModel.runBatch) on a pool of worker processes. Sweeping rest rebuilds the lexicon, as rest is the resting level
+# given to auto-loaded words, so it needs the stimuli file (-s) of those words.
+#
+# The result is one tidy CSV table with a row per point and stimulus: the point number, the swept parameters, the
+# stimulus and its cue, the RT (the first cycle at which the activation of the stimulus's word unit reached the
+# threshold; empty if it never did) and the final activations (the Word to L2 LDT columns of the trace log). The rows
+# of a point are written as soon as it has run, so a sweep that is run again with the same arguments only runs the
+# points missing from its table.
+
+__author__ = 'Andy Valenti'
+__copyright__ = "Copyright 2016. Tufts University"
+
+
+#   Read the stimuli of a sweep from a CSV file of word(,cue) lines; cue is c1, c2 or none (default: cue).
+#   Returns ([word,..], [cue,..]). Raises ValueError for an unknown cue, or listing the words with a letter that has
+#   no letter unit in lets at its position.
+def load_words(file_str, cue=None, lets=IA_pools.lets):
+    csv_pattern = re.compile(',')
+    words = []
+    cues = []
+    bad_words = []
+    with open(file_str) as f:
+        for line in f:
+            line = line.strip()
+            if line == '':
+                continue
+            split = csv_pattern.split(line)
+            word_cue = cue
+            if len(split) > 1 and split[1].strip() != '':
+                word_cue = split[1].strip().lower()
+            if word_cue == 'none':
+                word_cue = None
+            if word_cue not in (None, 'c1', 'c2'):
+                raise ValueError('Unknown cue ' + repr(word_cue) + ' for ' + repr(split[0]))
+            word = split[0].strip().lower()
+            if word == '' or not all(let in lets and pos < len(lets[let]) for pos, let in enumerate(word)):
+                bad_words.append(word)
+            words.append(word)
+            cues.append(word_cue)
+    if len(bad_words) > 0:
+        raise ValueError('No letter units for ' + ', '.join(repr(word) for word in bad_words))
+    return words, cues
+
+
+#   Every combination of the values of grid, a list of (name, [value,..]): [{name: value,..},..]
+def grid_points(grid):
+    names = [name for name, values in grid]
+    return [dict(zip(names, values)) for values in itertools.product(*[values for name, values in grid])]
+
+
+#   n points drawn uniformly from ranges, a list of (name, (low, high))
+def random_points(ranges, n, rng):
+    points = [{} for i in range(n)]
+    for name, (low, high) in ranges:
+        for point, value in zip(points, rng.uniform(low, high, n)):
+            point[name] = float(value)
+    return points
+
+
+#   n points of a Latin hypercube over ranges: every range is cut into n strata and each stratum is sampled once
+def lhs_points(ranges, n, rng):
+    points = [{} for i in range(n)]
+    for name, (low, high) in ranges:
+        strata = (rng.permutation(n) + rng.uniform(0.0, 1.0, n)) / n
+        for point, value in zip(points, low + strata * (high - low)):
+            point[name] = float(value)
+    return points
+
+
+#   The points of a sweep: the grid points crossed with samples points (method 'random' or 'lhs') of ranges
+def sweep_points(grid, ranges, samples=0, method='lhs', seed=0):
+    rng = np.random.RandomState(seed)
+    sampled = [{}]
+    if samples > 0 and len(ranges) > 0:
+        if method == 'random':
+            sampled = random_points(ranges, samples, rng)
+        else:
+            sampled = lhs_points(ranges, samples, rng)
+    points = []
+    for grid_point in grid_points(grid):
+        for sample in sampled:
+            point = dict(grid_point)
+            point.update(sample)
+            points.append(point)
+    return points
+
+
+def sweep_header(names):
+    return ['Point'] + names + ['Input', 'Cue', 'RT'] + im.log_header[2:7]
+
+
+#   RT of every stimulus of a runBatch word_act (stimuli x cycles): the first cycle at which the activation of its
+#   word unit reached threshold, 0 if it never did
+def threshold_cycles(word_act, threshold):
+    crossed = word_act >= threshold
+    return np.where(np.any(crossed, axis=1), np.argmax(crossed, axis=1) + 1, 0)
+
+
+#   Table rows of one point, the runBatch result of its stimuli: RT to threshold and final activations
+def point_rows(index, values, result, threshold):
+    rts = threshold_cycles(result.word_act, threshold)
+    final = [result.word_act[:, -1], result.getTrace('lang', 'english')[:, -1],
+             result.getTrace('lang', 'spanish')[:, -1], result.getTrace('schemas', 'l1')[:, -1],
+             result.getTrace('schemas', 'l2')[:, -1]]
+    rows = []
+    for b, (stim, cue) in enumerate(zip(result.stimuli, result.cues)):
+        rt = rts[b] if rts[b] > 0 else ''
+        rows.append([index] + values + [stim, cue if cue is not None else 'none', rt] +
+                    [repr(float(act[b])) for act in final])
+    return rows
+
+
+worker_sweep = None     # the sweep run by a worker process (see init_worker)
+worker_models = {}      # resting level of the auto-loaded words -> model of the worker
+
+
+#   Pool initializer. sweep holds the stimuli, cues, ncycles, threshold and the build(*args) function and arguments
+#   of the models (args[-1] are the fixed params, see new_model).
+def init_worker(sweep):
+    global worker_sweep
+    worker_sweep = sweep
+    return
+
+
+#   Model of the worker for the resting level of a point: models are built once per worker and rest
+def get_model(point):
+    build, args = worker_sweep['build'], worker_sweep['args']
+    params = dict(args[-1])
+    if 'rest' in point:
+        params['rest'] = point['rest']
+    rest = params.get('rest', im.rest)
+    if rest not in worker_models:
+        worker_models[rest] = build(*(args[:-1] + (params,)))
+    return worker_models[rest]
+
+
+#   Run the stimuli of the sweep at one point; returns (index, rows) or (index, None) if the model did not build
+def run_point(indexed_point):
+    index, point, values = indexed_point
+    model = get_model(point)
+    if model is None:
+        return index, None
+    model.params.update(point)
+    result = model.runBatch(worker_sweep['words'], worker_sweep['cues'], worker_sweep['ncycles'])
+    return index, point_rows(index, values, result, worker_sweep['threshold'])
+
+
+#   Rows of a table written by an earlier run of the sweep, for the points that were completed: {point: rows}.
+#   Returns None if the table is of a different sweep.
+def completed_points(path, header, points, num_words):
+    rows = {}
+    with open(path, 'rb') as csvfile:
+        reader = csv.reader(csvfile)
+        if next(reader, None) != header:
+            return None
+        for row in reader:
+            if len(row) == len(header):
+                rows.setdefault(int(row[0]), []).append(row)
+    names = header[1:-8]
+    for index, done in rows.items():
+        if index >= len(points) or done[0][1:len(names) + 1] != [repr(points[index][name]) for name in names]:
+            return None
+    return dict((index, done) for index, done in rows.items() if len(done) == num_words)
+
+
+#   Run the sweep over points and write its table to path, keeping the points already in it. Returns the number of
+#   points that failed (all of them, with nothing run, if rest is swept without the stimuli it is the resting level of).
+def run_sweep(points, words, cues, path, stimuli=None, cache_dir=None, params=None, ncycles=100, threshold=0.5,
+              jobs=1):
+    names = sorted(points[0]) if len(points) > 0 else []
+    if 'rest' in names and stimuli is None:
+        print >> sys.stderr, 'Error: sweeping rest needs the stimuli file (-s) of the words it is the resting level of'
+        return len(points)
+    header = sweep_header(names)
+    done = {}
+    if os.path.isfile(path):
+        done = completed_points(path, header, points, len(words))
+        if done is None:
+            print >> sys.stderr, 'Error: ' + path + ' holds the results of a different sweep'
+            return len(points)
+    # rewrite the completed points only: the rows of a point that was cut short are run again
+    partial = path + '.' + repr(os.getpid())
+    with open(partial, 'wb') as csvfile:
+        logwriter = csv.writer(csvfile)
+        logwriter.writerow(header)
+        for index in sorted(done):
+            logwriter.writerows(done[index])
+    os.rename(partial, path)
+
+    pending = [(index, point, [repr(point[name]) for name in names]) for index, point in enumerate(points)
+               if index not in done]
+    print '{0:d} points, {1:d} done, {2:d} to run'.format(len(points), len(done), len(pending))
+    sweep = {'words': words, 'cues': cues, 'ncycles': ncycles, 'threshold': threshold, 'build': bt.new_model,
+             'args': (stimuli, True, cache_dir, dict(params or {}))}
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs, init_worker, (sweep,))
+        results = pool.imap_unordered(run_point, pending)
+    else:
+        init_worker(sweep)
+        results = itertools.imap(run_point, pending)
+    failed = 0
+    with open(path, 'ab') as csvfile:
+        logwriter = csv.writer(csvfile)
+        for i, (index, rows) in enumerate(results):
+            if rows is None:
+                failed += 1
+                print >> sys.stderr, 'point {0:d}: the model did not build'.format(index)
+                continue
+            logwriter.writerows(rows)
+            csvfile.flush()
+            print '[{0:d}/{1:d}] point {2:d}'.format(i + 1, len(pending), index)
+    if pool is not None:
+        pool.close()
+        pool.join()
+    return failed
+
+
+#   Name of a parameter that can be swept
+def sweep_name(name):
+    if name not in im.default_params or name == 'ncycles':
+        raise argparse.ArgumentTypeError('expected one of {0:s}'.format(
+            sorted(set(im.default_params) - set(['ncycles']))))
+    return name
+
+
+#   'name=v1,v2,..' -> (name, [float values]) for a grid parameter
+def grid_arg(text):
+    name, sep, values = text.partition('=')
+    if sep == '':
+        raise argparse.ArgumentTypeError('expected name=value1,value2,..')
+    return sweep_name(name), [float(value) for value in values.split(',')]
+
+
+#   'name=low:high' -> (name, (low, high)) for a sampled parameter
+def range_arg(text):
+    name, sep, values = text.partition('=')
+    low, sep2, high = values.partition(':')
+    if sep == '' or sep2 == '':
+        raise argparse.ArgumentTypeError('expected name=low:high')
+    return sweep_name(name), (float(low), float(high))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Sweep BIA model parameters over a set of stimuli.')
+    parser.add_argument('words', help='stimuli to run: CSV file of word(,cue) lines')
+    parser.add_argument('-o', '--output', required=True, help='CSV file of the result table (resumed if it exists)')
+    parser.add_argument('-s', '--stimuli', help='stimuli file to auto-load into the lexicon')
+    parser.add_argument('--cache-dir', default=None, help='network cache directory')
+    parser.add_argument('-p', '--param', action='append', type=bt.param_arg, default=[], metavar='NAME=VALUE',
+                        help='set a model parameter for the whole sweep (repeatable)')
+    parser.add_argument('-g', '--grid', action='append', type=grid_arg, default=[], metavar='NAME=V1,V2,..',
+                        help='sweep a parameter over the listed values (repeatable)')
+    parser.add_argument('-r', '--range', action='append', type=range_arg, default=[], metavar='NAME=LOW:HIGH',
+                        help='sample a parameter from a range (repeatable)')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--lhs', type=int, default=0, metavar='N', help='draw N Latin hypercube samples of the ranges')
+    group.add_argument('--random', type=int, default=0, metavar='N', help='draw N random samples of the ranges')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the samples')
+    parser.add_argument('--cue', choices=['c1', 'c2', 'none'], default='none', help='cue of the words without one')
+    parser.add_argument('-n', '--ncycles', type=int, default=100, help='number of cycles to run each stimulus')
+    parser.add_argument('-t', '--threshold', type=float, default=0.5, help='word activation that counts as the RT')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    if len(args.range) > 0 and args.lhs == 0 and args.random == 0:
+        print >> sys.stderr, 'Error: sampled ranges need --lhs N or --random N'
+        sys.exit(1)
+    names = [name for name, values in args.grid] + [name for name, values in args.range]
+    if len(set(names)) < len(names):
+        print >> sys.stderr, 'Error: a parameter is swept more than once'
+        sys.exit(1)
+    try:
+        words, cues = load_words(args.words, None if args.cue == 'none' else args.cue)
+    except (IOError, ValueError) as err:
+        print >> sys.stderr, 'Error: ' + str(err)
+        sys.exit(1)
+    if args.random > 0:
+        points = sweep_points(args.grid, args.range, args.random, 'random', args.seed)
+    else:
+        points = sweep_points(args.grid, args.range, args.lhs, 'lhs', args.seed)
+    failed = run_sweep(points, words, cues, args.output, args.stimuli, args.cache_dir, dict(args.param), args.ncycles,
+                       args.threshold, args.jobs)
+    sys.exit(1 if failed > 0 else 0)
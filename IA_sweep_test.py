@@ -0,0 +1,40 @@
+import os, shutil, tempfile
+import IA_sweep as sw
+
+# A sweep run again only runs the points missing from its table (the points cut short included) and ends with the
+# same table; the table of a different sweep is not touched
+
+work = tempfile.mkdtemp()
+path = os.path.join(work, 'sweep.csv')
+points = sw.sweep_points([('alpha', [0.05, 0.1]), ('scale', [0.0, 0.1])], [])
+words, cues = ['hello', 'cama'], ['c1', 'c2']
+print str(sw.run_sweep(points, words, cues, path, ncycles=10) == 0)
+with open(path, 'rb') as f:
+	table = f.read()
+with open(path, 'wb') as f:
+	f.write(''.join(table.splitlines(True)[:-3]))
+print str(sw.run_sweep(points, words, cues, path, ncycles=10) == 0)
+with open(path, 'rb') as f:
+	print str(f.read() == table)
+print str(sw.run_sweep(sw.sweep_points([('gamma', [0.1])], []), words, cues, path, ncycles=10) == 1)
+with open(path, 'rb') as f:
+	print str(f.read() == table)
+
+# Sweeping rest without the stimuli it is the resting level of runs nothing; words with a letter that has no letter
+# unit are all reported when the words are read
+
+rest_path = os.path.join(work, 'rest.csv')
+print str(sw.run_sweep(sw.sweep_points([('rest', [-0.1, -0.2])], []), words, cues, rest_path, ncycles=10) == 2)
+print str(not os.path.exists(rest_path))
+words_path = os.path.join(work, 'words.csv')
+with open(words_path, 'w') as f:
+	f.write('hello,c1\nca1a\ncama,c2\nhellos\n')
+try:
+	sw.load_words(words_path)
+	print str(False)
+except ValueError as err:
+	print str(str(err) == "No letter units for 'ca1a', 'hellos'")
+with open(words_path, 'w') as f:
+	f.write('hello,c1\ncama\n')
+print str(sw.load_words(words_path, 'c2') == (['hello', 'cama'], ['c1', 'c2']))
+shutil.rmtree(work)
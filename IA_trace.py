@@ -0,0 +1,328 @@
+import os
+import numpy as np
+
+# IA_trace.py: Activation trace storage for the BIA/BIAPlus Models
+#
+# A TraceStore keeps the activation history of one pool as a growable (cycles x units) float array with a fixed unit
+# order (the readActivations order), instead of a list of freshly sorted [[name+'0', activation],..] lists per cycle.
+# The array doubles its capacity when full, so appending a cycle is amortized O(units).
+#
+# A SpillTraceStore instead keeps only a fixed window of cycles in memory and streams the rest to a flat float64 file
+# on disk (cycles x units, row-major). Reads page through a read-only np.memmap of that file, so memory stays flat no
+# matter how many cycles are recorded.
+#
+# A RecordSpec limits what is traced to named units, whole pools, and/or the top-K word units by activation (kept in a
+# TopKTrace), so that recording cost and memory follow what a script actually analyses.
+#
+# A TraceLog holds the trace records of the 't' command (see BIAModel.logTrace) in typed columns: the labels and input
+# words as lists, the cycle numbers as an int array and the activations (word, L1, L2, L1 LDT, L2 LDT) as a (records x
+# 5) float array, growing like a TraceStore. IA_model.write_log writes them in bulk.
+
+
+class TraceStore:
+    def __init__(self, keys, capacity=64):
+        self.keys = list(keys)          # unit names (without the position suffix) in column order
+        self.columns = dict((key, col) for col, key in enumerate(self.keys))
+        self.data = np.zeros((capacity, len(self.keys)))
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def getNumUnits(self):
+        return len(self.keys)
+
+    def getKeys(self):
+        return self.keys
+
+    #   column of a unit name, or None if the unit is not traced
+    def index(self, key):
+        return self.columns.get(key)
+
+    #   record one cycle: row holds one activation per unit, in column order
+    def append(self, row):
+        if self.length == self.data.shape[0]:
+            grown = np.zeros((2 * self.data.shape[0], len(self.keys)))
+            grown[:self.length] = self.data[:self.length]
+            self.data = grown
+        self.data[self.length] = row
+        self.length += 1
+        return
+
+    #   (cycles x units) view of the recorded activations
+    def getData(self):
+        return self.data[:self.length]
+
+    #   activation of one unit across the recorded cycles
+    def getColumn(self, col):
+        return self.data[:self.length, col]
+
+    #   activations of the last recorded cycle
+    def getLast(self):
+        return self.data[self.length - 1]
+
+    def close(self):
+        return
+
+
+class SpillTraceStore(TraceStore):
+    def __init__(self, keys, path, window=1000):
+        if window < 1:
+            raise ValueError('trace window must be at least one cycle, not ' + repr(window))
+        TraceStore.__init__(self, keys, capacity=window)
+        self.path = path
+        self.window = window
+        self.spilled = 0                # cycles already written to the file
+        self.file = open(path, 'wb')
+
+    def append(self, row):
+        if self.length - self.spilled == self.window:
+            self.flush()
+        self.data[self.length - self.spilled] = row
+        self.length += 1
+        return
+
+    #   write the cycles held in memory to the file
+    def flush(self):
+        pending = self.length - self.spilled
+        if pending > 0:
+            self.file.write(self.data[:pending].tobytes())
+            self.file.flush()
+            self.spilled = self.length
+        return
+
+    #   (cycles x units) read-only memory map of the recorded activations
+    def getData(self):
+        self.flush()
+        if self.length == 0 or len(self.keys) == 0:
+            return np.zeros((self.length, len(self.keys)))
+        return np.memmap(self.path, dtype=np.float64, mode='r', shape=(self.length, len(self.keys)))
+
+    def getColumn(self, col):
+        return self.getData()[:, col]
+
+    def getLast(self):
+        if self.length > self.spilled:
+            return self.data[self.length - self.spilled - 1]
+        return np.array(self.getData()[-1])
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        return
+
+
+# Per cycle, the k units with the highest activation: their columns (in keys) and activations, highest first.
+class TopKTrace:
+    def __init__(self, keys, k, capacity=64):
+        self.keys = list(keys)
+        self.k = min(k, len(self.keys))
+        self.columns = np.zeros((capacity, self.k), dtype=np.int64)
+        self.values = np.zeros((capacity, self.k))
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, row):
+        row = np.asarray(row, dtype=np.float64)
+        if self.length == self.values.shape[0]:
+            self.columns = np.concatenate((self.columns, np.zeros(self.columns.shape, dtype=np.int64)))
+            self.values = np.concatenate((self.values, np.zeros(self.values.shape)))
+        top = np.argpartition(-row, self.k - 1)[:self.k] if 0 < self.k < len(row) else np.arange(self.k)
+        top = top[np.argsort(-row[top], kind='mergesort')]
+        self.columns[self.length] = top
+        self.values[self.length] = row[top]
+        self.length += 1
+        return
+
+    #   (cycles x k) columns and activations of the recorded cycles
+    def getData(self):
+        return self.columns[:self.length], self.values[:self.length]
+
+    #   replace the recorded cycles with those of getData
+    def restore(self, columns, values):
+        self.length = len(values)
+        self.columns = np.zeros((max(64, self.length), self.k), dtype=np.int64)
+        self.values = np.zeros((max(64, self.length), self.k))
+        self.columns[:self.length] = columns
+        self.values[:self.length] = values
+        return
+
+    #   [[key, activation],..] of the top k units at a cycle (default: the last one)
+    def getTop(self, cycle=-1):
+        if cycle < 0:
+            cycle += self.length
+        return [[self.keys[col], value] for col, value in zip(self.columns[cycle], self.values[cycle])]
+
+    #   (keys, (cycles x units) activations) of the units that were ever in the top k, in keys order; NaN in the cycles
+    #   a unit was not in the top k
+    def getSeries(self):
+        columns, values = self.getData()
+        ever = np.unique(columns)
+        series = np.full((self.length, len(ever)), np.nan)
+        series[np.arange(self.length)[:, np.newaxis], np.searchsorted(ever, columns)] = values
+        return [self.keys[col] for col in ever], series
+
+
+log_acts = 5    # activations per trace log record: word, L1, L2, L1 LDT, L2 LDT (see BIAModel.getActivations)
+
+
+# The trace log: per record a label, input word, cycle number and the log_acts activations. Also holds the word
+# trace: per cycle with an input word, that word (or BLANK), the cycle number and the activation of the word (see
+# BIAModel.cycle), from which RTs are taken; the settles: per settle, [item, cycle number, cycles run, settled]
+# (see BIAModel.settle); and the tops: per word of the top K at a record, [record (from 1), rank (from 1), word,
+# activation] (see BIAModel.logTrace).
+class TraceLog:
+    def __init__(self, capacity=64):
+        self.labels = []
+        self.inputs = []
+        self.cycles = np.zeros(capacity, dtype=np.int64)
+        self.acts = np.zeros((capacity, log_acts))
+        self.length = 0
+        self.word_inputs = []
+        self.word_cycles = np.zeros(capacity, dtype=np.int64)
+        self.word_acts = np.zeros(capacity)
+        self.settles = []
+        self.tops = []
+
+    def __len__(self):
+        return self.length
+
+    def append(self, label, input_word, cycleno, acts):
+        if self.length == len(self.cycles):
+            self.cycles = np.concatenate((self.cycles, np.zeros(self.cycles.shape, dtype=np.int64)))
+            self.acts = np.concatenate((self.acts, np.zeros(self.acts.shape)))
+        self.labels.append(label)
+        self.inputs.append(input_word)
+        self.cycles[self.length] = cycleno
+        self.acts[self.length] = acts
+        self.length += 1
+        return
+
+    #   labels, input words, cycle numbers and (records x log_acts) activations of the records
+    def getData(self):
+        return self.labels, self.inputs, self.cycles[:self.length], self.acts[:self.length]
+
+    #   replace the records with those of getData (or the same as lists)
+    def restore(self, labels, inputs, cycles, acts):
+        self.length = len(labels)
+        self.labels = list(labels)
+        self.inputs = list(inputs)
+        self.cycles = np.zeros(max(64, self.length), dtype=np.int64)
+        self.acts = np.zeros((max(64, self.length), log_acts))
+        self.cycles[:self.length] = cycles
+        self.acts[:self.length] = np.reshape(acts, (self.length, log_acts))
+        return
+
+    def appendWord(self, input_word, cycleno, act):
+        length = len(self.word_inputs)
+        if length == len(self.word_cycles):
+            self.word_cycles = np.concatenate((self.word_cycles, np.zeros(length, dtype=np.int64)))
+            self.word_acts = np.concatenate((self.word_acts, np.zeros(length)))
+        self.word_inputs.append(input_word)
+        self.word_cycles[length] = cycleno
+        self.word_acts[length] = act
+        return
+
+    #   input words, cycle numbers and activations of the word trace
+    def getWordTrace(self):
+        length = len(self.word_inputs)
+        return self.word_inputs, self.word_cycles[:length], self.word_acts[:length]
+
+    #   replace the word trace with that of getWordTrace (or the same as lists)
+    def restoreWordTrace(self, inputs, cycles, acts):
+        self.word_inputs = list(inputs)
+        self.word_cycles = np.zeros(max(64, len(inputs)), dtype=np.int64)
+        self.word_acts = np.zeros(max(64, len(inputs)))
+        self.word_cycles[:len(inputs)] = cycles
+        self.word_acts[:len(inputs)] = acts
+        return
+
+    def appendSettle(self, item, cycleno, cycles, settled):
+        self.settles.append([item, cycleno, cycles, settled])
+        return
+
+    def getSettles(self):
+        return self.settles
+
+    def restoreSettles(self, settles):
+        self.settles = [list(settle) for settle in settles]
+        return
+
+    #   add the top K words ([[word, activation],..], see TopKTrace.getTop) at the last record
+    def appendTops(self, top):
+        self.tops.extend([self.length, rank, word, value] for rank, (word, value) in enumerate(top, 1))
+        return
+
+    def getTops(self):
+        return self.tops
+
+    def restoreTops(self, tops):
+        self.tops = [list(top) for top in tops]
+        return
+
+    def copy(self):
+        log = TraceLog()
+        log.restore(*self.getData())
+        log.restoreWordTrace(*self.getWordTrace())
+        log.restoreSettles(self.getSettles())
+        log.restoreTops(self.getTops())
+        return log
+
+    #   the event duration of every record: the cycles since the previous record (the cycle count restarts with
+    #   every log)
+    def getDurations(self):
+        return np.diff(np.concatenate(([0], self.cycles[:self.length])))
+
+    #   the records as [label, input, word, l1, l2, l1 ldt, l2 ldt, cycleno, event duration] lists
+    def getRows(self):
+        return [[label, input_word] + acts + [cycleno, duration] for label, input_word, acts, cycleno, duration in
+                zip(self.labels, self.inputs, self.acts[:self.length].tolist(), self.cycles[:self.length].tolist(),
+                    self.getDurations().tolist())]
+
+
+traced_pools = ('words', 'lang', 'schemas')    # the pools whose activations are traced
+
+
+# What to trace. items are pool names (trace the whole pool), unit names (trace just those units), or 'top=K' (trace
+# the K most active word units each cycle). No items at all means trace everything.
+class RecordSpec:
+    def __init__(self, items=None, top_k=0):
+        self.pools = set()
+        self.units = set()
+        self.top_k = top_k
+        for item in items or []:
+            item = item.strip().lower()
+            if item == '':
+                continue
+            elif item.startswith('top='):
+                self.top_k = int(item[len('top='):])
+            elif item in traced_pools:
+                self.pools.add(item)
+            else:
+                self.units.add(item)
+        self.everything = len(self.pools) == 0 and len(self.units) == 0 and self.top_k == 0
+
+    #   columns (into keys, the unit names of the pool) to be traced
+    def getColumns(self, pool_name, keys):
+        if self.everything or pool_name in self.pools:
+            return list(range(len(keys)))
+        return [col for col, key in enumerate(keys) if key in self.units]
+
+    def getTopK(self):
+        return self.top_k
+
+    #   items that make the same spec
+    def getItems(self):
+        items = sorted(self.pools) + sorted(self.units)
+        if self.top_k > 0:
+            items.append('top=' + repr(self.top_k))
+        return items
+
+
+#   Trace store for one pool: in memory, or spilled to <spill_dir>/<name>.trace when spill_dir is given
+def new_store(keys, name, spill_dir=None, window=1000):
+    if spill_dir is None:
+        return TraceStore(keys)
+    return SpillTraceStore(keys, os.path.join(spill_dir, name + '.trace'), window)
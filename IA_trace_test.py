@@ -0,0 +1,33 @@
+import os, shutil, tempfile
+import numpy as np
+import IA_trace as tr
+
+# A trace spilled to disk reads back the same as one kept in memory, however many windows it spans, and a window of
+# less than one cycle is refused; the top-K trace keeps the most active units, highest first, and its series has the
+# units ever in the top K, NaN where they were not
+
+work = tempfile.mkdtemp()
+keys = ['a', 'b', 'c']
+rows = np.arange(30, dtype=np.float64).reshape(10, 3)
+memory = tr.TraceStore(keys, capacity=2)
+spill = tr.SpillTraceStore(keys, os.path.join(work, 'words.trace'), window=3)
+for row in rows:
+	memory.append(row)
+	spill.append(row)
+print str(np.array_equal(memory.getData(), rows) and np.array_equal(spill.getData(), rows))
+print str(np.array_equal(spill.getColumn(1), rows[:, 1]) and np.array_equal(spill.getLast(), rows[-1]))
+spill.close()
+try:
+	tr.SpillTraceStore(keys, os.path.join(work, 'empty.trace'), window=0)
+	print str(False)
+except ValueError:
+	print str(True)
+shutil.rmtree(work)
+
+top = tr.TopKTrace(keys, 2)
+top.append([0.1, 0.5, 0.3])
+top.append([0.9, 0.5, 0.3])
+print str(top.getTop(0) == [['b', 0.5], ['c', 0.3]] and top.getTop() == [['a', 0.9], ['b', 0.5]])
+series_keys, series = top.getSeries()
+print str(series_keys == keys and np.array_equal(np.isnan(series), [[True, False, False], [False, False, True]]) and
+          series[0, 1] == 0.5 and series[0, 2] == 0.3 and series[1, 0] == 0.9 and series[1, 1] == 0.5)
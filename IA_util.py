@@ -0,0 +1,12 @@
+# IA_util.py: Helpers shared by several modules of the BIA/BIAPlus Model
+
+
+#   The unicode strings json.loads returns, back to str
+def to_str(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    elif isinstance(value, list):
+        return [to_str(item) for item in value]
+    elif isinstance(value, dict):
+        return dict((to_str(key), to_str(item)) for key, item in value.items())
+    return value
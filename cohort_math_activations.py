@@ -32,12 +32,115 @@ def get_info_gain(input_word, activations, should_recenter, aggregator, maxval):
 		gains.append(one_over_p)
 	
 	# ...and then becomes a list of information gains
-	def maxval_ceiling(floatnum):
-		if floatnum > maxval:
-			return maxval
-		return floatnum
-	gains = [maxval_ceiling(gain) for gain in numpy.log2(gains)]
-	return aggregator(gains), offset
+	return __aggregate_gains__(gains, aggregator, maxval), offset
+
+"""
+Precomputed cohort of a fixed list of words (the word unit names, in the order their activations will be given).
+Holds a boolean (position, letter) x word membership matrix, built once per lexicon, so that the
+per-letter sums of get_info_gain become masked sums over an activation array.
+"""
+class CohortContext:
+	def __init__(self, words):
+		self.words = list(words)
+		self.letters = {}
+		for word in self.words:
+			for letter in word:
+				if letter not in self.letters:
+					self.letters[letter] = len(self.letters)
+		maxlen = 0
+		if len(self.words) > 0:
+			maxlen = numpy.max([len(word) for word in self.words])
+		self.membership = numpy.zeros((maxlen, len(self.letters), len(self.words)), dtype=bool)
+		for i, word in enumerate(self.words):
+			for pos, letter in enumerate(word):
+				self.membership[pos, self.letters[letter], i] = True
+		# the same membership by (position, letter) column of the flattened matrix: the words of column c are
+		# column_words[column_ptr[c]:column_ptr[c + 1]]
+		ncolumns = maxlen * len(self.letters)
+		columns, self.column_words = numpy.nonzero(self.membership.reshape(ncolumns, len(self.words)))
+		self.column_ptr = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(columns, minlength=ncolumns))))
+		self.input_members = {}
+
+	"""
+	Same as get_info_gain, with the activations given as an array of floats in the order of the context's words.
+	"""
+	def get_info_gain(self, input_word, actvals, should_recenter, aggregator, maxval):
+		actvals = numpy.asarray(actvals, dtype=float)
+
+		offset = 0.0
+		if should_recenter:
+			actvals, offset = __recenter__(actvals)
+
+		actval_sum = numpy.sum(actvals)
+		gains = []
+		for i in range(len(input_word)):
+			gains.append(self.__get_inverse_p__(input_word[i], i, actvals, actval_sum))
+		return __aggregate_gains__(gains, aggregator, maxval), offset
+
+	def __get_inverse_p__(self, input_letter, input_pos, actvals, sum_of_all_actvals):
+		if input_pos >= self.membership.shape[0] or input_letter not in self.letters:
+			return float("inf")
+		mask = self.membership[input_pos, self.letters[input_letter]]
+		if not mask.any():
+			return float("inf")
+
+		p_numer = numpy.sum(actvals[mask])
+		if p_numer == 0.0:
+			return float("inf")
+		return sum_of_all_actvals/p_numer
+
+	"""
+	get_info_gain for a batch: one input word per row of the (rows x words) activation array actvals.
+	Returns an array of info gains and an array of offsets, one per row. The per-letter sums of all the rows are
+	taken at once, each over the words of its (position, letter) column only.
+	"""
+	def get_info_gains(self, input_words, actvals, should_recenter, aggregator, maxval):
+		actvals = numpy.array(actvals, dtype=float, ndmin=2)
+		offsets = numpy.zeros(len(actvals))
+		if should_recenter:
+			minvals = numpy.min(actvals, axis=1)
+			offsets = numpy.where(minvals > 0.0, 0.0, -1 * minvals + 0.01)
+			actvals += offsets[:, numpy.newaxis]
+		actval_sums = numpy.sum(actvals, axis=1)
+
+		# the matching words of every letter of every row, one run of them per letter
+		members = [self.__input_members__(input_word) for input_word in input_words]
+		word_members = numpy.concatenate([word for word, counts in members] + [numpy.zeros(0, dtype=int)])
+		counts = numpy.concatenate([counts for word, counts in members] + [numpy.zeros(0, dtype=int)])
+		lengths = numpy.array([len(input_word) for input_word in input_words], dtype=int)
+		rows = numpy.repeat(numpy.repeat(numpy.arange(len(actvals)), lengths), counts)
+		p_numers = numpy.zeros(len(counts))     # stays 0 for the letters without words
+		matched = counts > 0
+		if matched.any():
+			starts = numpy.cumsum(counts) - counts
+			p_numers[matched] = numpy.add.reduceat(actvals[rows, word_members], starts[matched])
+
+		gains = numpy.zeros(len(actvals), dtype=float if aggregator in __row_aggregators__ else object)
+		firsts = numpy.cumsum(lengths) - lengths
+		for length in set(lengths):
+			batch_rows = numpy.flatnonzero(lengths == length)
+			p_numer = p_numers[firsts[batch_rows, numpy.newaxis] + numpy.arange(length)]
+			with numpy.errstate(divide='ignore'):
+				one_over_p = numpy.where(p_numer == 0.0, float("inf"), actval_sums[batch_rows, numpy.newaxis] / p_numer)
+				gains[batch_rows] = __aggregate_gain_rows__(one_over_p, aggregator, maxval)
+		return gains, offsets
+
+	"""
+	The words with each letter of input_word at its position, as one array, and their number per letter (cached)
+	"""
+	def __input_members__(self, input_word):
+		if input_word not in self.input_members:
+			nletters = len(self.letters)
+			runs = []
+			for pos, letter in enumerate(input_word):
+				if pos < self.membership.shape[0] and letter in self.letters:
+					column = pos * nletters + self.letters[letter]
+					runs.append(self.column_words[self.column_ptr[column]:self.column_ptr[column + 1]])
+				else:
+					runs.append(numpy.zeros(0, dtype=int))
+			self.input_members[input_word] = (numpy.concatenate(runs + [numpy.zeros(0, dtype=int)]),
+											  numpy.array([len(run) for run in runs], dtype=int))
+		return self.input_members[input_word]
 
 def sum(floats):
 	return numpy.sum(floats)
@@ -51,6 +154,11 @@ def max(floats):
 def append_str(floats):
 	return ','.join([str(f) for f in floats])
 
+"""
+Row-wise forms of the aggregators above, used to aggregate a batch of per-letter gains at once
+"""
+__row_aggregators__ = {sum: numpy.sum, avg: numpy.mean, max: numpy.max}
+
 """
 Return a recentered copy of the float list `a` such that the minimum value is positive,
 and the (non-negative) offset used for recentering
@@ -64,6 +172,25 @@ def __recenter__(a):
 	offset = -1 * minval + epsilon
 	return numpy.add(a, offset), offset
 
+"""
+Turn the list of `1/p_k` terms into information gains, capped at maxval, and aggregate them
+"""
+def __aggregate_gains__(gains, aggregator, maxval):
+	def maxval_ceiling(floatnum):
+		if floatnum > maxval:
+			return maxval
+		return floatnum
+	gains = [maxval_ceiling(gain) for gain in numpy.log2(gains)]
+	return aggregator(gains)
+
+"""
+__aggregate_gains__ for a (rows x letters) array of `1/p_k` terms, returning one aggregate per row
+"""
+def __aggregate_gain_rows__(gains, aggregator, maxval):
+	if aggregator not in __row_aggregators__:
+		return [__aggregate_gains__(row, aggregator, maxval) for row in gains]
+	return __row_aggregators__[aggregator](numpy.minimum(numpy.log2(gains), maxval), axis=1)
+
 """
 Calculate the `1/p_k` term for the information gain formula
 """
@@ -56,3 +56,43 @@ neggain_list, _ = cm.get_info_gain(
 	maxval = 5)
 print str(neggain_list)
 
+context = cm.CohortContext(['xxxxx', 'hello'])
+context_list, _ = context.get_info_gain(
+	input_word='hello',
+	actvals=[0.5, 0.5],
+	should_recenter=False,
+	aggregator=cm.append_str,
+	maxval = 5)
+print str(context_list == midgain_list)
+
+context_list_recenter, _ = context.get_info_gain(
+	input_word='hello',
+	actvals=[0.5, 0.5],
+	should_recenter=True,
+	aggregator=cm.append_str,
+	maxval = 5)
+print str(context_list_recenter == midgain_list_recenter)
+
+# A letter not in the lexicon, a letter no word has at its position and the positions past the longest word get the
+# maximum gain; the context gives the gains of get_info_gain in the sum and max modes too, also for a batch of words
+activations = [['ab', 0.2], ['ac', 0.5], ['bcd', -0.1]]
+context = cm.CohortContext([word for word, act in activations])
+actvals = [act for word, act in activations]
+unmatched_list, _ = context.get_info_gain(
+	input_word='xbcdef',
+	actvals=actvals,
+	should_recenter=True,
+	aggregator=cm.append_str,
+	maxval = 5)
+unmatched = unmatched_list.split(',')
+print str(unmatched[0] == '5' and float(unmatched[1]) < 5 and unmatched[2:] == ['5'] * 4)
+
+for aggregator in (cm.sum, cm.max):
+	gains = []
+	for input_word in ('ab', 'xcd', 'abcdef'):
+		gain, _ = cm.get_info_gain(input_word, activations, True, aggregator, 5)
+		context_gain, _ = context.get_info_gain(input_word, actvals, True, aggregator, 5)
+		gains.append(gain)
+		print str(context_gain == gain)
+	batch_gains, _ = context.get_info_gains(['ab', 'xcd', 'abcdef'], [actvals] * 3, True, aggregator, 5)
+	print str(list(batch_gains) == gains)